@@ -0,0 +1,160 @@
+import unittest
+from functions.distance_matrix_generation import build_distance_matrix, dist_i_j_strict_s_shape, build_distance_matrix_transverse, build_pairwise_product_distance_matrix, TransverseDistance
+import numpy as np
+
+# unit testing for the construction of the pairwise slot distance matrices
+
+class Test_distance_matrix_strict_s_shape(unittest.TestCase):
+
+    def test_vectorized_matches_pairwise(self):
+
+        for num_aisles in [1,3,4]:
+            for num_bays in [2,3,5]:
+                instance = {
+                    "num_aisles":num_aisles,
+                    "num_bays":num_bays,
+                    "slot_capacity":2,
+                    "between_aisle_dist":1.5,
+                    "between_bay_dist":0.7
+                }
+
+                d_pairwise = build_distance_matrix(dist_i_j_strict_s_shape, **instance)
+                d_vectorized = build_distance_matrix(dist_i_j_strict_s_shape, **instance, vectorized = True, chunk_size = 5)
+
+                self.assertTrue(np.array_equal(d_vectorized, d_pairwise), msg = f"Vectorized and pairwise distance matrices differ for instance {instance}")
+
+    def test_scalar_distances(self):
+
+        self.assertEqual(dist_i_j_strict_s_shape(1, 2, 2, 1, 1, 10000), 0, msg = "Slots in the same aisle should be at distance 0")
+        self.assertEqual(dist_i_j_strict_s_shape(3, 1, 2, 1, 1, 10000), 10000, msg = "Moving to an earlier aisle should incur the big M penalty")
+        self.assertEqual(dist_i_j_strict_s_shape(1, 3, 2, 1, 1, 10000), 4, msg = "Moving to the next aisle should cost one aisle and one aisle length")
+        self.assertEqual(dist_i_j_strict_s_shape(1, 5, 2, 1, 1, 10000), 8, msg = "Moving two aisles on should cost two aisles and two aisle lengths")
+
+
+class Test_distance_matrix_transverse(unittest.TestCase):
+
+    def test_numpy_engine_matches_loop(self):
+
+        for num_aisles in [1,2,3,4,7]:
+            for num_bays in [2,4,6,10]:
+                for between_aisle_dist, between_bay_dist in [(1,1), (2.5,0.7), (3,1.3)]:
+                    instance = {
+                        "num_aisles":num_aisles,
+                        "num_bays":num_bays,
+                        "between_aisle_distance":between_aisle_dist,
+                        "between_bay_distance":between_bay_dist,
+                        "backtrack_penalty":1000
+                    }
+
+                    D_loop = build_distance_matrix_transverse(**instance, engine = "loop")
+                    D_numpy = build_distance_matrix_transverse(**instance, engine = "numpy")
+
+                    self.assertEqual(D_numpy.shape, D_loop.shape, msg = f"Distance matrix has the wrong shape for instance {instance}, is {D_numpy.shape}, should be {D_loop.shape}")
+
+                    self.assertTrue(np.array_equal(D_numpy, D_loop), msg = f"NumPy and loop distance matrices differ for instance {instance}")
+
+    def test_unknown_engine(self):
+
+        with self.assertRaises(ValueError):
+            build_distance_matrix_transverse(2, 2, 1, 1, 1000, engine = "fortran")
+
+
+class Test_transverse_distance(unittest.TestCase):
+
+    def test_matches_dense_matrix(self):
+
+        for num_aisles in [1,2,5]:
+            for num_bays in [2,4,8]:
+                D_dense = build_distance_matrix_transverse(num_aisles, num_bays, 1.5, 0.7, 1000)
+                D_blocks = TransverseDistance(num_aisles, num_bays, 1.5, 0.7, 1000)
+
+                self.assertEqual(D_blocks.table.shape, (2*num_aisles + 1, 2*num_aisles + 1), msg = f"Block table has the wrong shape, is {D_blocks.table.shape}")
+
+                self.assertTrue(np.array_equal(D_blocks.toarray(), D_dense), msg = f"Block-compressed distances differ from the dense matrix for {num_aisles} aisles and {num_bays} bays")
+
+    def test_lookups(self):
+
+        D_dense = build_distance_matrix_transverse(4, 6, 1, 1, 1000)
+        D_blocks = TransverseDistance(4, 6, 1, 1, 1000)
+
+        self.assertEqual(D_blocks.shape, D_dense.shape, msg = f"Shape is {D_blocks.shape}, should be {D_dense.shape}")
+
+        self.assertEqual(D_blocks[3,17], D_dense[3,17], msg = "Scalar lookup differs from the dense matrix")
+        self.assertEqual(D_blocks.distance(17,0), D_dense[17,0], msg = "Scalar distance differs from the dense matrix")
+
+        rows = np.array([0, 5, 9, 24])
+        cols = np.array([24, 0, 1, 13])
+        self.assertTrue(np.array_equal(D_blocks[rows, cols], D_dense[rows, cols]), msg = "Vectorised lookup differs from the dense matrix")
+        self.assertTrue(np.array_equal(D_blocks.gather(rows), D_dense[np.ix_(rows, rows)]), msg = "Gathered sub-matrix differs from the dense matrix")
+
+    def test_compressed_product_distances(self):
+
+        slots = [(x,y) for x in range(1,4) for y in range(1,5)]
+        slot_assignments_dict = {prod:slots[(prod-1) // 2] for prod in range(1, 25)}
+
+        D_dense = build_pairwise_product_distance_matrix(slot_assignments_dict, slots, 3, 4, 2, 1, 1, 1000)
+        D_blocks = build_pairwise_product_distance_matrix(slot_assignments_dict, slots, 3, 4, 2, 1, 1, 1000, compressed = True)
+
+        self.assertIsInstance(D_blocks, TransverseDistance, msg = f"Compressed product distances are type {type(D_blocks)}, should be TransverseDistance")
+
+        self.assertTrue(np.array_equal(D_blocks.toarray(), D_dense), msg = "Compressed product distances differ from the dense product matrix")
+
+    def test_fingerprint_normalises_parameters(self):
+
+        fingerprint = TransverseDistance(3, 4, 1, 1, 1000).fingerprint
+
+        self.assertEqual(TransverseDistance(np.int64(3), 4, 1.0, np.float64(1), 1000.0).fingerprint, fingerprint, msg = "Equal layouts given as ints and floats should share a fingerprint")
+        self.assertNotEqual(TransverseDistance(3, 4, 1.5, 1, 1000).fingerprint, fingerprint, msg = "Different layouts should have different fingerprints")
+
+
+class Test_pairwise_product_distance_matrix(unittest.TestCase):
+
+    def test_matches_slot_lookup(self):
+
+        num_aisles = 3
+        num_bays = 4
+        slot_capacity = 2
+        slots = [(x,y) for x in range(1,num_aisles+1) for y in range(1, num_bays+1)]
+
+        # assign products to slots in reverse order, so that the product and slot orderings differ
+        slot_assignments_dict = {prod:slots[(len(slots)*slot_capacity - prod) // slot_capacity] for prod in range(1, len(slots)*slot_capacity + 1)}
+
+        D_slots = build_distance_matrix_transverse(num_aisles, num_bays, 1, 1, 1000)
+        D_prods = build_pairwise_product_distance_matrix(slot_assignments_dict, slots, num_aisles, num_bays, slot_capacity, 1, 1, 1000)
+
+        self.assertEqual(D_prods.shape, (len(slots)*slot_capacity + 1, len(slots)*slot_capacity + 1), msg = f"Product distance matrix has the wrong shape, is {D_prods.shape}")
+
+        for prod_1 in range(len(slots)*slot_capacity + 1):
+            row_1 = 0 if prod_1 == 0 else slots.index(slot_assignments_dict[prod_1]) + 1
+            for prod_2 in range(len(slots)*slot_capacity + 1):
+                row_2 = 0 if prod_2 == 0 else slots.index(slot_assignments_dict[prod_2]) + 1
+                self.assertEqual(D_prods[prod_1,prod_2], D_slots[row_1,row_2], msg = f"Distance between products {prod_1} and {prod_2} is {D_prods[prod_1,prod_2]}, should be {D_slots[row_1,row_2]}")
+
+    def test_output_dtype(self):
+
+        slots = [(x,y) for x in range(1,3) for y in range(1,3)]
+        slot_assignments_dict = {prod:slots[(prod-1) // 2] for prod in range(1, 9)}
+
+        D_prods = build_pairwise_product_distance_matrix(slot_assignments_dict, slots, 2, 2, 2, 1, 1, 1000, dtype = np.int32)
+
+        self.assertEqual(D_prods.dtype, np.int32, msg = f"Product distance matrix has the wrong dtype, is {D_prods.dtype}, should be int32")
+
+    def test_integer_dtype_requires_whole_distances(self):
+
+        slots = [(x,y) for x in range(1,3) for y in range(1,3)]
+        slot_assignments_dict = {prod:slots[(prod-1) // 2] for prod in range(1, 9)}
+
+        # a between aisle distance of 1.5 gives fractional distances, which the cast to int32 would truncate
+        with self.assertRaises(ValueError):
+            build_pairwise_product_distance_matrix(slot_assignments_dict, slots, 2, 2, 2, 1.5, 1, 1000, dtype = np.int32)
+
+        # a penalty beyond the range of int16 would wrap around
+        with self.assertRaises(ValueError):
+            build_pairwise_product_distance_matrix(slot_assignments_dict, slots, 2, 2, 2, 1, 1, 100000, dtype = np.int16)
+
+        D_float = build_pairwise_product_distance_matrix(slot_assignments_dict, slots, 2, 2, 2, 1.5, 1, 1000, dtype = np.float32)
+        D_exact = build_pairwise_product_distance_matrix(slot_assignments_dict, slots, 2, 2, 2, 1.5, 1, 1000)
+        self.assertTrue(np.array_equal(D_float, D_exact), msg = "Float32 product distances differ from the float64 matrix")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+from functions.orders_generation import collapse_duplicate_orders
+from models.full_models.strict_s_shape import Strict_S_Shape
+from models.full_models.return_silva import Return
+from models.full_models.s_shape_silva_linear import S_Shape_Silva_Linear
+from models.full_models.s_shape_linear import S_Shape_Linear
+
+# unit testing for the preprocessing of orders
+
+class Test_collapse_duplicate_orders(unittest.TestCase):
+
+    def test_collapse(self):
+
+        orders = {1:[1,2,3], 2:[3,2,1], 3:[4,5], 4:[1,2,3], 5:[2,6]}
+
+        collapsed_orders, weights = collapse_duplicate_orders(orders)
+
+        self.assertEqual(collapsed_orders, {1:[1,2,3], 2:[4,5], 3:[2,6]}, msg = f"Orders are collapsed incorrectly, {collapsed_orders}")
+        self.assertEqual(weights, {1:3, 2:1, 3:1}, msg = f"Order weights are incorrect, {weights}")
+
+        collapsed_orders, weights = collapse_duplicate_orders(list(orders.values()), first_key = 0)
+        self.assertEqual(list(weights.keys()), [0,1,2], msg = f"Collapsed orders should be numbered from first_key, are numbered {list(weights.keys())}")
+
+    def test_models_unchanged(self):
+
+        orders = {1:[1,2,3], 2:[3,2,1], 3:[4,5], 4:[2,6], 5:[5,4], 6:[1,2,3]}
+
+        instance = {
+            "num_aisles":3,
+            "num_bays":2,
+            "slot_capacity":2,
+            "between_aisle_dist":1,
+            "between_bay_dist":1
+        }
+
+        # S_Shape_Linear numbers its orders from 0
+        for model, model_orders in [(Strict_S_Shape, orders), (Return, orders), (S_Shape_Silva_Linear, orders), (S_Shape_Linear, {order-1:prods for order, prods in orders.items()})]:
+            _, distance_collapsed, _, _ = model(**instance, orders = model_orders, collapse_orders = True)
+            _, distance, _, _ = model(**instance, orders = model_orders, collapse_orders = False)
+
+            self.assertEqual(distance_collapsed, distance, msg = f"{model.__name__} distance with collapsed orders is {distance_collapsed}, should be {distance}")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,7 @@
 import unittest
-from models.strict_s_shape import Strict_S_Shape
+from models.full_models.strict_s_shape import Strict_S_Shape
+from functions.product_aggregation import group_products_by_signature, expand_class_counts
+from functions.orders_generation import generate_orders
 import numpy as np
 
 # unit testing for the directional warehouse where backtracking across the top cross-aisle is allowed after the final pick if required
@@ -95,5 +97,151 @@ class Test_model(unittest.TestCase):
 
         self.assertEqual(distance_result, 30, msg = f"model is obtaining the wrong final distance. Minimum distance is {30}. The model is achieving {distance_result}.")
 
+
+class Test_product_aggregation(unittest.TestCase):
+
+    def test_signature_classes(self):
+
+        orders = {1:[1,2,3], 2:[2,3,4], 3:[3,4,5]}
+
+        classes, signatures = group_products_by_signature(orders, range(1, 9))
+
+        self.assertEqual(classes, [[1], [2], [3], [4], [5], [6,7,8]], msg = f"Products are grouped into the wrong classes, {classes}")
+        self.assertEqual(signatures[1], frozenset({1,2}), msg = f"Product 2 should appear in orders 1 and 2, signature is {signatures[1]}")
+        self.assertEqual(signatures[-1], frozenset(), msg = "Products in no order should share the empty signature")
+
+        assignments = expand_class_counts([[1,2], [3,4,5]], {(1,0):1, (2,0):1, (1,1):1, (2,1):2}, [1,2])
+        self.assertEqual(assignments, {1:[1,3], 2:[2,4,5]}, msg = f"Class counts are expanded to the wrong assignment, {assignments}")
+
+    def test_aggregated_matches_per_product_model(self):
+
+        for num_aisles, num_bays, num_orders, order_size, seed in [(3,2,3,3,1), (4,3,6,3,2), (5,3,8,4,3)]:
+            orders = generate_orders(num_orders, order_size, num_aisles*num_bays*2, seed)
+
+            instance = {
+                "num_aisles":num_aisles,
+                "num_bays":num_bays,
+                "slot_capacity":2,
+                "between_aisle_dist":1,
+                "between_bay_dist":1,
+                "orders":orders
+            }
+
+            _, distance_aggregated, _, assignment_aggregated = Strict_S_Shape(**instance, aggregate_products = True)
+            _, distance_per_product, _, _ = Strict_S_Shape(**instance, aggregate_products = False)
+
+            self.assertEqual(distance_aggregated, distance_per_product, msg = f"Aggregated model distance is {distance_aggregated}, per-product model distance is {distance_per_product} for instance {instance}")
+
+            assigned = sorted(prod for prods in assignment_aggregated.values() for prod in prods)
+            self.assertEqual(assigned, list(range(1, num_aisles*num_bays*2 + 1)), msg = "Every product should be assigned to exactly one aisle")
+
+            for aisle, prods in assignment_aggregated.items():
+                self.assertLessEqual(len(prods), num_bays*2, msg = f"Aisle {aisle} is over capacity with {len(prods)} products")
+
+class Test_matrix_api(unittest.TestCase):
+
+    def test_matrix_model_matches_loop_model(self):
+
+        instances = [
+            (3, 2, {1:[1,2,3], 2:[2,3,4], 3:[3,4,5]}),
+            (4, 3, {1:[1,2,3,4,5,6], 2:[7,8,9,10,11,12], 3:[1,2,3,7,8,9], 4:[4,5,6,10,11,12], 5:[1,2,3,11,12,13]}),
+            (3, 3, {1:[1,2,3], 2:[4,5,6], 3:[1,3,5]}),
+            (5, 3, generate_orders(8, 4, 30, 3)),
+            (1, 3, generate_orders(2, 2, 6, 5))
+        ]
+
+        for num_aisles, num_bays, orders in instances:
+            instance = {
+                "num_aisles":num_aisles,
+                "num_bays":num_bays,
+                "slot_capacity":2,
+                "between_aisle_dist":1,
+                "between_bay_dist":1,
+                "orders":orders
+            }
+
+            for aggregate_products in [True, False]:
+                status_matrix, distance_matrix, _, assignment_matrix, build_time, solve_time, extraction_time = Strict_S_Shape(**instance, aggregate_products = aggregate_products, matrix_api = True, return_timings = True)
+                status_loop, distance_loop, _, _ = Strict_S_Shape(**instance, aggregate_products = aggregate_products, matrix_api = False)
+
+                self.assertEqual(status_matrix, status_loop, msg = f"Matrix model status is {status_matrix}, loop model status is {status_loop} for instance {instance}")
+                self.assertEqual(distance_matrix, distance_loop, msg = f"Matrix model distance is {distance_matrix}, loop model distance is {distance_loop} for instance {instance}")
+
+                assigned = sorted(prod for prods in assignment_matrix.values() for prod in prods)
+                self.assertEqual(assigned, list(range(1, num_aisles*num_bays*2 + 1)), msg = "Every product should be assigned to exactly one aisle")
+
+                for timing in [build_time, solve_time, extraction_time]:
+                    self.assertGreaterEqual(timing, 0, msg = "Build, solve and extraction times should not be negative")
+
+class Test_parity_pairing(unittest.TestCase):
+
+    def test_parity_pairing_matches_pairwise_pairing(self):
+
+        instances = [
+            (3, 2, {1:[1,2,3], 2:[2,3,4], 3:[3,4,5]}),
+            (4, 3, {1:[1,2,3,4,5,6], 2:[7,8,9,10,11,12], 3:[1,2,3,7,8,9], 4:[4,5,6,10,11,12], 5:[1,2,3,11,12,13]}),
+            (3, 3, {1:[1,2,3], 2:[4,5,6], 3:[1,3,5]})
+        ]
+
+        rng = np.random.default_rng(0)
+        for seed in range(5):
+            num_aisles = int(rng.integers(1, 7))
+            num_bays = int(rng.integers(2, 4))
+            instances.append((num_aisles, num_bays, generate_orders(int(rng.integers(2, 9)), int(rng.integers(1, 5)), num_aisles*num_bays*2, seed)))
+
+        for num_aisles, num_bays, orders in instances:
+            instance = {
+                "num_aisles":num_aisles,
+                "num_bays":num_bays,
+                "slot_capacity":2,
+                "between_aisle_dist":1,
+                "between_bay_dist":1,
+                "orders":orders
+            }
+
+            _, distance_pairwise, _, _ = Strict_S_Shape(**instance, parity_pairing = False)
+
+            for matrix_api in [True, False]:
+                _, distance_parity, _, _ = Strict_S_Shape(**instance, parity_pairing = True, matrix_api = matrix_api)
+
+                self.assertEqual(distance_parity, distance_pairwise, msg = f"Parity pairing distance is {distance_parity}, pairwise distance is {distance_pairwise} for instance {instance} (matrix_api = {matrix_api})")
+
+class Test_tight_model(unittest.TestCase):
+
+    def test_tight_model_matches_standard_model(self):
+
+        for num_aisles, num_bays, num_orders, order_size, seed in [(3,2,3,3,1), (3,3,8,3,2), (4,3,6,3,3), (5,2,5,4,4)]:
+            orders = generate_orders(num_orders, order_size, num_aisles*num_bays*2, seed)
+
+            instance = {
+                "num_aisles":num_aisles,
+                "num_bays":num_bays,
+                "slot_capacity":2,
+                "between_aisle_dist":1,
+                "between_bay_dist":1,
+                "orders":orders
+            }
+
+            _, distance_standard, _, _, lp_bound_standard, _ = Strict_S_Shape(**instance, return_statistics = True)
+
+            for aggregate_products in [True, False]:
+                _, distance_tight, _, assignment_tight, lp_bound_tight, _ = Strict_S_Shape(**instance, tight = True, aggregate_products = aggregate_products, return_statistics = True)
+
+                self.assertEqual(distance_tight, distance_standard, msg = f"Tight model distance is {distance_tight}, standard model distance is {distance_standard} for instance {instance}")
+                self.assertLessEqual(lp_bound_tight, distance_tight + 1e-6, msg = f"LP bound {lp_bound_tight} is above the optimal distance {distance_tight}")
+
+                # the valid inequalities only add constraints to the standard model, so they can only raise its LP bound
+                self.assertGreaterEqual(lp_bound_tight, lp_bound_standard - 1e-6, msg = f"Tight LP bound {lp_bound_tight} is below the standard LP bound {lp_bound_standard}")
+
+                assigned = sorted(prod for prods in assignment_tight.values() for prod in prods)
+                self.assertEqual(assigned, list(range(1, num_aisles*num_bays*2 + 1)), msg = "Every product should be assigned to exactly one aisle")
+
+            self.assertLessEqual(lp_bound_standard, distance_standard + 1e-6, msg = f"LP bound {lp_bound_standard} is above the optimal distance {distance_standard}")
+
+    def test_tight_model_needs_matrix_api(self):
+
+        with self.assertRaises(ValueError):
+            Strict_S_Shape(3, 2, 2, 1, 1, {1:[1,2,3]}, tight = True, matrix_api = False)
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,87 @@
+import unittest
+from functions.strict_s_shape_evaluation import StrictSShapeEvaluator, evaluate_strict_s_shape, product_aisle_array
+from functions.orders_generation import generate_orders
+from models.full_models.strict_s_shape import Strict_S_Shape
+import numpy as np
+
+# unit testing for the closed-form evaluation of the Strict S-Shape objective
+
+def order_distance(visited_aisles:list[int], num_bays:int, between_aisle_dist:float, between_bay_dist:float) -> float:
+    """
+    The Strict S-Shape distance of a single order, walking through its visited aisles in turn. An order with picks only in the first aisle may
+    also pass through the second aisle, if that is shorter
+    """
+
+    L = between_bay_dist * (num_bays + 1)
+    aisles = sorted(set(visited_aisles))
+
+    same_direction_pairs = sum(1 for a, b in zip(aisles, aisles[1:]) if (b - a) % 2 == 0)
+    first_aisle_only = len(aisles) == 1 and aisles[0] == 1
+
+    distance = L * (len(aisles) + same_direction_pairs + (1 - aisles[0] % 2) + aisles[-1] % 2) + 2 * (aisles[-1] - 1) + 2 * between_aisle_dist * first_aisle_only
+
+    return min(distance, order_distance([1,2], num_bays, between_aisle_dist, between_bay_dist)) if first_aisle_only else distance
+
+
+class Test_evaluator(unittest.TestCase):
+
+    def test_matches_model_objective(self):
+
+        instances = [
+            (3, 2, {1:[1,2,3], 2:[2,3,4], 3:[3,4,5]}),
+            (4, 3, {1:[1,2,3,4,5,6], 2:[7,8,9,10,11,12], 3:[1,2,3,7,8,9], 4:[4,5,6,10,11,12], 5:[1,2,3,11,12,13]}),
+            (3, 3, {1:[1,2,3], 2:[4,5,6], 3:[1,3,5]}),
+            (5, 4, generate_orders(10, 3, 40, 2))
+        ]
+
+        for num_aisles, num_bays, orders in instances:
+            _, distance_model, _, aisle_assignments_dict = Strict_S_Shape(num_aisles, num_bays, 2, 1, 1, orders)
+
+            distance, _ = evaluate_strict_s_shape(aisle_assignments_dict, orders, num_aisles, num_bays, 1, 1)
+
+            self.assertEqual(distance, distance_model, msg = f"Evaluated distance is {distance}, model objective is {distance_model} for orders {orders}")
+
+    def test_matches_order_walk(self):
+
+        rng = np.random.default_rng(0)
+        num_aisles = 6
+        num_bays = 4
+        orders = generate_orders(15, 4, num_aisles*num_bays*2, 1)
+
+        evaluator = StrictSShapeEvaluator(orders, num_aisles, num_bays, 1.5, 0.5)
+
+        # a batch of random full assignments, with the door as product 0
+        batch = np.stack([np.concatenate([[0], rng.permutation(np.repeat(np.arange(1, num_aisles+1), num_bays*2))]) for _ in range(50)])
+        distances = evaluator.order_distances(batch)
+
+        self.assertEqual(distances.shape, (50, len(orders)), msg = f"Batch distances have shape {distances.shape}, should be {(50, len(orders))}")
+
+        for candidate in range(50):
+            for o, prods in enumerate(orders.values()):
+                expected = order_distance(batch[candidate, prods], num_bays, 1.5, 0.5)
+                self.assertAlmostEqual(distances[candidate, o], expected, msg = f"Distance of order {o+1} is {distances[candidate, o]}, should be {expected}")
+
+        self.assertTrue(np.allclose(evaluator.total_distance(batch), distances.sum(axis=1)), msg = "Batch totals differ from the sum of order distances")
+
+    def test_empty_orders_match_model_objective(self):
+
+        # the model still routes empty orders, so they are charged as well
+        for num_aisles, num_bays, between_aisle_dist, between_bay_dist in [(1, 2, 1, 1), (3, 2, 1, 1), (4, 3, 2, 3)]:
+            orders = {1:[1,2], 2:[], 3:[3], 4:[]}
+
+            _, distance_model, _, aisle_assignments_dict = Strict_S_Shape(num_aisles, num_bays, 2, between_aisle_dist, between_bay_dist, orders)
+
+            distance, order_distances = evaluate_strict_s_shape(aisle_assignments_dict, orders, num_aisles, num_bays, between_aisle_dist, between_bay_dist)
+
+            self.assertEqual(distance, distance_model, msg = f"Evaluated distance is {distance}, model objective is {distance_model} with empty orders in a warehouse of {num_aisles} aisles")
+            self.assertGreater(order_distances[2], 0, msg = "An empty order should be charged as in the model")
+
+    def test_unassigned_product(self):
+
+        evaluator = StrictSShapeEvaluator({1:[1,2]}, 2, 2, 1, 1)
+
+        with self.assertRaises(ValueError):
+            evaluator.order_distances(product_aisle_array({1:[1]}, 2))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+from functions.strict_s_shape_heuristic import strict_s_shape_heuristic
+from functions.strict_s_shape_evaluation import StrictSShapeEvaluator
+from functions.orders_generation import generate_orders
+from models.full_models.strict_s_shape import Strict_S_Shape
+import numpy as np
+
+# unit testing for the Strict S-Shape greedy and local search heuristic, and its use as a MIP start
+
+class Test_heuristic(unittest.TestCase):
+
+    def test_feasible_assignment(self):
+
+        for num_aisles, num_bays, num_orders, order_size, seed in [(3,2,3,3,1), (6,5,8,4,1), (10,6,40,5,2)]:
+            orders = generate_orders(num_orders, order_size, num_aisles*num_bays*2, seed)
+
+            product_aisles, distance, runtime = strict_s_shape_heuristic(orders, num_aisles, num_bays, 2, 1, 1)
+
+            aisle_counts = np.bincount(product_aisles[1:], minlength = num_aisles + 1)
+            self.assertEqual(aisle_counts[0], 0, msg = "Every product should be assigned to an aisle")
+            self.assertTrue(np.all(aisle_counts[1:] <= num_bays*2), msg = f"Aisles are over capacity, holding {aisle_counts[1:]} products")
+
+            evaluator = StrictSShapeEvaluator(orders, num_aisles, num_bays, 1, 1)
+            self.assertEqual(distance, evaluator.total_distance(product_aisles), msg = f"Reported heuristic distance {distance} differs from the evaluated distance")
+            self.assertGreaterEqual(runtime, 0, msg = f"Heuristic runtime should be non-negative, is {runtime}")
+
+    def test_warm_start_matches_cold_start(self):
+
+        for num_aisles, num_bays, num_orders, order_size, seed in [(4,3,6,3,1), (6,5,8,4,1)]:
+            orders = generate_orders(num_orders, order_size, num_aisles*num_bays*2, seed)
+
+            instance = {
+                "num_aisles":num_aisles,
+                "num_bays":num_bays,
+                "slot_capacity":2,
+                "between_aisle_dist":1,
+                "between_bay_dist":1,
+                "orders":orders
+            }
+
+            status, distance_warm, _, _, heuristic_distance, heuristic_runtime = Strict_S_Shape(**instance, return_heuristic = True)
+            _, distance_cold, _, _ = Strict_S_Shape(**instance, warm_start = False)
+
+            self.assertEqual(status, 2, msg = f"Warm started model status is {status}, should be optimal (2)")
+            self.assertEqual(distance_warm, distance_cold, msg = f"Warm started distance is {distance_warm}, cold started distance is {distance_cold}")
+            self.assertGreaterEqual(heuristic_distance, distance_warm, msg = f"Heuristic distance {heuristic_distance} is below the optimal distance {distance_warm}")
+
+if __name__ == "__main__":
+    unittest.main()
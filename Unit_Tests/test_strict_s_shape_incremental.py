@@ -0,0 +1,80 @@
+import unittest
+from models.full_models.strict_s_shape_incremental import IncrementalStrictSShape
+from models.full_models.strict_s_shape import Strict_S_Shape
+from functions.orders_generation import generate_orders
+
+# unit testing for the persistent Strict S-Shape model re-solved as orders arrive and leave
+
+class Test_incremental(unittest.TestCase):
+
+    def setUp(self):
+
+        self.instance = {
+            "num_aisles":4,
+            "num_bays":3,
+            "slot_capacity":2,
+            "between_aisle_dist":1,
+            "between_bay_dist":1
+        }
+
+        orders = generate_orders(10, 3, 24, 2)
+        self.first_batch = {o:orders[o] for o in range(1, 6)}
+        self.second_batch = {o:orders[o] for o in range(6, 11)}
+        self.orders = orders
+
+    def test_matches_model_built_from_scratch(self):
+
+        model = IncrementalStrictSShape(**self.instance, orders = self.first_batch)
+
+        status, distance, _, _ = model.resolve()
+        _, distance_from_scratch, _, _ = Strict_S_Shape(**self.instance, orders = self.first_batch)
+        self.assertEqual(status, 2, msg = f"Model status should be optimal (2), is {status}")
+        self.assertEqual(distance, distance_from_scratch, msg = f"Incremental distance is {distance}, distance from scratch is {distance_from_scratch} for the first batch")
+
+        model.add_orders(self.second_batch)
+        _, distance, _, aisle_assignments_dict = model.resolve()
+        _, distance_from_scratch, _, _ = Strict_S_Shape(**self.instance, orders = self.orders)
+        self.assertEqual(distance, distance_from_scratch, msg = f"Incremental distance is {distance}, distance from scratch is {distance_from_scratch} for both batches")
+
+        assigned = sorted(prod for prods in aisle_assignments_dict.values() for prod in prods)
+        self.assertEqual(assigned, list(range(1, 25)), msg = "Every product should be assigned to exactly one aisle")
+
+        model.remove_orders(list(self.first_batch.keys()))
+        _, distance, _, _ = model.resolve()
+        _, distance_from_scratch, _, _ = Strict_S_Shape(**self.instance, orders = {o:prods for o, prods in enumerate(self.second_batch.values(), start=1)})
+        self.assertEqual(distance, distance_from_scratch, msg = f"Incremental distance is {distance}, distance from scratch is {distance_from_scratch} after removing the first batch")
+
+    def test_removed_orders_leave_no_trace(self):
+
+        model = IncrementalStrictSShape(**self.instance, orders = self.first_batch)
+        model.add_orders(self.second_batch)
+        model.remove_orders([1, 3, 7])
+        model.model.update()
+
+        remaining = {o:prods for o, prods in self.orders.items() if o not in [1, 3, 7]}
+        fresh = IncrementalStrictSShape(**self.instance, orders = remaining)
+        fresh.model.update()
+
+        self.assertEqual(model.model.NumVars, fresh.model.NumVars, msg = "Removing orders should remove all of their variables")
+        self.assertEqual(model.model.NumConstrs, fresh.model.NumConstrs, msg = "Removing orders should remove all of their constraints")
+        self.assertEqual(model.resolve()[1], fresh.resolve()[1], msg = "Removing orders should give the same distance as never adding them")
+
+    def test_invalid_orders(self):
+
+        model = IncrementalStrictSShape(**self.instance, orders = self.first_batch)
+
+        with self.assertRaises(ValueError):
+            model.add_orders({1:[1,2]})
+
+        with self.assertRaises(ValueError):
+            model.add_orders({20:[1,25]})
+
+        with self.assertRaises(ValueError):
+            model.remove_orders([20])
+
+        with self.assertRaises(ValueError):
+            model.remove_orders([3, 3])
+        self.assertIn(3, model.orders, msg = "A rejected removal should leave the order in the model")
+
+if __name__ == "__main__":
+    unittest.main()
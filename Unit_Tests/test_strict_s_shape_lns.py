@@ -0,0 +1,67 @@
+import unittest
+from models.full_models.strict_s_shape_lns import Strict_S_Shape_LNS, LNS_OPERATORS
+from models.full_models.strict_s_shape import Strict_S_Shape
+from functions.strict_s_shape_evaluation import evaluate_strict_s_shape
+from functions.orders_generation import generate_orders
+import numpy as np
+import os
+import tempfile
+
+# unit testing for the large neighbourhood search for the Strict S-Shape model
+
+class Test_lns(unittest.TestCase):
+
+    def test_feasible_and_improving(self):
+
+        num_aisles = 8
+        num_bays = 4
+        orders = generate_orders(20, 3, num_aisles*num_bays*2, 1)
+
+        with tempfile.TemporaryDirectory() as log_dir:
+            log_path = os.path.join(log_dir, "trajectory.csv")
+
+            status, distance, runtime, aisle_assignments_dict, trajectory = Strict_S_Shape_LNS(num_aisles, num_bays, 2, 1, 1, orders, time_limit = 30, subproblem_time_limit = 2, max_iterations = 12, return_trajectory = True, log_path = log_path)
+
+            self.assertTrue(os.path.exists(log_path), msg = "The trajectory was not written to the log")
+
+        self.assertEqual(status, 7, msg = f"Search stopped by the iteration limit should have status 7, has {status}")
+
+        assigned = sorted(prod for prods in aisle_assignments_dict.values() for prod in prods)
+        self.assertEqual(assigned, list(range(1, num_aisles*num_bays*2 + 1)), msg = "Every product should be assigned to exactly one aisle")
+        for aisle, prods in aisle_assignments_dict.items():
+            self.assertLessEqual(len(prods), num_bays*2, msg = f"Aisle {aisle} is over capacity with {len(prods)} products")
+
+        evaluated, _ = evaluate_strict_s_shape(aisle_assignments_dict, orders, num_aisles, num_bays, 1, 1)
+        self.assertEqual(distance, evaluated, msg = f"Reported distance {distance} differs from the evaluated distance {evaluated}")
+
+        self.assertEqual(len(trajectory), 13, msg = f"Trajectory should have the heuristic and one row per iteration, has {len(trajectory)} rows")
+        self.assertTrue(np.all(np.diff(trajectory["distance"]) <= 0), msg = "The distance should never increase along the trajectory")
+        self.assertEqual(set(trajectory["operator"][1:]), set(LNS_OPERATORS), msg = "Every neighbourhood should be used")
+
+    def test_no_worse_than_optimal(self):
+
+        num_aisles = 4
+        num_bays = 3
+        orders = generate_orders(6, 3, num_aisles*num_bays*2, 1)
+
+        _, distance_lns, _, _ = Strict_S_Shape_LNS(num_aisles, num_bays, 2, 1, 1, orders, time_limit = 10, max_iterations = 8)
+        _, distance_optimal, _, _ = Strict_S_Shape(num_aisles, num_bays, 2, 1, 1, orders)
+
+        self.assertGreaterEqual(distance_lns, distance_optimal, msg = f"LNS distance {distance_lns} is below the optimal distance {distance_optimal}")
+
+    def test_worst_orders_with_few_positive_distances(self):
+
+        # only one order has a positive distance, fewer than the number of orders freed
+        orders = {1:[1,2,3], 2:[], 3:[], 4:[]}
+
+        status, _, _, _ = Strict_S_Shape_LNS(3, 2, 2, 1, 1, orders, time_limit = 10, max_iterations = 3, num_free_orders = 3, operators = ("worst_orders",))
+
+        self.assertEqual(status, 7, msg = f"Search stopped by the iteration limit should have status 7, has {status}")
+
+    def test_unknown_operator(self):
+
+        with self.assertRaises(ValueError):
+            Strict_S_Shape_LNS(2, 2, 2, 1, 1, {1:[1,2]}, operators = ("random_products",))
+
+if __name__ == "__main__":
+    unittest.main()
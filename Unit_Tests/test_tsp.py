@@ -0,0 +1,306 @@
+import unittest
+from functions.tsp import solve_single_tsp, total_distance_for_all_orders, solve_tsp_dp, solve_tsp_mip, solve_tsp_lazy, solve_tsp_transverse, solve_tsp_heuristic, tsp_model_template, RouteCache, DP_HARD_MAX_PICKS, assignment_lower_bound
+from functions.distance_matrix_generation import build_pairwise_product_distance_matrix, OrderDistanceOracle
+from functions.orders_generation import generate_orders
+import numpy as np
+import random
+import tempfile
+
+# unit testing for picker routing in the warehouse with a transverse
+
+def random_instance(num_aisles:int, num_bays:int, num_orders:int, order_size:int, seed:int) -> dict:
+    """
+    Creates a warehouse where products fill the slots in order, along with a set of random orders
+    """
+
+    slots = [(x,y) for x in range(1,num_aisles+1) for y in range(1, num_bays+1)]
+    num_products = len(slots) * 2
+    slot_assignments_dict = {prod:slots[(prod-1) // 2] for prod in range(1, num_products + 1)}
+
+    instance = {
+        "slot_assignments_dict":slot_assignments_dict,
+        "slots":slots,
+        "num_aisles":num_aisles,
+        "num_bays":num_bays,
+        "slot_capacity":2,
+        "between_aisle_dist":1,
+        "between_bay_dist":1,
+        "backtrack_penalty":1000
+    }
+
+    orders = generate_orders(num_orders, order_size, num_products, seed)
+
+    return instance, orders
+
+
+class Test_order_distance_oracle(unittest.TestCase):
+
+    def test_matches_dense_matrix(self):
+
+        instance, orders = random_instance(4, 6, 8, 5, seed = 1)
+
+        D_dense = build_pairwise_product_distance_matrix(**instance)
+        oracle = OrderDistanceOracle(build_pairwise_product_distance_matrix(**instance, compressed = True), orders)
+
+        total_dense, per_order_dense = total_distance_for_all_orders(orders, D_dense)
+        total_oracle, per_order_oracle = total_distance_for_all_orders(orders, oracle)
+
+        self.assertEqual(total_oracle, total_dense, msg = f"Total distance using the oracle is {total_oracle}, should be {total_dense}")
+        self.assertEqual(per_order_oracle, per_order_dense, msg = "Per-order distances using the oracle differ from the dense matrix")
+
+    def test_only_co_ordered_blocks_stored(self):
+
+        instance, orders = random_instance(4, 6, 8, 5, seed = 2)
+
+        oracle = OrderDistanceOracle(build_pairwise_product_distance_matrix(**instance, compressed = True), orders)
+
+        self.assertEqual(len(oracle.blocks), len(orders), msg = f"Oracle stores {len(oracle.blocks)} blocks, should store one per order ({len(orders)})")
+        self.assertEqual(oracle.nbytes, len(orders) * 6 * 6 * 8, msg = f"Oracle uses {oracle.nbytes} bytes, should only store one 6x6 block per order")
+
+        distance = solve_single_tsp(orders[1], oracle)
+        self.assertEqual(len(oracle.blocks), len(orders), msg = "Solving an order which is already cached should not add a block")
+        self.assertGreater(distance, 0, msg = f"Route distance should be positive, is {distance}")
+
+
+class Test_routing_methods(unittest.TestCase):
+
+    def test_dp_matches_mip(self):
+
+        rng = np.random.default_rng(0)
+
+        for num_picks in [1,2,4,7,9]:
+            for _ in range(3):
+                M = rng.integers(1, 50, (num_picks+1, num_picks+1)).astype(float)
+
+                distance_dp, tour_dp = solve_tsp_dp(M)
+                distance_mip, _ = solve_tsp_mip(M)
+
+                self.assertAlmostEqual(distance_dp, distance_mip, msg = f"Dynamic program distance is {distance_dp}, MIP distance is {distance_mip} for {num_picks} picks")
+
+                self.assertEqual(sorted(tour_dp[1:-1]), list(range(1, num_picks+1)), msg = f"Tour {tour_dp} does not visit every pick exactly once")
+
+                tour_length = sum(M[tour_dp[i], tour_dp[i+1]] for i in range(len(tour_dp)-1))
+                self.assertAlmostEqual(tour_length, distance_dp, msg = f"Tour length is {tour_length}, reported distance is {distance_dp}")
+
+    def test_reused_model_matches_new_model(self):
+
+        rng = np.random.default_rng(4)
+
+        for num_picks in [3,5]:
+            for _ in range(4):
+                M = rng.integers(1, 50, (num_picks+1, num_picks+1)).astype(float)
+
+                distance_reused, tour_reused = solve_tsp_mip(M)
+                distance_new, _ = solve_tsp_mip(M, reuse_model = False)
+
+                self.assertAlmostEqual(distance_reused, distance_new, msg = f"Re-solved model distance is {distance_reused}, new model distance is {distance_new} for {num_picks} picks")
+                self.assertEqual(sorted(tour_reused[1:-1]), list(range(1, num_picks+1)), msg = f"Tour {tour_reused} does not visit every pick exactly once")
+
+        self.assertIs(tsp_model_template(4), tsp_model_template(4), msg = "The model for a given number of nodes should be built once per thread")
+
+    def test_lazy_matches_dp(self):
+
+        rng = np.random.default_rng(2)
+
+        for num_picks in [1,2,3,6,9]:
+            for _ in range(3):
+                M = rng.integers(1, 50, (num_picks+1, num_picks+1)).astype(float)
+
+                distance_lazy, tour_lazy = solve_tsp_lazy(M)
+                distance_dp, _ = solve_tsp_dp(M)
+
+                self.assertAlmostEqual(distance_lazy, distance_dp, msg = f"Lazy subtour elimination distance is {distance_lazy}, dynamic program distance is {distance_dp} for {num_picks} picks")
+                self.assertEqual(sorted(tour_lazy[1:-1]), list(range(1, num_picks+1)), msg = f"Tour {tour_lazy} does not visit every pick exactly once")
+
+    def test_lazy_matches_mip_on_large_orders(self):
+
+        random.seed(3)
+        num_aisles = 10
+        num_bays = 20
+        slots = [(x,y) for x in range(1,num_aisles+1) for y in range(1, num_bays+1)]
+        placements = slots * 2
+        random.shuffle(placements)
+        slot_assignments_dict = {prod:placements[prod-1] for prod in range(1, len(placements) + 1)}
+
+        D = build_pairwise_product_distance_matrix(slot_assignments_dict, slots, num_aisles, num_bays, 2, 1, 1, 1000)
+        orders = {order_id:random.sample(range(1, len(placements) + 1), 25) for order_id in range(1, 4)}
+
+        total_lazy, per_order_lazy = total_distance_for_all_orders(orders, D, method = "lazy")
+        total_mip, per_order_mip = total_distance_for_all_orders(orders, D, method = "mip")
+
+        self.assertEqual(per_order_lazy, per_order_mip, msg = "Lazy subtour elimination and MTZ distances differ")
+
+    def test_methods_agree_on_orders(self):
+
+        instance, orders = random_instance(4, 6, 6, 6, seed = 3)
+        D = build_pairwise_product_distance_matrix(**instance)
+
+        total_mip, per_order_mip = total_distance_for_all_orders(orders, D, method = "mip")
+        total_auto, per_order_auto, tours = total_distance_for_all_orders(orders, D, method = "auto", return_tours = True)
+
+        self.assertEqual(total_auto, total_mip, msg = f"Total distance with method auto is {total_auto}, should be {total_mip}")
+
+        for order_id, tour in tours.items():
+            self.assertEqual(tour[0], 0, msg = f"Tour for order {order_id} should start at the door")
+            self.assertEqual(tour[-1], 0, msg = f"Tour for order {order_id} should end at the door")
+            self.assertEqual(sorted(tour[1:-1]), sorted(orders[order_id]), msg = f"Tour for order {order_id} does not visit each product once")
+
+    def test_structural_matches_mip(self):
+
+        random.seed(0)
+
+        for _ in range(40):
+            num_aisles = random.randint(1, 6)
+            num_bays = random.choice([2,4,6])
+            slots = [(x,y) for x in range(1,num_aisles+1) for y in range(1, num_bays+1)]
+
+            # products are placed in random slots
+            placements = slots * 2
+            random.shuffle(placements)
+            slot_assignments_dict = {prod:placements[prod-1] for prod in range(1, len(placements) + 1)}
+
+            backtrack_penalty = random.choice([15, 1000]) # a small penalty makes backtracking worthwhile on some orders
+            D = build_pairwise_product_distance_matrix(slot_assignments_dict, slots, num_aisles, num_bays, 2, 1, 1, backtrack_penalty, compressed = True)
+
+            order = random.sample(range(1, len(placements) + 1), random.randint(1, min(7, len(placements))))
+
+            distance_structural = solve_single_tsp(order, D, method = "structural")
+            distance_mip = solve_single_tsp(order, D.toarray(), method = "mip")
+
+            self.assertEqual(distance_structural, distance_mip, msg = f"Structural route distance is {distance_structural}, MIP distance is {distance_mip} for order {order}")
+
+            result = solve_tsp_transverse(order, D)
+            if result is not None:
+                self.assertEqual(result[0], distance_mip, msg = f"Structural route of length {result[0]} was accepted but the optimal distance is {distance_mip}")
+
+    def test_structural_requires_transverse_distances(self):
+
+        with self.assertRaises(ValueError):
+            solve_single_tsp([1,2], np.zeros((3,3)), method = "structural")
+
+    def test_heuristic_bounds(self):
+
+        rng = np.random.default_rng(1)
+
+        for num_picks in [3,6,9]:
+            for _ in range(5):
+                M = rng.integers(1, 50, (num_picks+1, num_picks+1)).astype(float)
+                np.fill_diagonal(M, 0)
+
+                distance_heuristic, tour, gap = solve_tsp_heuristic(M)
+                distance_optimal, _ = solve_tsp_dp(M)
+
+                self.assertEqual(sorted(tour[1:-1]), list(range(1, num_picks+1)), msg = f"Heuristic tour {tour} does not visit every pick exactly once")
+                self.assertGreaterEqual(distance_heuristic, distance_optimal - 1e-9, msg = f"Heuristic distance {distance_heuristic} is below the optimal distance {distance_optimal}")
+                self.assertLessEqual(distance_heuristic * (1 - gap), distance_optimal + 1e-9, msg = f"Lower bound {distance_heuristic * (1 - gap)} is above the optimal distance {distance_optimal}")
+
+    def test_lower_bound_with_twins_on_non_metric_distances(self):
+
+        # nodes 1 and 7 are at the same location, but the distances break the triangle inequality
+        M = np.array([[0,0,16,14,3,12,10,0],[0,0,14,6,0,1,15,0],[2,10,0,18,5,1,9,10],[16,12,1,0,6,4,8,12],[17,19,2,11,0,5,5,19],[4,4,17,4,4,0,2,4],[15,5,16,11,17,11,0,5],[0,0,14,6,0,1,15,0]], dtype=float)
+
+        distance_optimal, _ = solve_tsp_dp(M)
+        lower_bound = assignment_lower_bound(M)
+
+        self.assertLessEqual(lower_bound, distance_optimal + 1e-9, msg = f"Lower bound {lower_bound} is above the optimal distance {distance_optimal}")
+
+    def test_heuristic_on_large_orders(self):
+
+        random.seed(2)
+        num_aisles = 10
+        num_bays = 20
+        slots = [(x,y) for x in range(1,num_aisles+1) for y in range(1, num_bays+1)]
+        placements = slots * 2
+        random.shuffle(placements)
+        slot_assignments_dict = {prod:placements[prod-1] for prod in range(1, len(placements) + 1)}
+
+        D = build_pairwise_product_distance_matrix(slot_assignments_dict, slots, num_aisles, num_bays, 2, 1, 1, 1000)
+        orders = {order_id:random.sample(range(1, len(placements) + 1), 30) for order_id in range(1, 4)}
+
+        total_heuristic, _, gaps = total_distance_for_all_orders(orders, D, method = "heuristic", return_gaps = True)
+        total_mip, _ = total_distance_for_all_orders(orders, D, method = "mip")
+
+        self.assertGreaterEqual(total_heuristic, total_mip, msg = f"Heuristic total {total_heuristic} is below the optimal total {total_mip}")
+        self.assertLessEqual(total_heuristic * (1 - gaps["total"]), total_mip + 1e-9, msg = "Total lower bound is above the optimal total")
+        self.assertEqual(set(gaps.keys()), set(orders.keys()) | {"total"}, msg = f"Gaps should be reported for every order and the total, are {list(gaps.keys())}")
+
+    def test_unknown_method(self):
+
+        with self.assertRaises(ValueError):
+            solve_single_tsp([1,2], np.zeros((3,3)), method = "greedy")
+
+    def test_dp_size_limit(self):
+
+        with self.assertRaises(ValueError):
+            solve_tsp_dp(np.zeros((DP_HARD_MAX_PICKS + 2, DP_HARD_MAX_PICKS + 2)))
+
+
+class Test_parallel_routing(unittest.TestCase):
+
+    def test_parallel_matches_sequential(self):
+
+        instance, orders = random_instance(4, 6, 12, 6, seed = 4)
+        D = build_pairwise_product_distance_matrix(**instance)
+
+        total, per_order = total_distance_for_all_orders(orders, D, method = "mip")
+
+        for parallel, method in [("threads", "mip"), ("processes", "dp")]:
+            total_parallel, per_order_parallel = total_distance_for_all_orders(orders, D, method = method, parallel = parallel, num_workers = 2)
+
+            self.assertEqual(total_parallel, total, msg = f"Total distance routing with {parallel} is {total_parallel}, should be {total}")
+            self.assertEqual(list(per_order_parallel.items()), list(per_order.items()), msg = f"Per-order distances routing with {parallel} differ from sequential routing, or are in a different order")
+
+    def test_unknown_parallel_mode(self):
+
+        with self.assertRaises(ValueError):
+            total_distance_for_all_orders({1:[1,2]}, np.zeros((3,3)), parallel = "gpu")
+
+
+class Test_route_cache(unittest.TestCase):
+
+    def test_orders_at_the_same_locations_share_a_route(self):
+
+        instance, _ = random_instance(4, 6, 1, 1, seed = 5)
+        D = build_pairwise_product_distance_matrix(**instance, compressed = True)
+
+        # products 1 and 2 share a slot, as do 9 and 10 and 21 and 22, so these orders visit the same locations
+        orders = {1:[1, 9, 21], 2:[22, 2, 10], 3:[10, 21, 1]}
+
+        cache = RouteCache()
+        total, per_order, tours = total_distance_for_all_orders(orders, D, method = "dp", cache = cache, return_tours = True)
+        total_uncached, per_order_uncached = total_distance_for_all_orders(orders, D, method = "dp")
+
+        self.assertEqual(cache.misses, 1, msg = f"Only the first order should be routed, misses is {cache.misses}")
+        self.assertEqual(cache.hits, 2, msg = f"The other orders should be cache hits, hits is {cache.hits}")
+        self.assertEqual(per_order, per_order_uncached, msg = "Cached route distances differ from routing each order")
+
+        for order_id, tour in tours.items():
+            self.assertEqual(sorted(tour[1:-1]), sorted(orders[order_id]), msg = f"Cached tour {tour} does not visit the products of order {order_id}")
+
+    def test_lru_eviction(self):
+
+        instance, orders = random_instance(4, 6, 5, 4, seed = 6)
+        D = build_pairwise_product_distance_matrix(**instance)
+
+        cache = RouteCache(max_size = 2)
+        total_distance_for_all_orders(orders, D, method = "dp", cache = cache)
+
+        self.assertEqual(len(cache), 2, msg = f"Cache holds {len(cache)} routes, should hold at most 2")
+
+    def test_disk_cache_is_shared(self):
+
+        instance, orders = random_instance(4, 6, 5, 4, seed = 7)
+        D = build_pairwise_product_distance_matrix(**instance)
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            total, _ = total_distance_for_all_orders(orders, D, method = "dp", cache = RouteCache(cache_dir = cache_dir))
+
+            # a new cache, as in another worker process, finds the routes on disk
+            other_cache = RouteCache(cache_dir = cache_dir)
+            total_other, _ = total_distance_for_all_orders(orders, D, method = "dp", cache = other_cache)
+
+            self.assertEqual(other_cache.misses, 0, msg = f"Routes should be read from disk, misses is {other_cache.misses}")
+            self.assertEqual(total_other, total, msg = f"Total distance from the disk cache is {total_other}, should be {total}")
+
+if __name__ == "__main__":
+    unittest.main()
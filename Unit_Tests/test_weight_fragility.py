@@ -0,0 +1,104 @@
+import unittest
+import numpy as np
+from models.sub_models.weight_fragility import weight_fragility, weight_fragility_all_aisles
+from functions.orders_generation import generate_orders
+
+# unit testing for the second stage model assigning products to bays within each aisle
+
+class Test_crushing(unittest.TestCase):
+
+    def test_crushing_count(self):
+
+        instance = {
+            "prods_in_aisle":[1,2,3],
+            "orders":{1:[1,2,3]},
+            "cluster_assignments":[1,2,3],
+            "num_bays":3,
+            "slot_capacity":1,
+            "cluster_max_distance":3,
+            "aisle":1,
+            "output_flag":False
+        }
+
+        # when every product can crush every other, the product in the first bay is crushed by the product in the second bay, which is counted
+        # once per bay. The product in the last bay is not counted as a crusher
+        status, crushes, _, slot_assignments_dict = weight_fragility(**instance, crushing_array = np.ones((3,3)))
+        self.assertEqual(status, 2, msg = f"Model status should be optimal (2), is {status}")
+        self.assertEqual(crushes, 3, msg = f"Crushing incidents should be 3, are {crushes}")
+        self.assertEqual(sorted(slot_assignments_dict.values()), [(1,1), (1,2), (1,3)], msg = "Each product should be given its own bay")
+
+        # product 3 can crush products 1 and 2, and product 2 can crush product 1, so crushing is avoided by placing heavier products first
+        _, crushes, _, _ = weight_fragility(**instance, crushing_array = np.array([[0,1,1],[0,0,1],[0,0,0]]))
+        self.assertEqual(crushes, 0, msg = f"Crushing incidents should be 0, are {crushes}")
+
+class Test_cluster_formulations(unittest.TestCase):
+
+    def setUp(self):
+
+        self.instance = {
+            "prods_in_aisle":[1,2,3,4,5],
+            "orders":{1:[1,2,3,4], 2:[3,4,5]},
+            "crushing_array":np.ones((5,5)),
+            "cluster_assignments":[1,1,2,2,3],
+            "num_bays":6,
+            "slot_capacity":1,
+            "cluster_max_distance":1,
+            "aisle":1,
+            "output_flag":False
+        }
+
+    def test_formulations_match(self):
+
+        _, crushes_pairwise, _, _ = weight_fragility(**self.instance, cluster_formulation = "pairwise")
+
+        status, crushes, _, slot_assignments_dict = weight_fragility(**self.instance, cluster_formulation = "range")
+        self.assertEqual(status, 2, msg = f"Model status should be optimal (2), is {status}")
+        self.assertEqual(crushes, crushes_pairwise, msg = f"Crushing incidents are {crushes} with the range formulation, {crushes_pairwise} with the pairwise formulation")
+
+        for first, second in [(1,2), (3,4)]:
+            distance = abs(slot_assignments_dict[first][1] - slot_assignments_dict[second][1])
+            self.assertLessEqual(distance, 1, msg = f"Products {first} and {second} are in the same cluster but placed {distance} bays apart")
+
+    def test_unknown_formulation(self):
+
+        with self.assertRaises(ValueError):
+            weight_fragility(**self.instance, cluster_formulation = "triplets")
+
+class Test_all_aisles(unittest.TestCase):
+
+    def setUp(self):
+
+        num_aisles, num_bays, slot_capacity = 4, 4, 2
+        num_prods = num_aisles * num_bays * slot_capacity
+
+        rng = np.random.default_rng(0)
+        weights = rng.uniform(1, 10, num_prods)
+
+        self.instance = {
+            "orders":generate_orders(12, 5, num_prods, 3),
+            "aisle_assignments_dict":{aisle:list(range((aisle-1)*num_bays*slot_capacity + 1, aisle*num_bays*slot_capacity + 1)) for aisle in range(1, num_aisles + 1)},
+            "crushing_array":(weights[None,:] >= 2*weights[:,None]).astype(int),
+            "cluster_assignments":rng.integers(1, 4, num_prods).tolist(),
+            "num_bays":num_bays,
+            "slot_capacity":slot_capacity,
+            "cluster_max_distance":num_bays/2
+        }
+
+    def test_parallel_matches_sequential(self):
+
+        slot_assignments_dict, crushes = weight_fragility_all_aisles(**self.instance)
+
+        self.assertEqual(sorted(slot_assignments_dict.keys()), list(range(1, 33)), msg = "Every product should be assigned to a slot")
+
+        for parallel in ["threads", "processes"]:
+            slot_assignments_dict_parallel, crushes_parallel = weight_fragility_all_aisles(**self.instance, parallel = parallel, num_workers = 2)
+            self.assertEqual(crushes_parallel, crushes, msg = f"Crushing incidents are {crushes_parallel} with {parallel}, {crushes} sequentially")
+            self.assertEqual(list(slot_assignments_dict_parallel.keys()), list(slot_assignments_dict.keys()), msg = f"Assignments should be merged in aisle order with {parallel}")
+
+    def test_unknown_mode(self):
+
+        with self.assertRaises(ValueError):
+            weight_fragility_all_aisles(**self.instance, parallel = "gpu")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,40 +1,40 @@
 import numpy as np
 from typing import Callable, Any, Tuple
 
-def dist_i_j_strict_s_shape(i:int, j:int, num_bays:int, between_aisle_dist:float, between_bay_dist:float, big_M:float, **unused:Any) -> int:
+def dist_i_j_strict_s_shape(i:int | np.ndarray, j:int | np.ndarray, num_bays:int, between_aisle_dist:float, between_bay_dist:float, big_M:float, **unused:Any) -> float | np.ndarray:
     """
     Given two slot indices i and j, calculated the distance from i to j 
-    for the strict S-shape policy (note that this is not symmetric due to unidirectionality in the warehouse)    
+    for the strict S-shape policy (note that this is not symmetric due to unidirectionality in the warehouse).
+    i and j may also be integer arrays of slot indices, in which case the distances are calculated elementwise with broadcasting
 
     Inputs:
-    - i: the index of the first slot
-    - j: the index of the second slot
+    - i: the index of the first slot (or an array of indices)
+    - j: the index of the second slot (or an array of indices)
     - num_bays: the number of bays per aisle in the warehouse
     - between_aisle_dist: the distance between consecutive aisles in the warehouse
     - between_bay_dist: the distance between consecutive bays in the warehouse
     - big_M: a finite value that forbids backtracking in the warehouse. This allows the distance matrix to be used with a MILP solver (i.e. Gurobi)
 
     Outputs:
-    - the distance between the two bays
+    - the distance between the two bays (or an array of distances)
     """
 
     M = between_aisle_dist
     N = between_bay_dist
 
-    aisle_i = np.ceil(i/num_bays)
-    aisle_j = np.ceil(j/num_bays)
+    aisle_i = np.ceil(np.asarray(i)/num_bays)
+    aisle_j = np.ceil(np.asarray(j)/num_bays)
+    aisle_diff = aisle_j - aisle_i
     L = N*(num_bays+1)
-    if aisle_i == aisle_j:
-        return 0
-    elif aisle_i > aisle_j:
-        return big_M
-    elif (aisle_j - aisle_i) % 2 == 0:
-        return (aisle_j - aisle_i)*M + 2*L
-    elif (aisle_j - aisle_i) % 2 == 1:
-        return (aisle_j - aisle_i)*M + L
 
+    distance = np.where(aisle_diff == 0, 0,
+                        np.where(aisle_diff < 0, big_M,
+                                 np.where(aisle_diff % 2 == 0, aisle_diff*M + 2*L, aisle_diff*M + L)))
 
-def build_distance_matrix(pairwise_distance_function:Callable, num_aisles:int, num_bays:int, slot_capacity:int, between_aisle_dist:float, between_bay_dist:float, big_M:float=10000, **unused:Any):
+    return distance[()] # a scalar when i and j are scalars
+
+
+def build_distance_matrix(pairwise_distance_function:Callable, num_aisles:int, num_bays:int, slot_capacity:int, between_aisle_dist:float, between_bay_dist:float, big_M:float=10000, vectorized:bool=False, chunk_size:int=1024, **unused:Any):
     """
     Calculate the distance matrix for a particular warehouse type given its input parameters
 
@@ -46,6 +46,9 @@ def build_distance_matrix(pairwise_distance_function:Callable, num_aisles:int, n
     - between_aisle_dist: the distance between consecutive aisles in the warehouse
     - between_bay_dist: the distance between consecutive bays in the warehouse
     - big_M: a finite value that forbids backtracking in the warehouse. This allows the distance matrix to be used with a MILP solver (i.e. Gurobi)
+    - vectorized: if True, the pairwise distance function is called on broadcast grids of slot indices rather than once per pair of slots. 
+      The function must then accept index arrays (as dist_i_j_strict_s_shape does)
+    - chunk_size: in vectorized mode, the number of rows evaluated at once, which bounds the peak memory of the intermediate arrays
 
     Outputs:
     - a pairwise distance matrix for the specific warehouse structure
@@ -55,6 +58,14 @@ def build_distance_matrix(pairwise_distance_function:Callable, num_aisles:int, n
 
     d = np.zeros((total_slots, total_slots))
 
+    if vectorized:
+        j = np.arange(1, total_slots+1)[None,:]
+        for start in range(0, total_slots, chunk_size):
+            stop = min(start + chunk_size, total_slots)
+            i = np.arange(start+1, stop+1)[:,None]
+            d[start:stop,:] = pairwise_distance_function(i, j, num_bays, between_aisle_dist, between_bay_dist, big_M)
+        return d
+
     for i in range(1, total_slots+1):
         for j in range(1, total_slots+1):
             d[i-1,j-1] = pairwise_distance_function(i, j, num_bays, between_aisle_dist, between_bay_dist, big_M)
@@ -64,10 +75,211 @@ def build_distance_matrix(pairwise_distance_function:Callable, num_aisles:int, n
 
 # creating the distance matrix for the transverse warehouse
 
-def build_distance_matrix_transverse(num_aisles:int, num_bays:int, between_aisle_distance:float, between_bay_distance:float, backtrack_penalty:float) -> np.ndarray:
+# multiples of the half-aisle length (num_bays/2 + 1)*N travelled between slots in different aisles, indexed by the
+# slot classes of the first and second slot. A slot class is 2*(slot is in the top half) + (slot is in an even aisle),
+# so the order is BO, BE, TO, TE
+TRANSVERSE_HALF_AISLE_MULTIPLES = np.array([[2, 1, 1, 2],   # BO -> BO, BE, TO, TE
+                                            [1, 2, 2, 3],   # BE -> BO, BE, TO, TE
+                                            [3, 2, 2, 1],   # TO -> BO, BE, TO, TE
+                                            [2, 1, 1, 2]])  # TE -> BO, BE, TO, TE
+
+# multiples of the half-aisle length from the door to a slot, and from a slot back to the door, indexed by slot class
+TRANSVERSE_DOOR_TO_SLOT_MULTIPLES = np.array([1, 2, 2, 3])
+TRANSVERSE_SLOT_TO_DOOR_MULTIPLES = np.array([1, 0, 2, 1])
+
+
+def build_distance_matrix_transverse(num_aisles:int, num_bays:int, between_aisle_distance:float, between_bay_distance:float, backtrack_penalty:float, engine:str = "numpy") -> np.ndarray:
     """
     Calculates the pairwise distances between slots in a warehouse with directional aisles and a single transverse 
 
+    Inputs:
+    - num_aisles: the number of aisles in the warehouse
+    - num_bays: the number of bays in the warehouse
+    - between_aisle_distance: the distance between consecutive aisles in the warehouse
+    - between_bay_distance: the distance between consecutive bays in the warehouse
+    - backtrack_penalty: the penalty associated with going the wrong way down directional aisles. This is not set to inf to allow use in Gurobi models
+    - engine: "numpy" to compute the matrix in closed form using broadcast arrays, or "loop" to use the original slot-by-slot construction
+
+    Outputs:
+    - distance_matrix: the matrix of pairwise distances between all slots in the warehouse, with the door as row and column 0
+    """
+
+    if engine == "numpy":
+        return build_distance_matrix_transverse_numpy(num_aisles, num_bays, between_aisle_distance, between_bay_distance, backtrack_penalty)
+    elif engine == "loop":
+        return build_distance_matrix_transverse_loop(num_aisles, num_bays, between_aisle_distance, between_bay_distance, backtrack_penalty)
+    else:
+        raise ValueError(f"Unknown engine '{engine}', must be 'numpy' or 'loop'")
+
+
+def transverse_distances_between_slots(aisles:np.ndarray, top:np.ndarray, num_bays:int, between_aisle_distance:float, between_bay_distance:float, backtrack_penalty:float) -> np.ndarray:
+    """
+    Calculates the pairwise transverse-warehouse distances between a list of slots, given only the aisle of each slot and which half of the
+    aisle it is in, by broadcasting the slots against each other. The door is added as row and column 0
+
+    Inputs:
+    - aisles: an integer array with the aisle of each slot
+    - top: a boolean array, True if the slot is in the top half of its aisle (bay > num_bays/2)
+    - num_bays: the number of bays in the warehouse
+    - between_aisle_distance: the distance between consecutive aisles in the warehouse
+    - between_bay_distance: the distance between consecutive bays in the warehouse
+    - backtrack_penalty: the penalty associated with going the wrong way down directional aisles
+
+    Outputs:
+    - distance_matrix: the matrix of pairwise distances between the slots, with the door as row and column 0
+    """
+
+    M = between_aisle_distance
+    N = between_bay_distance
+
+    even = aisles % 2 == 0
+    slot_class = 2*top + even
+
+    aisle_diff = aisles[None,:] - aisles[:,None]
+
+    # the multiples are applied to (num_bays/2 + 1) before N, matching the order of operations in the loop version
+    half_aisle = num_bays/2 + 1
+    forward = (TRANSVERSE_HALF_AISLE_MULTIPLES[slot_class[:,None], slot_class[None,:]] * half_aisle) * N + M * aisle_diff
+
+    # within an aisle, moving between slots in the same half is free and moving between halves is only allowed with the aisle direction
+    same_half = top[:,None] == top[None,:]
+    with_direction = (~even[:,None] & ~top[:,None] & top[None,:]) | (even[:,None] & top[:,None] & ~top[None,:])
+    within_aisle = np.where(same_half, 0, np.where(with_direction, half_aisle*N, backtrack_penalty))
+
+    D = np.where(aisle_diff > 0.5, forward, np.where(aisle_diff == 0, within_aisle, backtrack_penalty)).astype(float)
+
+    # distances from the door to each slot and from each slot back to the door
+    door_to_slot = (TRANSVERSE_DOOR_TO_SLOT_MULTIPLES[slot_class] * half_aisle) * N + (aisles - 1) * M
+    slot_to_door_aisles = np.where(even, aisles - 1, np.maximum(aisles - 1, 2))
+    slot_to_door = (TRANSVERSE_SLOT_TO_DOOR_MULTIPLES[slot_class] * half_aisle) * N + M * slot_to_door_aisles
+
+    num_slots = len(aisles)
+    D_full = np.zeros((num_slots + 1, num_slots + 1))
+    D_full[0,1:] = door_to_slot
+    D_full[1:,0] = slot_to_door
+    D_full[1:,1:] = D
+
+    return D_full
+
+
+def build_distance_matrix_transverse_numpy(num_aisles:int, num_bays:int, between_aisle_distance:float, between_bay_distance:float, backtrack_penalty:float) -> np.ndarray:
+    """
+    Calculates the pairwise distances between slots in a warehouse with directional aisles and a single transverse in one pass,
+    by broadcasting the aisle, parity and half of every slot against every other slot. Gives exactly the same matrix as build_distance_matrix_transverse_loop
+
+    Inputs:
+    - num_aisles: the number of aisles in the warehouse
+    - num_bays: the number of bays in the warehouse
+    - between_aisle_distance: the distance between consecutive aisles in the warehouse
+    - between_bay_distance: the distance between consecutive bays in the warehouse
+    - backtrack_penalty: the penalty associated with going the wrong way down directional aisles
+
+    Outputs:
+    - distance_matrix: the matrix of pairwise distances between all slots in the warehouse, with the door as row and column 0
+    """
+
+    # the aisle and bay of each slot, in the same order as the slots list used elsewhere
+    aisles = np.repeat(np.arange(1, num_aisles + 1), num_bays)
+    bays = np.tile(np.arange(1, num_bays + 1), num_aisles)
+
+    return transverse_distances_between_slots(aisles, bays > num_bays/2, num_bays, between_aisle_distance, between_bay_distance, backtrack_penalty)
+
+
+class TransverseDistance:
+    """
+    A compressed representation of the pairwise distance matrix of the transverse warehouse. Under the transverse policy the distance between
+    two slots depends only on the aisle of each slot and on which half of the aisle it is in, so only a (2A+1)x(2A+1) table of block distances
+    is stored (block 0 is the door, and block 2*(aisle-1) + 1 + top is one half of an aisle), along with the block of every row of the matrix.
+
+    The object is indexed like the dense matrix it replaces, so D[i,j] works for scalar indices, index arrays and broadcast index grids.
+    By default the rows are the slot rows of build_distance_matrix_transverse (0 is the door, slot s in the slots list is row s+1).
+    Use for_products to re-index it by product, giving the same entries as build_pairwise_product_distance_matrix
+    """
+
+    def __init__(self, num_aisles:int, num_bays:int, between_aisle_distance:float, between_bay_distance:float, backtrack_penalty:float, blocks:np.ndarray = None):
+        self.num_aisles = num_aisles
+        self.num_bays = num_bays
+        self.between_aisle_distance = between_aisle_distance
+        self.between_bay_distance = between_bay_distance
+        self.backtrack_penalty = backtrack_penalty
+
+        # one representative slot for the bottom and top half of each aisle
+        block_aisles = np.repeat(np.arange(1, num_aisles + 1), 2)
+        block_top = np.tile(np.array([False, True]), num_aisles)
+        self.table = transverse_distances_between_slots(block_aisles, block_top, num_bays, between_aisle_distance, between_bay_distance, backtrack_penalty)
+
+        if blocks is None:
+            # the block of each slot row, with the door in row 0
+            aisles = np.repeat(np.arange(1, num_aisles + 1), num_bays)
+            bays = np.tile(np.arange(1, num_bays + 1), num_aisles)
+            blocks = np.concatenate(([0], 2*(aisles - 1) + 1 + (bays > num_bays/2)))
+
+        self.blocks = np.asarray(blocks, dtype=np.intp)
+
+    @property
+    def shape(self) -> Tuple[int,int]:
+        return (len(self.blocks), len(self.blocks))
+
+    @property
+    def fingerprint(self) -> str:
+        """
+        Identifies the block distances, which are fully determined by the layout parameters. The distances are cast to float first, so that
+        equal layouts given as 1 and 1.0 (or np.float64(1)) share a fingerprint
+        """
+        return f"transverse_A{int(self.num_aisles)}_B{int(self.num_bays)}_M{float(self.between_aisle_distance)!r}_N{float(self.between_bay_distance)!r}_P{float(self.backtrack_penalty)!r}"
+
+    def __len__(self) -> int:
+        return len(self.blocks)
+
+    def __getitem__(self, key:Tuple[Any,Any]) -> Any:
+        i, j = key
+        return self.table[self.blocks[i], self.blocks[j]]
+
+    def distance(self, i:int, j:int) -> float:
+        """
+        The distance from row i to row j as a Python float
+        """
+        return float(self.table[self.blocks[i], self.blocks[j]])
+
+    def gather(self, rows:np.ndarray, cols:np.ndarray = None) -> np.ndarray:
+        """
+        The dense sub-matrix between the given rows and columns (the columns default to the rows), i.e. D[np.ix_(rows, cols)]
+        """
+        rows = np.asarray(rows, dtype=np.intp)
+        cols = rows if cols is None else np.asarray(cols, dtype=np.intp)
+        return self.table[self.blocks[rows][:,None], self.blocks[cols][None,:]]
+
+    def for_products(self, slot_assignments_dict:dict[int,Tuple[int,int]], slots:list[Tuple[int,int]], num_products:int) -> "TransverseDistance":
+        """
+        Re-indexes a slot-level TransverseDistance by product, so that row 0 is the door and row prod is the slot holding prod
+        """
+        idx = build_product_slot_index(slot_assignments_dict, slots, num_products)
+        return TransverseDistance(self.num_aisles, self.num_bays, self.between_aisle_distance, self.between_bay_distance, self.backtrack_penalty, blocks=self.blocks[idx])
+
+    def toarray(self, dtype:np.dtype = None) -> np.ndarray:
+        """
+        Materialises the full dense matrix. An integer dtype is only allowed when every distance is a whole number within its range, as the
+        cast would otherwise silently truncate or wrap them
+        """
+        if dtype is not None and np.issubdtype(dtype, np.integer):
+            if not np.array_equal(self.table, np.round(self.table)):
+                raise ValueError(f"Distances are not all whole numbers, so cannot be stored as {np.dtype(dtype)}. Use a float dtype")
+
+            limits = np.iinfo(dtype)
+            if self.table.min() < limits.min or self.table.max() > limits.max:
+                raise ValueError(f"Distances up to {self.table.max()} do not fit in {np.dtype(dtype)}")
+
+        D = self.table[self.blocks[:,None], self.blocks[None,:]]
+        if dtype is not None:
+            D = D.astype(dtype, copy=False)
+        return D
+
+
+def build_distance_matrix_transverse_loop(num_aisles:int, num_bays:int, between_aisle_distance:float, between_bay_distance:float, backtrack_penalty:float) -> np.ndarray:
+    """
+    Calculates the pairwise distances between slots in a warehouse with directional aisles and a single transverse, slot by slot.
+    This is the reference implementation for build_distance_matrix_transverse_numpy, and is slow for large warehouses
+
     Inputs:
     - num_aisles: the number of aisles in the warehouse
     - num_bays: the number of bays in the warehouse
@@ -227,46 +439,125 @@ def build_distance_matrix_transverse(num_aisles:int, num_bays:int, between_aisle
     return D_full
 
 
-def build_pairwise_product_distance_matrix(slot_assignments_dict:dict[int,Tuple[int,int]], slots:list[Tuple[int,int]], num_aisles:int, num_bays:int, slot_capacity:int, between_aisle_dist:float, between_bay_dist:float, backtrack_penalty:int) -> np.ndarray:
+def build_product_slot_index(slot_assignments_dict:dict[int,Tuple[int,int]], slots:list[Tuple[int,int]], num_products:int) -> np.ndarray:
+    """
+    Converts the assignments of products to slots into an array of row/column indices of the slot distance matrix, so that product
+    distances can be gathered with NumPy fancy indexing instead of being looked up one pair at a time
+
+    Inputs:
+    - slot_assignments_dict: the assignments of products to slots
+    - slots: the list of (aisle, bay) slots, in the order used by the rows of the slot distance matrix
+    - num_products: the number of products in the warehouse. Products are numbered from 1 to num_products
+
+    Outputs:
+    - idx: an integer array of length num_products+1, where idx[0] = 0 is the door and idx[prod] is the row of the slot holding prod
+    """
+
+    slot_positions = {slot:i+1 for i, slot in enumerate(slots)} # the door takes row 0 of the slot distance matrix
+
+    idx = np.zeros(num_products+1, dtype=np.intp)
+    for prod in range(1, num_products+1):
+        idx[prod] = slot_positions[slot_assignments_dict[prod]]
+
+    return idx
+
+
+def build_pairwise_product_distance_matrix(slot_assignments_dict:dict[int,Tuple[int,int]], slots:list[Tuple[int,int]], num_aisles:int, num_bays:int, slot_capacity:int, between_aisle_dist:float, between_bay_dist:float, backtrack_penalty:int, dtype:np.dtype = None, compressed:bool = False) -> np.ndarray | TransverseDistance:
     """
     Takes the matrix for the pairwise distances between slots in the warehouse and the product assignments to create a new distance matrix for the pairwise distances between products
 
     Inputs:
     - slot_assignments_dict: the assignments of products to slots
+    - slots: the list of (aisle, bay) slots in the warehouse, ordered by aisle and then bay
     - num_aisles: the number of aisles in the warehouse
     - num_bays: the number of bays in the warehouse
     - slot_capacity: the capacity of a single slot in the warehouse. The standard is two
     - between_aisle_dist: the distance between consecutive aisles in the warehouse
     - between_bay_dist: the distance between two consecutive bays in the warehouse
     - backtrack_penalty: the penalty enforcing aisle directionality
+    - dtype: the dtype of the returned matrix (e.g. np.float32 or np.int32 to halve memory on large layouts). Defaults to float64. An integer dtype
+      raises a ValueError unless every distance is a whole number (e.g. whole between_aisle_dist, between_bay_dist and backtrack_penalty)
+    - compressed: if True, return a product-indexed TransverseDistance instead of materialising the dense matrix
 
     Outputs:
-    - distance_matrix: the matrix of pairwise distances between products in the warehouse
+    - distance_matrix: the matrix of pairwise distances between products in the warehouse, with the door as row and column 0
     """
 
-    between_slot_distance_matrix = build_distance_matrix_transverse(num_aisles, num_bays, between_aisle_dist, between_bay_dist, backtrack_penalty)
     num_slots = num_aisles * num_bays
     num_products = num_slots * slot_capacity
-    between_prod_distance_matrix = np.zeros((num_products+1, num_products+1))
-    
-    # between pairs of products
-    for prod_1 in range(1, num_products+1):
-        for prod_2 in range(1, num_products+1):
-            slot_1 = slot_assignments_dict[prod_1] # extracts the tuple associated with the slot to which the product is assigned
-            slot_2 = slot_assignments_dict[prod_2]
-            distance = between_slot_distance_matrix[slots.index(slot_1)+1, slots.index(slot_2)+1] # extract the distance between the two slots to whih the products are assigned
-            between_prod_distance_matrix[prod_1,prod_2] = distance # this is equal to the distance between the two products
-
-    # from door to product
-    for prod in range(1, num_products+1):
-        slot = slot_assignments_dict[prod]
-        distance = between_slot_distance_matrix[0,slots.index(slot)+1]
-        between_prod_distance_matrix[0,prod] = distance
 
-    # from product to door
-    for prod in range(1, num_products+1):
-        slot = slot_assignments_dict[prod]
-        distance = between_slot_distance_matrix[slots.index(slot)+1,0]
-        between_prod_distance_matrix[prod,0] = distance
+    # the block-compressed slot distances, re-indexed by product (and the door) so all pairs are gathered at once without building the dense slot matrix
+    between_prod_distances = TransverseDistance(num_aisles, num_bays, between_aisle_dist, between_bay_dist, backtrack_penalty).for_products(slot_assignments_dict, slots, num_products)
+
+    if compressed:
+        return between_prod_distances
+
+    return between_prod_distances.toarray(dtype)
+
+
+def order_distance_block(nodes:list[int], distance_matrix:Any) -> np.ndarray:
+    """
+    Extracts the small dense matrix of pairwise distances between the given nodes (e.g. the door and the products in one order)
+
+    Inputs:
+    - nodes: the rows of the distance matrix to extract, such as [0] + order
+    - distance_matrix: a dense numpy array, or any distance provider with a gather method (TransverseDistance, OrderDistanceOracle)
+
+    Outputs:
+    - block: the len(nodes) x len(nodes) matrix of distances, where block[i,j] is the distance from nodes[i] to nodes[j]
+    """
+
+    if hasattr(distance_matrix, "gather"):
+        return distance_matrix.gather(nodes)
+
+    nodes = np.asarray(nodes, dtype=np.intp)
+    return np.asarray(distance_matrix)[np.ix_(nodes, nodes)]
+
+
+class OrderDistanceOracle:
+    """
+    A routing distance provider which only computes and stores the distances between products that appear in the same order (and the door).
+    Each order's distances are kept as a small dense block, so memory scales with the sum of squared order sizes rather than with the
+    square of the number of products. Blocks are computed from the source distance provider on first use and then cached.
+
+    It can be passed anywhere a product distance matrix is accepted by solve_single_tsp and total_distance_for_all_orders
+    """
 
-    return between_prod_distance_matrix
\ No newline at end of file
+    def __init__(self, source:Any, orders:dict[int,list[int]] = None):
+        """
+        Inputs:
+        - source: the product distance provider to take distances from. This can be a dense matrix, but a TransverseDistance avoids ever building one
+        - orders: the orders whose blocks should be computed up front. Other node sets are computed lazily
+        """
+        self.source = source
+        self.blocks = {}
+
+        if orders is not None:
+            for order in orders.values():
+                self.gather([0] + list(order))
+
+    @property
+    def shape(self) -> Tuple[int,int]:
+        return self.source.shape
+
+    @property
+    def nbytes(self) -> int:
+        return sum(block.nbytes for block in self.blocks.values())
+
+    def __getitem__(self, key:Tuple[Any,Any]) -> Any:
+        return self.source[key]
+
+    def gather(self, rows:list[int], cols:list[int] = None) -> np.ndarray:
+        """
+        The dense block of distances between the given rows and columns (the columns default to the rows). Square blocks are cached by their rows
+        """
+        if cols is not None:
+            rows = np.asarray(rows, dtype=np.intp)
+            cols = np.asarray(cols, dtype=np.intp)
+            return np.asarray(self.source[rows[:,None], cols[None,:]])
+
+        key = tuple(int(r) for r in rows)
+        if key not in self.blocks:
+            self.blocks[key] = order_distance_block(key, self.source)
+
+        return self.blocks[key]
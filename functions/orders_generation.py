@@ -1,5 +1,5 @@
 import random
-from typing import Any
+from typing import Any, Tuple
 
 def generate_orders(num_orders:int, order_size:int, num_products:int, seed:int, **unused:Any) -> dict[int:list[int]]:
     """
@@ -53,4 +53,31 @@ def reduce_orders(orders:dict[int:list[int]], aisle:int, aisle_assignments_dict:
     # delete empty orders
     orders_new = {k:v for k,v in orders_new.items() if v}
 
-    return orders_new, prods_in_aisle
\ No newline at end of file
+    return orders_new, prods_in_aisle
+
+def collapse_duplicate_orders(orders:dict[int,list[int]] | list[list[int]], first_key:int = 1) -> Tuple[dict[int,list[int]], dict[int,int]]:
+    """
+    Merges orders containing the same set of products into a single order, weighted by the number of copies. The distance of an order only
+    depends on its set of products, so the models can solve each distinct order once and multiply its distance by its weight
+
+    Inputs:
+    - orders: the dictionary (or list) of orders
+    - first_key: the number given to the first distinct order. The rest are numbered consecutively, in order of first appearance
+
+    Outputs:
+    - collapsed_orders: the distinct orders, each as the products of its first copy
+    - weights: the number of copies of each distinct order
+    """
+
+    distinct = {}
+    for prods in (orders.values() if isinstance(orders, dict) else orders):
+        product_set = frozenset(prods)
+        if product_set in distinct:
+            distinct[product_set][1] += 1
+        else:
+            distinct[product_set] = [list(prods), 1]
+
+    collapsed_orders = {first_key + i:prods for i, (prods, _) in enumerate(distinct.values())}
+    weights = {first_key + i:count for i, (_, count) in enumerate(distinct.values())}
+
+    return collapsed_orders, weights
@@ -0,0 +1,61 @@
+from typing import Tuple
+
+def group_products_by_signature(orders:dict[int,list[int]], products:list[int]) -> Tuple[list[list[int]], list[frozenset[int]]]:
+    """
+    Groups products by their order membership signature, the set of orders they appear in. Products with the same signature (including every product
+    which appears in no order) are interchangeable in the slotting models, so only the number of each class placed in each aisle needs to be decided
+
+    Inputs:
+    - orders: the dictionary of orders, with order numbers as keys and lists of products as values
+    - products: every product to be assigned a slot
+
+    Outputs:
+    - classes: the products in each class, in increasing product order. Classes are ordered by their smallest product
+    - signatures: the set of orders containing the products of each class
+    """
+
+    membership = {prod:set() for prod in products}
+    for order, prods in orders.items():
+        for prod in prods:
+            membership[prod].add(order)
+
+    classes_by_signature = {}
+    for prod in sorted(products):
+        classes_by_signature.setdefault(frozenset(membership[prod]), []).append(prod)
+
+    signatures = list(classes_by_signature.keys())
+    classes = list(classes_by_signature.values())
+
+    return classes, signatures
+
+
+def expand_class_counts(classes:list[list[int]], counts:dict[Tuple[int,int],int], aisles:list[int]) -> dict[int,list[int]]:
+    """
+    Expands the number of products of each class placed in each aisle back into an assignment of individual products to aisles. Products within a
+    class are interchangeable, so they are handed out in increasing product order, filling aisles in increasing order
+
+    Inputs:
+    - classes: the products in each class, as returned by group_products_by_signature
+    - counts: the number of products of class c in aisle a, keyed by (a,c)
+    - aisles: the aisles of the warehouse
+
+    Output:
+    - aisle_assignments_dict: the assignment of products to aisles, with aisles as keys and lists of products (in increasing order) as values
+    """
+
+    aisle_assignments_dict = {aisle:[] for aisle in aisles}
+
+    for c, prods in enumerate(classes):
+        start = 0
+        for aisle in aisles:
+            count = counts[aisle,c]
+            aisle_assignments_dict[aisle].extend(prods[start:start + count])
+            start += count
+
+        if start != len(prods):
+            raise ValueError(f"Class {c} has {len(prods)} products, but {start} were placed in aisles")
+
+    for aisle in aisles:
+        aisle_assignments_dict[aisle].sort()
+
+    return aisle_assignments_dict
@@ -0,0 +1,169 @@
+import numpy as np
+from typing import Tuple, Any
+
+def product_aisle_array(aisle_assignments_dict:dict[int,list[int]], num_products:int = None) -> np.ndarray:
+    """
+    Converts an assignment of products to aisles into an array giving the aisle of each product
+
+    Inputs:
+    - aisle_assignments_dict: the assignment of products to aisles, with aisles as keys and lists of products as values
+    - num_products: the number of products. Defaults to the largest product assigned
+
+    Output:
+    - product_aisles: an integer array where entry k is the aisle of product k. Entry 0 (the door) and unassigned products are 0
+    """
+
+    if num_products is None:
+        num_products = max((max(prods) for prods in aisle_assignments_dict.values() if prods), default=0)
+
+    product_aisles = np.zeros(num_products + 1, dtype=np.int64)
+    for aisle, prods in aisle_assignments_dict.items():
+        product_aisles[np.asarray(prods, dtype=np.int64)] = aisle
+
+    return product_aisles
+
+
+class StrictSShapeEvaluator:
+    """
+    Scores aisle assignments with the Strict S-Shape objective in closed form, without solving the MILP. For each order, the distance is
+
+        L * (visited aisles + consecutive visited aisles with the same direction + (1 - first aisle odd) + last aisle odd)
+        + 2 * (last aisle - 1) + 2 * M * (only the first aisle is visited)
+
+    where L = between_bay_dist * (num_bays + 1) and M = between_aisle_dist, exactly as in the objective of Strict_S_Shape. Aisles alternate direction,
+    so consecutive visited aisles share a direction when their indices have the same parity. The model may also pass through aisles without picks,
+    which is only ever cheaper when the order's picks are all in the first aisle: passing through the second aisle as well costs 2 rather than the 2 * M
+    penalty, so the penalty is charged as 2 * min(M, 1) when there is a second aisle. The model still routes an order with no picks through a first and
+    last aisle, so it is charged the cheapest route through a single aisle. The orders are stored as a padded array once, so many candidate assignments
+    can be scored in a single batch
+
+    Inputs:
+    - orders: the set of orders
+    - num_aisles: the number of aisles in the warehouse
+    - num_bays: the number of bays each aisle is split into
+    - between_aisle_dist: the distance between consecutive aisles
+    - between_bay_dist: the distance between consecutive rows
+    """
+
+    def __init__(self, orders:dict[int,list[int]], num_aisles:int, num_bays:int, between_aisle_dist:float, between_bay_dist:float, **unused:Any):
+        self.order_ids = list(orders.keys())
+        self.num_aisles = num_aisles
+        self.L = between_bay_dist * (num_bays + 1)
+        self.M = between_aisle_dist
+
+        # the products of each order, padded with product 0 to the size of the largest order
+        max_order_size = max((len(prods) for prods in orders.values()), default=0)
+        self.order_products = np.zeros((len(orders), max_order_size), dtype=np.int64)
+        self.padding = np.ones((len(orders), max_order_size), dtype=bool)
+        for o, prods in enumerate(orders.values()):
+            self.order_products[o,:len(prods)] = prods
+            self.padding[o,:len(prods)] = False
+
+        self.aisles = np.arange(1, num_aisles + 1)
+
+        # the distance Strict_S_Shape charges an order with no picks
+        self.empty_order_distance = float(self.visited_distances(np.eye(num_aisles, dtype=bool)).min()) if num_aisles > 0 else 0.0
+
+    def visited_aisles(self, product_aisles:np.ndarray, order_indices:np.ndarray = None) -> np.ndarray:
+        """
+        Returns a boolean array of shape (..., number of orders, num_aisles), true where the order has a pick in the aisle. product_aisles may be a
+        single product to aisle array or a batch of them stacked along the first axis. order_indices restricts the result to those orders (by position)
+        """
+
+        order_products = self.order_products if order_indices is None else self.order_products[order_indices]
+        padding = self.padding if order_indices is None else self.padding[order_indices]
+
+        aisles = np.asarray(product_aisles)[..., order_products]
+
+        if np.any((aisles == 0) & ~padding):
+            raise ValueError("Every product in an order must be assigned to an aisle")
+
+        # padded entries are sent to a spare column beyond the last aisle
+        aisles = np.where(padding, self.num_aisles + 1, aisles)
+
+        visited = np.zeros(aisles.shape[:-1] + (self.num_aisles + 2,), dtype=bool)
+        np.put_along_axis(visited, aisles, True, axis=-1)
+
+        return visited[..., 1:self.num_aisles + 1]
+
+    def order_distances(self, product_aisles:np.ndarray, order_indices:np.ndarray = None) -> np.ndarray:
+        """
+        Returns the Strict S-Shape distance of every order, as an array of shape (..., number of orders) in the order of orders.keys().
+        Orders with no picks have distance empty_order_distance
+
+        Inputs:
+        - product_aisles: the aisle of each product (see product_aisle_array), or a batch of these stacked along the first axis
+        - order_indices: the positions of the orders to score. Defaults to every order
+        """
+
+        visited = self.visited_aisles(product_aisles, order_indices)
+
+        return np.where(visited.any(axis=-1), self.visited_distances(visited), self.empty_order_distance)
+
+    def visited_distances(self, visited:np.ndarray) -> np.ndarray:
+        """
+        Returns the Strict S-Shape distance of routes through the given visited aisles, from a boolean array of shape (..., num_aisles) with at least
+        one aisle visited in each route
+        """
+
+        aisles = self.aisles
+
+        num_visited = visited.sum(axis=-1)
+        first = np.argmax(visited, axis=-1) + 1
+        last = self.num_aisles - np.argmax(visited[...,::-1], axis=-1)
+
+        # the previous visited aisle before each aisle (0 if there is none)
+        previous = np.maximum.accumulate(np.where(visited, aisles, 0), axis=-1)
+        previous = np.concatenate([np.zeros_like(previous[...,:1]), previous[...,:-1]], axis=-1)
+        same_direction_pairs = (visited & (previous > 0) & ((aisles - previous) % 2 == 0)).sum(axis=-1)
+
+        first_odd = first % 2
+        last_odd = last % 2
+        first_aisle_only = (num_visited == 1) & (first == 1)
+
+        first_aisle_only_penalty = 2 * min(self.M, 1) if self.num_aisles > 1 else 2 * self.M
+
+        distances = self.L * (num_visited + same_direction_pairs + (1 - first_odd) + last_odd) + 2 * (last - 1) + first_aisle_only_penalty * first_aisle_only
+
+        return distances
+
+    def total_distance(self, product_aisles:np.ndarray) -> float | np.ndarray:
+        """
+        Returns the total Strict S-Shape distance over all orders, for a single assignment or for each assignment in a batch
+        """
+
+        return self.order_distances(product_aisles).sum(axis=-1)
+
+    def evaluate(self, aisle_assignments_dict:dict[int,list[int]]) -> Tuple[float, dict[int,float]]:
+        """
+        Scores a single assignment of products to aisles, returning the total distance and the distance of each order
+        """
+
+        num_products = int(self.order_products.max(initial=0))
+        num_products = max([num_products] + [max(prods) for prods in aisle_assignments_dict.values() if prods])
+
+        distances = self.order_distances(product_aisle_array(aisle_assignments_dict, num_products))
+
+        return float(distances.sum()), {order:float(distance) for order, distance in zip(self.order_ids, distances)}
+
+
+def evaluate_strict_s_shape(aisle_assignments_dict:dict[int,list[int]], orders:dict[int,list[int]], num_aisles:int, num_bays:int, between_aisle_dist:float, between_bay_dist:float, **unused:Any) -> Tuple[float, dict[int,float]]:
+    """
+    Scores an assignment of products to aisles with the Strict S-Shape objective in closed form (see StrictSShapeEvaluator)
+
+    Inputs:
+    - aisle_assignments_dict: the assignment of products to aisles, as returned by Strict_S_Shape
+    - orders: the set of orders
+    - num_aisles: the number of aisles in the warehouse
+    - num_bays: the number of bays each aisle is split into
+    - between_aisle_dist: the distance between consecutive aisles
+    - between_bay_dist: the distance between consecutive rows
+
+    Outputs:
+    - distance: the total distance over all orders, equal to the Strict_S_Shape objective for this assignment
+    - order_distances: the distance of each order
+    """
+
+    evaluator = StrictSShapeEvaluator(orders, num_aisles, num_bays, between_aisle_dist, between_bay_dist)
+
+    return evaluator.evaluate(aisle_assignments_dict)
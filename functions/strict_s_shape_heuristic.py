@@ -0,0 +1,256 @@
+import numpy as np
+import time
+from typing import Tuple, Any
+from itertools import chain
+from functions.strict_s_shape_evaluation import StrictSShapeEvaluator
+
+def greedy_strict_s_shape(orders:dict[int,list[int]], num_aisles:int, aisle_capacity:int, num_products:int) -> np.ndarray:
+    """
+    Builds an assignment of products to aisles greedily. Products are placed in decreasing order of the number of orders they appear in, each into the
+    aisle with spare capacity already visited by the most of its orders (its affinity), breaking ties by the lowest aisle. Frequently picked products
+    are therefore packed together towards the front of the warehouse
+
+    Inputs:
+    - orders: the set of orders
+    - num_aisles: the number of aisles in the warehouse
+    - aisle_capacity: the number of products each aisle can hold
+    - num_products: the number of products, numbered from 1. Products in no order are left unassigned (aisle 0)
+
+    Output:
+    - product_aisles: an integer array where entry k is the aisle of product k
+    """
+
+    order_ids = list(orders.keys())
+    orders_of_product = {}
+    for o, order in enumerate(order_ids):
+        for prod in orders[order]:
+            orders_of_product.setdefault(prod, []).append(o)
+
+    # the number of products of each order already placed in each aisle
+    order_aisle_counts = np.zeros((len(order_ids), num_aisles + 1), dtype=np.int64)
+    aisle_counts = np.zeros(num_aisles + 1, dtype=np.int64)
+    aisle_counts[0] = aisle_capacity # aisle 0 is never chosen
+    product_aisles = np.zeros(num_products + 1, dtype=np.int64)
+
+    for prod in sorted(orders_of_product, key=lambda prod: (-len(orders_of_product[prod]), prod)):
+        affinity = (order_aisle_counts[orders_of_product[prod]] > 0).sum(axis=0)
+        affinity[aisle_counts >= aisle_capacity] = -1
+
+        aisle = int(np.argmax(affinity))
+        product_aisles[prod] = aisle
+        aisle_counts[aisle] += 1
+        order_aisle_counts[orders_of_product[prod], aisle] += 1
+
+    return product_aisles
+
+
+def greedy_orders_strict_s_shape(orders:dict[int,list[int]], num_aisles:int, aisle_capacity:int, num_products:int) -> np.ndarray:
+    """
+    Builds an assignment of products to aisles greedily, an order at a time. Orders are taken in decreasing order of the total frequency of their
+    products, and each unplaced product joins the aisle holding the most of its order's products already, or otherwise the lowest aisle with space for
+    the rest of the order. Orders are therefore kept within as few aisles as possible
+
+    Inputs:
+    - orders: the set of orders
+    - num_aisles: the number of aisles in the warehouse
+    - aisle_capacity: the number of products each aisle can hold
+    - num_products: the number of products, numbered from 1. Products in no order are left unassigned (aisle 0)
+
+    Output:
+    - product_aisles: an integer array where entry k is the aisle of product k
+    """
+
+    frequency = np.bincount(list(chain.from_iterable(orders.values())), minlength=num_products + 1)
+
+    aisle_counts = np.zeros(num_aisles + 1, dtype=np.int64)
+    aisle_counts[0] = aisle_capacity # aisle 0 is never chosen
+    product_aisles = np.zeros(num_products + 1, dtype=np.int64)
+
+    for order in sorted(orders, key=lambda order: (-frequency[orders[order]].sum(), order)):
+        unplaced = [prod for prod in dict.fromkeys(orders[order]) if product_aisles[prod] == 0]
+        placed = np.bincount(product_aisles[orders[order]], minlength=num_aisles + 1)
+        placed[0] = 0
+
+        for i, prod in enumerate(unplaced):
+            spare = aisle_capacity - aisle_counts
+            remaining = len(unplaced) - i
+
+            # the aisle with most of the order, then an aisle with room for the rest of the order, then the lowest aisle with any room
+            score = np.where(spare > 0, placed * 2 * (aisle_capacity + 1) + (spare >= remaining) * (aisle_capacity + 1), -1)
+            aisle = int(np.argmax(score))
+
+            product_aisles[prod] = aisle
+            aisle_counts[aisle] += 1
+            placed[aisle] += 1
+
+    return product_aisles
+
+
+def order_concentration(product_aisles:np.ndarray, evaluator:StrictSShapeEvaluator, order_indices:np.ndarray) -> np.ndarray:
+    """
+    Returns the sum over the given orders and aisles of the squared number of the order's products in the aisle, for a single assignment or a batch.
+    This grows as orders are packed into fewer aisles, so it rewards moves towards emptying an aisle of an order's products even before the distance falls
+    """
+
+    order_products = evaluator.order_products[order_indices]
+    aisles = np.where(evaluator.padding[order_indices], 0, np.asarray(product_aisles)[..., order_products])
+
+    counts = (aisles[...,None] == evaluator.aisles).sum(axis=-2)
+
+    return (counts**2).sum(axis=(-2,-1))
+
+
+def local_search_strict_s_shape(product_aisles:np.ndarray, evaluator:StrictSShapeEvaluator, orders_of_product:dict[int,np.ndarray], aisle_capacity:int, time_limit:float = None, max_partners:int = 64, seed:int = 0) -> np.ndarray:
+    """
+    Improves an assignment of products to aisles by exchanging the contents of two aisles, moving single products to aisles with spare capacity and
+    swapping pairs of products in different aisles, taking the best improving change for each product in turn until no product can be improved or the time limit is reached. Each change is
+    scored exactly with the evaluator, over only the orders containing the products involved. Changes which leave the distance unchanged are accepted
+    if they pack orders into fewer aisles (order_concentration), as an order's distance only falls once all of its products leave an aisle
+
+    Inputs:
+    - product_aisles: the starting assignment, with products in no order unassigned (aisle 0)
+    - evaluator: the StrictSShapeEvaluator for the orders
+    - orders_of_product: the positions (in the evaluator) of the orders containing each product
+    - aisle_capacity: the number of products each aisle can hold
+    - time_limit: the time budget in seconds. Defaults to no limit
+    - max_partners: the largest number of products (sampled at random) considered as swap partners for each product
+    - seed: the seed for sampling swap partners and the order products are visited in
+
+    Output:
+    - product_aisles: the improved assignment
+    """
+
+    start = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    product_aisles = product_aisles.copy()
+    num_aisles = evaluator.num_aisles
+
+    products = np.array(sorted(orders_of_product), dtype=np.int64)
+    aisle_counts = np.bincount(product_aisles[products], minlength=num_aisles + 1)
+
+    # relabellings which exchange the contents of two aisles
+    exchanges = []
+    for a in range(1, num_aisles + 1):
+        for b in range(a + 1, num_aisles + 1):
+            relabel = np.arange(num_aisles + 1)
+            relabel[[a,b]] = [b,a]
+            exchanges.append(relabel)
+    exchanges = np.array(exchanges, dtype=np.int64).reshape(-1, num_aisles + 1)
+
+    improved = True
+    while improved:
+        improved = False
+
+        # exchanging whole aisles changes their directions and positions without splitting any order
+        if len(exchanges) > 0:
+            candidates = exchanges[:,product_aisles]
+            distances = evaluator.total_distance(candidates)
+            best = int(np.argmin(distances))
+            if distances[best] < evaluator.total_distance(product_aisles) - 1e-9:
+                product_aisles = candidates[best]
+                aisle_counts = np.bincount(product_aisles[products], minlength=num_aisles + 1)
+
+        for prod in rng.permutation(products):
+            if time_limit is not None and time.perf_counter() - start > time_limit:
+                return product_aisles
+
+            aisle = product_aisles[prod]
+
+            # moves to every other aisle with spare capacity, then swaps with products in other aisles
+            move_aisles = np.flatnonzero(aisle_counts[1:] < aisle_capacity) + 1
+            move_aisles = move_aisles[move_aisles != aisle]
+            partners = products[product_aisles[products] != aisle]
+            if len(partners) > max_partners:
+                partners = rng.choice(partners, max_partners, replace=False)
+
+            if len(move_aisles) + len(partners) == 0:
+                continue
+
+            candidates = np.repeat(product_aisles[None,:], len(move_aisles) + len(partners), axis=0)
+            candidates[:,prod] = np.concatenate([move_aisles, product_aisles[partners]])
+            candidates[len(move_aisles) + np.arange(len(partners)), partners] = aisle
+
+            # only the orders containing the product or one of its partners can change
+            affected = np.unique(np.concatenate([orders_of_product[prod]] + [orders_of_product[partner] for partner in partners]))
+            current = evaluator.order_distances(product_aisles, affected).sum()
+            deltas = evaluator.order_distances(candidates, affected).sum(axis=-1) - current
+
+            # changes which do not increase the distance are ranked by the distance, then by how much they concentrate orders
+            concentration_gains = order_concentration(candidates, evaluator, affected) - order_concentration(product_aisles, evaluator, affected)
+            improving = (deltas < -1e-9) | ((deltas <= 1e-9) & (concentration_gains > 0))
+
+            best = int(np.lexsort((-concentration_gains, np.where(improving, deltas, np.inf)))[0])
+            if improving[best]:
+                if best < len(move_aisles):
+                    aisle_counts[aisle] -= 1
+                    aisle_counts[move_aisles[best]] += 1
+                product_aisles = candidates[best]
+                improved = True
+
+    return product_aisles
+
+
+def fill_unassigned_products(product_aisles:np.ndarray, num_aisles:int, aisle_capacity:int) -> np.ndarray:
+    """
+    Places every unassigned product (aisle 0) into the remaining space, filling aisles in increasing order. Products in no order do not affect the
+    distance, so they are only placed once the products in orders have been assigned
+    """
+
+    product_aisles = product_aisles.copy()
+
+    aisle_counts = np.bincount(product_aisles[1:], minlength=num_aisles + 1)
+    free_slots = np.repeat(np.arange(1, num_aisles + 1), aisle_capacity - aisle_counts[1:])
+    unassigned = np.flatnonzero(product_aisles[1:] == 0) + 1
+    product_aisles[unassigned] = free_slots[:len(unassigned)]
+
+    return product_aisles
+
+
+def strict_s_shape_heuristic(orders:dict[int,list[int]], num_aisles:int, num_bays:int, slot_capacity:int, between_aisle_dist:float, between_bay_dist:float, time_limit:float = None, seed:int = 0, **unused:Any) -> Tuple[np.ndarray, float, float]:
+    """
+    Finds a good assignment of products to aisles for the Strict S-Shape model without solving the MILP. Two greedy constructions, by product
+    (greedy_strict_s_shape) and by order (greedy_orders_strict_s_shape), are each improved by local search (local_search_strict_s_shape) and the
+    better assignment is kept
+
+    Inputs:
+    - orders: the set of orders
+    - num_aisles: the number of aisles in the warehouse
+    - num_bays: the number of bays each aisle is split into
+    - slot_capacity: the capacity of each slot (aisle, bay)
+    - between_aisle_dist: the distance between consecutive aisles
+    - between_bay_dist: the distance between consecutive rows
+    - time_limit: the time budget in seconds for the local search, shared between the two constructions. Defaults to no limit
+    - seed: the seed used by the local search
+
+    Outputs:
+    - product_aisles: the aisle of each product 1, ..., num_aisles * num_bays * slot_capacity. Products in no order fill the remaining space in aisle order
+    - distance: the Strict S-Shape distance of the assignment
+    - runtime: the time taken in seconds
+    """
+
+    start = time.perf_counter()
+
+    aisle_capacity = slot_capacity * num_bays
+    num_products = max(num_aisles * num_bays * slot_capacity, max(chain.from_iterable(orders.values()), default=0))
+
+    evaluator = StrictSShapeEvaluator(orders, num_aisles, num_bays, between_aisle_dist, between_bay_dist)
+
+    orders_of_product = {}
+    for o, prods in enumerate(orders.values()):
+        for prod in prods:
+            orders_of_product.setdefault(prod, []).append(o)
+    orders_of_product = {prod:np.array(positions) for prod, positions in orders_of_product.items()}
+
+    product_aisles = None
+    distance = np.inf
+
+    for construction in [greedy_strict_s_shape, greedy_orders_strict_s_shape]:
+        candidate = construction(orders, num_aisles, aisle_capacity, num_products)
+        candidate = local_search_strict_s_shape(candidate, evaluator, orders_of_product, aisle_capacity, time_limit=None if time_limit is None else time_limit / 2, seed=seed)
+
+        candidate_distance = float(evaluator.total_distance(candidate))
+        if candidate_distance < distance:
+            product_aisles = candidate
+            distance = candidate_distance
+
+    return fill_unassigned_products(product_aisles, num_aisles, aisle_capacity), distance, time.perf_counter() - start
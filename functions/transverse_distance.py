@@ -1,5 +1,5 @@
 from functions.distance_matrix_generation import build_pairwise_product_distance_matrix
-from functions.tsp import total_distance_for_all_orders
+from functions.tsp import total_distance_for_all_orders, ROUTE_CACHE
 import random
 
 def transverse_distance_using_fixed_aisle_assignments(orders:dict[int,list[int]], num_aisles:int, num_bays:int, slot_capacity:int, between_aisle_dist:float, between_bay_dist:float, aisle_assignments:dict[int,int], backtrack_penalty:int) -> float:
@@ -41,10 +41,15 @@ def transverse_distance_using_fixed_aisle_assignments(orders:dict[int,list[int]]
 
         return slot_assignments
 
-    slot_assignments = aisle_to_slot_assignments(aisle_assignments,num_bays, num_aisles, slot_capacity)
+    slot_numbers = aisle_to_slot_assignments(aisle_assignments,num_bays, num_aisles, slot_capacity)
 
-    M = build_pairwise_product_distance_matrix(slot_assignments, num_aisles, num_bays, slot_capacity, between_aisle_dist, between_bay_dist, backtrack_penalty)
+    # convert the slot numbers into the (aisle, bay) slots used by the distance matrix
+    slots = [(x,y) for x in range(1,num_aisles+1) for y in range(1, num_bays+1)]
+    slot_assignments = {prod:slots[slot_number-1] for prod, slot_number in slot_numbers.items()}
 
-    distance_transverse, per_order_transverse = total_distance_for_all_orders(orders, M)
+    M = build_pairwise_product_distance_matrix(slot_assignments, slots, num_aisles, num_bays, slot_capacity, between_aisle_dist, between_bay_dist, backtrack_penalty, compressed=True)
+
+    # repeated trials with the same layout mostly revisit the same locations, so their routes are shared through the route cache
+    distance_transverse, per_order_transverse = total_distance_for_all_orders(orders, M, cache=ROUTE_CACHE)
 
     return distance_transverse
\ No newline at end of file
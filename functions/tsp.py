@@ -1,37 +1,176 @@
 import gurobipy as gp
 from gurobipy import GRB
 import numpy as np
-from typing import Tuple
+import os
+import json
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
+from typing import Tuple, Any
+from functions.distance_matrix_generation import order_distance_block, TransverseDistance, OrderDistanceOracle
 
-def solve_single_tsp(order:list[int], between_product_distance_matrix:np.ndarray[int,int]) -> float:
+# orders with at most this many picks are routed with the Held-Karp dynamic program when method = "auto"
+DP_MAX_PICKS = 12
+
+# the dynamic program's cost and parent tables hold 2^k * k entries each, so larger orders are refused rather than risking running out of memory.
+# At 20 picks the tables take about 340 MB, and the peak is about 390 MB including the masks and the candidates of one layer and end pick
+DP_HARD_MAX_PICKS = 20
+
+# the distance provider and route cache used by routing worker processes, set once per process by init_routing_worker
+ROUTING_DISTANCES = None
+ROUTING_CACHE = None
+
+# one Gurobi environment per routing thread, as environments must not be shared between threads
+THREAD_LOCAL = threading.local()
+
+
+class TSPModelTemplate:
     """
-    Solves a TSP for a single order given fixed product assignments. Node 0 is taken as being the input/output
+    The MTZ TSP model for a fixed number of nodes, built once and re-solved for every order of that size by updating the objective coefficients.
+    Orders in an instance all have the same size, so the model structure is identical every time and only the distances change. Node 0 is taken as being the input/output
 
     Inputs:
-    - order: a single order, used to achieve the aisle assignments
-    - between_product_distance_matrix: a numpy array containing the pairwise distances between pairs of slots, including the door
+    - n: the number of nodes in the tour, including the door
+    - env: the Gurobi environment to build the model in. Defaults to the default environment
+    """
+
+    def __init__(self, n:int, env:gp.Env = None):
+        self.n = n
+        self.env = env
+        nodes = list(range(n))
+
+        m = gp.Model("tsp_single", env=env)
+        m.Params.OutputFlag = 0  # silent
+
+        # Binary variables: x[i,j] = 1 if route goes i -> j
+        x = m.addVars(nodes, nodes, vtype=GRB.BINARY, name="x")
+
+        # MTZ variables
+        u = m.addVars(nodes, vtype=GRB.CONTINUOUS, lb=0, ub=n-1, name="u")
+
+        # the objective coefficients are set for each order in solve
+        m.ModelSense = GRB.MINIMIZE
+
+        # Degree constraints
+        for i in nodes:
+            m.addConstr(gp.quicksum(x[i,j] for j in nodes if j != i) == 1)
+            m.addConstr(gp.quicksum(x[j,i] for j in nodes if j != i) == 1)
+
+        # No self-loops
+        for i in nodes:
+            m.addConstr(x[i,i] == 0)
+
+        # MTZ subtour elimination (skip node 0)
+        for i in nodes[1:]:
+            for j in nodes[1:]:
+                if i != j:
+                    m.addConstr(u[i] - u[j] + (n - 1)*x[i,j] <= n - 2)
+
+        self.model = m
+        # the arc variables in row-major order, matching M.ravel()
+        self.arcs = [x[i,j] for i in nodes for j in nodes]
+
+    def solve(self, M:np.ndarray) -> Tuple[float, list[int]]:
+        """
+        Solves the TSP for the distance matrix M, which must have n rows and columns
+
+        Outputs:
+        - distance: the length of the optimal tour
+        - tour: the optimal tour as a list of node indices, starting and ending at node 0
+        """
+
+        n = self.n
+        distances = np.asarray(M, dtype=float).ravel()
+
+        self.model.setAttr("Obj", self.arcs, distances.tolist())
+        self.model.optimize()
+
+        chosen = np.flatnonzero(np.array(self.model.getAttr("X", self.arcs)) > 0.5)
+
+        # extract total distance
+        total_distance = distances[chosen].sum()
+
+        # follow the arcs from the door to recover the tour
+        successor = {int(arc) // n:int(arc) % n for arc in chosen}
+        tour = [0]
+        while len(tour) < n:
+            tour.append(successor[tour[-1]])
+        tour.append(0)
+
+        return total_distance, tour
+
+
+def tsp_model_template(n:int, env:gp.Env = None) -> TSPModelTemplate:
+    """
+    Returns this thread's TSPModelTemplate for n nodes in the given environment, building it on first use. Each routing thread and worker process
+    keeps its own templates, as Gurobi models must not be shared between threads
+    """
+
+    templates = getattr(THREAD_LOCAL, "templates", None)
+    if templates is None:
+        templates = THREAD_LOCAL.templates = {}
+
+    # the template holds a reference to the environment, so its id cannot be reused while the template exists
+    key = (n, id(env))
+    if key not in templates:
+        templates[key] = TSPModelTemplate(n, env=env)
+
+    return templates[key]
+
+
+def solve_tsp_mip(M:np.ndarray, env:gp.Env = None, reuse_model:bool = True) -> Tuple[float, list[int]]:
+    """
+    Solves the TSP over all nodes of a small distance matrix with the MTZ formulation in Gurobi. Node 0 is taken as being the input/output
+
+    Inputs:
+    - M: the pairwise distances between the nodes of the tour, with the door as node 0
+    - env: the Gurobi environment to build the model in. Defaults to the default environment
+    - reuse_model: whether to re-solve this thread's cached model for this number of nodes (tsp_model_template) rather than building a new model
 
     Outputs:
-    - distance: the route distance for this order
+    - distance: the length of the optimal tour
+    - tour: the optimal tour as a list of node indices, starting and ending at node 0
+    """
+
+    n = M.shape[0]
+
+    if reuse_model:
+        return tsp_model_template(n, env=env).solve(M)
+
+    return TSPModelTemplate(n, env=env).solve(M)
+
+
+def solve_tsp_lazy(M:np.ndarray, env:gp.Env = None) -> Tuple[float, list[int]]:
     """
+    Solves the TSP over all nodes of a small distance matrix exactly in Gurobi, with subtour elimination constraints added lazily through a callback
+    rather than the MTZ constraints of solve_tsp_mip. The LP relaxation is much stronger, so large orders need far less branching. Node 0 is taken as being the input/output
 
-    M = between_product_distance_matrix
+    Inputs:
+    - M: the pairwise distances between the nodes of the tour, with the door as node 0
+    - env: the Gurobi environment to build the model in. Defaults to the default environment
 
-    nodes = [0] + order
-    n = len(nodes)
+    Outputs:
+    - distance: the length of the optimal tour
+    - tour: the optimal tour as a list of node indices, starting and ending at node 0
+    """
+
+    n = M.shape[0]
+    nodes = list(range(n))
+    arcs = [(i,j) for i in nodes for j in nodes if i != j]
 
-    m = gp.Model("tsp_single")
+    m = gp.Model("tsp_single_lazy", env=env)
     m.Params.OutputFlag = 0  # silent
+    m.Params.LazyConstraints = 1
 
     # Binary variables: x[i,j] = 1 if route goes i -> j
-    x = m.addVars(nodes, nodes, vtype=GRB.BINARY, name="x")
-
-    # MTZ variables
-    u = m.addVars(nodes, vtype=GRB.CONTINUOUS, lb=0, ub=n-1, name="u")
+    x = m.addVars(arcs, vtype=GRB.BINARY, name="x")
 
     # Objective: minimise total distance
     m.setObjective(
-        gp.quicksum(M[i,j] * x[i,j] for i in nodes for j in nodes),
+        gp.quicksum(M[i,j] * x[i,j] for i, j in arcs),
         GRB.MINIMIZE
     )
 
@@ -40,45 +179,635 @@ def solve_single_tsp(order:list[int], between_product_distance_matrix:np.ndarray
         m.addConstr(gp.quicksum(x[i,j] for j in nodes if j != i) == 1)
         m.addConstr(gp.quicksum(x[j,i] for j in nodes if j != i) == 1)
 
-    # No self-loops
-    for i in nodes:
-        m.addConstr(x[i,i] == 0)
+    # subtours of two nodes are eliminated up front, unless the tour itself only has two nodes
+    if n > 2:
+        for i in nodes:
+            for j in nodes:
+                if i < j:
+                    m.addConstr(x[i,j] + x[j,i] <= 1)
+
+    def subtours(successor:dict[int,int]) -> list[list[int]]:
+        unvisited = set(nodes)
+        cycles = []
+        while unvisited:
+            cycle = [unvisited.pop()]
+            while successor[cycle[-1]] != cycle[0]:
+                cycle.append(successor[cycle[-1]])
+                unvisited.remove(cycle[-1])
+            cycles.append(cycle)
+        return cycles
 
-    # MTZ subtour elimination (skip node 0)
-    for i in nodes[1:]:
-        for j in nodes[1:]:
-            if i != j:
-                m.addConstr(u[i] - u[j] + (n - 1)*x[i,j] <= n - 2)
+    def eliminate_subtours(model, where):
+        if where == GRB.Callback.MIPSOL:
+            values = model.cbGetSolution(x)
+            successor = {i:j for (i,j), value in values.items() if value > 0.5}
+            cycles = subtours(successor)
+            if len(cycles) > 1:
+                for cycle in cycles:
+                    model.cbLazy(gp.quicksum(x[i,j] for i in cycle for j in cycle if i != j) <= len(cycle) - 1)
 
-    m.optimize()
+    m.optimize(eliminate_subtours)
+
+    successor = {i:j for (i,j) in arcs if x[i,j].X > 0.5}
 
     # extract total distance
-    total_distance = sum(
-        M[i,j] for i in nodes for j in nodes if x[i,j].X > 0.5
-    )
+    total_distance = sum(M[i,j] for i in nodes for j in nodes if i != j and x[i,j].X > 0.5)
+
+    # follow the arcs from the door to recover the tour
+    tour = [0]
+    while len(tour) < n:
+        tour.append(successor[tour[-1]])
+    tour.append(0)
+
+    return total_distance, tour
+
+
+def solve_tsp_dp(M:np.ndarray) -> Tuple[float, list[int]]:
+    """
+    Solves the TSP over all nodes of a small distance matrix exactly with the Held-Karp bitmask dynamic program. Node 0 is taken as being the input/output.
+    The work grows as 2^k k^2 for k picks, so this is only suitable for small orders (up to around 15 picks), and orders with more than
+    DP_HARD_MAX_PICKS picks raise a ValueError
+
+    Inputs:
+    - M: the pairwise distances between the nodes of the tour, with the door as node 0
+
+    Outputs:
+    - distance: the length of the optimal tour
+    - tour: the optimal tour as a list of node indices, starting and ending at node 0
+    """
+
+    M = np.asarray(M, dtype=float)
+    k = M.shape[0] - 1 # the number of picks
+
+    if k == 0:
+        return 0.0, [0, 0]
+
+    if k > DP_HARD_MAX_PICKS:
+        raise ValueError(f"The dynamic program is limited to {DP_HARD_MAX_PICKS} picks, the order has {k}. Use the 'lazy' or 'heuristic' method")
+
+    d = M[1:,1:] # distances between picks, pick i being node i+1
+    picks = np.arange(k)
+    bits = 1 << picks
+
+    # cost[mask, j] is the shortest path from the door through the picks in mask, ending at pick j (which must be in mask)
+    cost = np.full((1 << k, k), np.inf)
+    parent = np.full((1 << k, k), -1, dtype=np.intp)
+    cost[bits, picks] = M[0,1:]
+
+    # all masks grouped by the number of picks they contain, so each layer only depends on the previous one
+    masks = np.arange(1 << k)
+    sizes = np.bitwise_count(masks) if hasattr(np, "bitwise_count") else np.array([bin(mask).count("1") for mask in masks])
+
+    for size in range(2, k+1):
+        layer = masks[sizes == size]
+
+        # one end pick at a time, so only |layer| * k candidates are held at once rather than |layer| * k^2
+        for j in range(k):
+            ending = layer[(layer & bits[j]) != 0]
+            previous = ending ^ bits[j] # the masks before pick j was added
+
+            # candidates[m,i] = cost of reaching pick i through previous[m], then moving to pick j
+            candidates = cost[previous] + d[:,j][None,:]
+            best = np.argmin(candidates, axis=1)
+
+            cost[ending, j] = candidates[np.arange(len(ending)), best]
+            parent[ending, j] = best
+
+    # close the tour by returning to the door
+    full = (1 << k) - 1
+    totals = cost[full] + M[1:,0]
+    last = int(np.argmin(totals))
+    total_distance = float(totals[last])
+
+    # walk back through the parents to recover the tour
+    tour = []
+    mask = full
+    j = last
+    while j != -1:
+        tour.append(j + 1)
+        mask, j = mask ^ (1 << j), int(parent[mask, j])
+    tour = [0] + tour[::-1] + [0]
+
+    return total_distance, tour
+
+
+def transverse_distance_source(between_product_distance_matrix:Any) -> TransverseDistance | None:
+    """
+    Returns the TransverseDistance behind a product distance provider, or None if the distances do not come from the transverse warehouse builder
+    """
+
+    if isinstance(between_product_distance_matrix, TransverseDistance):
+        return between_product_distance_matrix
+
+    if isinstance(between_product_distance_matrix, OrderDistanceOracle):
+        return transverse_distance_source(between_product_distance_matrix.source)
+
+    return None
+
+
+def solve_tsp_transverse(order:list[int], transverse_distance:TransverseDistance) -> Tuple[float, list[int]] | None:
+    """
+    Routes an order in the warehouse with directional aisles and a single transverse without solving a TSP. Every move to an earlier aisle,
+    or against the direction of an aisle, costs the backtrack penalty, so the only route without backtracking visits the aisles in increasing order
+    and each aisle in its direction of travel (bottom half then top half in odd aisles, top half then bottom half in even aisles).
+    Since all distances are non-negative, that route is optimal whenever its length is at most the backtrack penalty, as any other route
+    costs at least the penalty. The picks are sorted by (aisle, half), so the route is found in O(k log k) for k picks
+
+    Inputs:
+    - order: a single order
+    - transverse_distance: the product-indexed TransverseDistance, e.g. from build_pairwise_product_distance_matrix(..., compressed=True)
+
+    Outputs:
+    - distance: the route distance for this order, or None if the route is not guaranteed to be optimal (its length exceeds the backtrack penalty)
+    - tour: the order in which products are visited, as product numbers starting and ending at the door (0)
+    """
+
+    if len(order) == 0:
+        return 0.0, [0, 0]
+
+    order = np.asarray(order, dtype=np.intp)
+    blocks = transverse_distance.blocks[order]
+    table = transverse_distance.table
+
+    # block 2*(aisle-1) + 1 + top is one half of an aisle. Odd aisles run bottom to top and even aisles top to bottom
+    aisles = (blocks - 1) // 2 + 1
+    top = (blocks - 1) % 2
+    visiting_rank = 2*aisles + np.where(aisles % 2 == 1, top, 1 - top)
+
+    route = np.argsort(visiting_rank, kind="stable")
+    sequence = blocks[route]
+
+    total_distance = float(table[0, sequence[0]] + table[sequence[:-1], sequence[1:]].sum() + table[sequence[-1], 0])
+
+    if total_distance > transverse_distance.backtrack_penalty:
+        return None
+
+    return total_distance, [0] + [int(prod) for prod in order[route]] + [0]
 
-    return total_distance
 
+def assignment_lower_bound(M:np.ndarray) -> float:
+    """
+    A lower bound on the length of any tour through all nodes of a distance matrix, from the assignment relaxation
+    (every node has exactly one successor and one predecessor, but subtours are allowed)
+
+    Inputs:
+    - M: the pairwise distances between the nodes of the tour
+
+    Outputs:
+    - lower_bound: the optimal value of the assignment relaxation
+    """
+
+    M = np.asarray(M, dtype=float)
 
-def total_distance_for_all_orders(orders:dict[int,list[int]], between_product_distance_matrix:float) -> Tuple[float,dict[int,float]]:
+    # picks at the same location are not merged before solving the relaxation. That would only be valid under the triangle inequality, which the
+    # transverse distances (with their backtracking penalty) do not satisfy, and could give a bound above the optimal tour
+    n = M.shape[0]
+
+    if n <= 2:
+        return float(M[0,1] + M[1,0]) if n == 2 else 0.0
+
+    # forbid self-loops with a cost larger than any tour
+    C = M.copy()
+    np.fill_diagonal(C, np.abs(M).sum() + 1)
+
+    try:
+        from scipy.optimize import linear_sum_assignment
+        rows, cols = linear_sum_assignment(C)
+        return float(C[rows, cols].sum())
+    except ImportError:
+        # the assignment polytope is integral, so its LP gives the same bound
+        m = gp.Model("assignment_bound")
+        m.Params.OutputFlag = 0
+        y = m.addMVar((n, n), lb=0, ub=1)
+        m.addConstr(y.sum(axis=1) == 1)
+        m.addConstr(y.sum(axis=0) == 1)
+        m.setObjective((C * y).sum(), GRB.MINIMIZE)
+        m.optimize()
+        return float(m.ObjVal)
+
+
+def tour_length(M:np.ndarray, tour:list[int]) -> float:
+    """
+    The length of a tour, given as node indices starting and ending at node 0
+    """
+    tour = np.asarray(tour, dtype=np.intp)
+    return float(M[tour[:-1], tour[1:]].sum())
+
+
+def solve_tsp_heuristic(M:np.ndarray, time_limit:float = None, gap_limit:float = None) -> Tuple[float, list[int], float]:
+    """
+    Finds a good tour through all nodes of an asymmetric distance matrix without solving a MIP, for orders too large for the exact methods.
+    The tour is built by nearest neighbour from the door, then improved by 2-opt (segment reversal) and Or-opt (moving a segment elsewhere
+    in the tour without reversing it) moves until no move improves it. As the matrix is asymmetric, the cost of a reversed segment is recomputed in the reverse direction.
+    The assignment relaxation gives a lower bound, so the gap to the optimal tour is known
+
+    Inputs:
+    - M: the pairwise distances between the nodes of the tour, with the door as node 0
+    - time_limit: stop improving the tour after this many seconds
+    - gap_limit: stop improving the tour once its gap to the lower bound is at most this (as a fraction of the tour length)
+
+    Outputs:
+    - distance: the length of the tour found
+    - tour: the tour as a list of node indices, starting and ending at node 0
+    - gap: (distance - lower bound) / distance, an upper bound on the relative distance from the optimal tour
+    """
+
+    start = time.perf_counter()
+
+    M = np.asarray(M, dtype=float)
+    n = M.shape[0]
+
+    if n <= 3: # with at most two picks the nearest neighbour tour is optimal
+        _, tour = solve_tsp_dp(M)
+        return tour_length(M, tour), tour, 0.0
+
+    lower_bound = assignment_lower_bound(M)
+
+    def gap_of(distance):
+        return max(0.0, (distance - lower_bound) / distance) if distance > 0 else 0.0
+
+    # nearest neighbour construction from the door
+    tour = [0]
+    unvisited = set(range(1, n))
+    while unvisited:
+        candidates = list(unvisited)
+        nearest = candidates[int(np.argmin(M[tour[-1], candidates]))]
+        tour.append(nearest)
+        unvisited.remove(nearest)
+    tour.append(0)
+    tour = np.array(tour, dtype=np.intp)
+
+    tolerance = 1e-9
+    improved = True
+
+    # a single Or-opt sweep can take far longer than a large order's budget, so the deadline is also checked inside it
+    deadline = start + time_limit if time_limit is not None else np.inf
+    out_of_time = False
+
+    while improved and not out_of_time:
+        if time.perf_counter() > deadline:
+            break
+        if gap_limit is not None and gap_of(tour_length(M, tour)) <= gap_limit:
+            break
+
+        improved = False
+
+        # 2-opt: reverse tour[i..j], using prefix sums of the arc costs along the tour in both directions
+        forward = np.concatenate(([0.0], np.cumsum(M[tour[:-1], tour[1:]])))
+        backward = np.concatenate(([0.0], np.cumsum(M[tour[1:], tour[:-1]])))
+        i = np.arange(1, n)[:,None]
+        j = np.arange(1, n)[None,:]
+        delta = (M[tour[i-1], tour[j]] + M[tour[i], tour[j+1]] + (backward[j] - backward[i])
+                 - M[tour[i-1], tour[i]] - M[tour[j], tour[j+1]] - (forward[j] - forward[i]))
+        delta = np.where(j > i, delta, np.inf)
+
+        best = np.unravel_index(np.argmin(delta), delta.shape)
+        if delta[best] < -tolerance:
+            i, j = best[0] + 1, best[1] + 1
+            tour[i:j+1] = tour[i:j+1][::-1]
+            improved = True
+            continue
+
+        # Or-opt: move tour[i..i+length-1] (keeping its direction) to between tour[k] and tour[k+1]. Segments of any length are tried, as picks
+        # in the same aisle half are at distance 0 and long runs of them may need to move together
+        for length in range(1, n - 1):
+            for i in range(1, n - length + 1):
+                if time.perf_counter() > deadline:
+                    out_of_time = True
+                    break
+
+                first, last = tour[i], tour[i+length-1]
+                before, after = tour[i-1], tour[i+length]
+                removal_gain = M[before, first] + M[last, after] - M[before, after]
+
+                rest = np.concatenate((tour[:i], tour[i+length:]))
+                insertion_cost = M[rest[:-1], first] + M[last, rest[1:]] - M[rest[:-1], rest[1:]]
+                insertion_cost[i-1] = np.inf # putting the segment back where it was
+
+                k = int(np.argmin(insertion_cost))
+                if insertion_cost[k] - removal_gain < -tolerance:
+                    tour = np.concatenate((rest[:k+1], tour[i:i+length], rest[k+1:]))
+                    improved = True
+                    break
+            if improved or out_of_time:
+                break
+
+    tour = [int(node) for node in tour]
+    distance = tour_length(M, tour)
+
+    return distance, tour, gap_of(distance)
+
+
+def distance_fingerprint(between_product_distance_matrix:Any) -> str:
+    """
+    Identifies a product distance provider for use in route cache keys. For the transverse builder this is the layout,
+    and for a dense matrix it is a hash of its contents
+    """
+
+    transverse_distance = transverse_distance_source(between_product_distance_matrix)
+    if transverse_distance is not None:
+        return transverse_distance.fingerprint
+
+    if isinstance(between_product_distance_matrix, OrderDistanceOracle):
+        return distance_fingerprint(between_product_distance_matrix.source)
+
+    M = np.ascontiguousarray(between_product_distance_matrix)
+    return f"dense_{M.shape}_{M.dtype}_{hashlib.blake2b(M.tobytes(), digest_size=16).hexdigest()}"
+
+
+def route_locations(order:list[int], between_product_distance_matrix:Any) -> np.ndarray:
+    """
+    The locations of the products in an order. Two orders whose products occupy the same locations have the same optimal route length.
+    For the transverse builder the location is the aisle half (which determines all distances), and otherwise it is the product itself
+    """
+
+    transverse_distance = transverse_distance_source(between_product_distance_matrix)
+    if transverse_distance is not None:
+        return transverse_distance.blocks[np.asarray(order, dtype=np.intp)]
+
+    return np.asarray(order, dtype=np.intp)
+
+
+class RouteCache:
+    """
+    A memo of solved routes keyed by the sorted tuple of locations an order visits and a fingerprint of the distances, so orders which map to
+    the same locations (within an instance, or across trials with the same layout) are only routed once. Routes are stored as positions in the
+    sorted order, so a cached route can be reused by any order visiting the same locations.
+
+    The in-memory layer keeps the max_size most recently used routes. If cache_dir is given, routes are also written there, one small file per
+    route, so that Pool workers on the same node share them
+    """
+
+    def __init__(self, max_size:int = 100000, cache_dir:str = None):
+        self.max_size = max_size
+        self.cache_dir = cache_dir
+        self.routes = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        del state["lock"] # locks cannot be sent to worker processes
+        return state
+
+    def __setstate__(self, state:dict) -> None:
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.routes)
+
+    def path(self, key:str) -> str:
+        return os.path.join(self.cache_dir, f"route_{hashlib.blake2b(key.encode(), digest_size=16).hexdigest()}.json")
+
+    def get(self, key:str) -> Tuple[float, list[int], float] | None:
+        """
+        Returns the cached (distance, positions, gap) for a key, or None if the route has not been solved
+        """
+
+        with self.lock:
+            if key in self.routes:
+                self.hits += 1
+                self.routes.move_to_end(key)
+                return self.routes[key]
+
+        if self.cache_dir is not None and os.path.exists(self.path(key)):
+            with open(self.path(key)) as f:
+                stored = json.load(f)
+            route = (stored["distance"], stored["positions"], stored["gap"])
+            self.put(key, route, write=False)
+            with self.lock:
+                self.hits += 1
+            return route
+
+        with self.lock:
+            self.misses += 1
+
+        return None
+
+    def put(self, key:str, route:Tuple[float, list[int], float], write:bool = True) -> None:
+        """
+        Stores the (distance, positions, gap) for a key, evicting the least recently used route if the cache is full
+        """
+
+        with self.lock:
+            self.routes[key] = route
+            self.routes.move_to_end(key)
+            while len(self.routes) > self.max_size:
+                self.routes.popitem(last=False)
+
+        if write and self.cache_dir is not None:
+            # write to a temporary file and rename it, so that other processes never read a partially written route
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = self.path(key)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"key":key, "distance":route[0], "positions":route[1], "gap":route[2]}, f)
+            os.replace(tmp_path, path)
+
+    def clear(self) -> None:
+        """
+        Empties the in-memory layer and resets the counters
+        """
+        with self.lock:
+            self.routes.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+# a shared route cache for repeated evaluations, e.g. across trials of transverse_distance_using_fixed_aisle_assignments
+ROUTE_CACHE = RouteCache()
+
+
+def solve_single_tsp(order:list[int], between_product_distance_matrix:Any, method:str = "auto", dp_max_picks:int = DP_MAX_PICKS, return_tour:bool = False, env:gp.Env = None, cache:RouteCache = None, fingerprint:str = None, time_limit:float = None, gap_limit:float = None, return_gap:bool = False) -> float | Tuple:
+    """
+    Solves a TSP for a single order given fixed product assignments. Node 0 is taken as being the input/output
+
+    Inputs:
+    - order: a single order, used to achieve the aisle assignments
+    - between_product_distance_matrix: a numpy array containing the pairwise distances between pairs of products, including the door,
+      or a distance provider such as TransverseDistance or OrderDistanceOracle
+    - method: "dp" for the Held-Karp dynamic program, "mip" for the Gurobi MTZ model, "lazy" for the Gurobi model with lazy subtour elimination
+      (solve_tsp_lazy), "structural" for the closed-form transverse router (solve_tsp_transverse), "heuristic" for nearest neighbour with 2-opt
+      and Or-opt improvement (solve_tsp_heuristic), or "auto" to use the structural router when the distances come from the transverse builder,
+      and otherwise the dynamic program for orders with at most dp_max_picks picks and the lazy Gurobi model for larger orders. All but the heuristic are exact: when the structural route is not guaranteed to be optimal,
+      the dynamic program or Gurobi is used instead
+    - dp_max_picks: the largest order routed with the dynamic program when method = "auto", up to DP_HARD_MAX_PICKS
+    - return_tour: whether to also return the tour
+    - env: the Gurobi environment used if the order is solved with Gurobi
+    - cache: a RouteCache to look the route up in, and store it in once solved
+    - fingerprint: the distance_fingerprint of the distances, if already known. Only used with a cache
+    - time_limit: the time budget in seconds for the heuristic
+    - gap_limit: the heuristic stops improving once its gap is at most this
+    - return_gap: whether to also return the gap, (distance - lower bound) / distance, which is 0 for the exact methods
+
+    Outputs:
+    - distance: the route distance for this order
+    - tour (if return_tour): the order in which products are visited, as product numbers starting and ending at the door (0)
+    - gap (if return_gap): the relative gap between the distance and a lower bound on the optimal distance
+    """
+
+    total_distance, tour, gap = route_single_order(order, between_product_distance_matrix, method=method, dp_max_picks=dp_max_picks, env=env, cache=cache, fingerprint=fingerprint, time_limit=time_limit, gap_limit=gap_limit)
+
+    outputs = (total_distance,) + ((tour,) if return_tour else ()) + ((gap,) if return_gap else ())
+
+    return outputs if len(outputs) > 1 else total_distance
+
+
+def route_single_order(order:list[int], between_product_distance_matrix:Any, method:str = "auto", dp_max_picks:int = DP_MAX_PICKS, env:gp.Env = None, cache:RouteCache = None, fingerprint:str = None, time_limit:float = None, gap_limit:float = None) -> Tuple[float, list[int], float]:
+    """
+    Routes a single order as in solve_single_tsp, always returning the distance, the tour (as product numbers starting and ending at the door) and the gap
+    """
+
+    if cache is not None:
+        if fingerprint is None:
+            fingerprint = distance_fingerprint(between_product_distance_matrix)
+
+        # the products sorted by location, so that every order visiting the same locations shares a key
+        locations = route_locations(order, between_product_distance_matrix)
+        sorting = np.argsort(locations, kind="stable")
+        canonical_order = [int(order[i]) for i in sorting]
+        key = f"{fingerprint}|{method}|{dp_max_picks}|{time_limit}|{gap_limit}|{tuple(int(location) for location in locations[sorting])}"
+
+        route = cache.get(key)
+        if route is None:
+            total_distance, tour, gap = route_single_order(canonical_order, between_product_distance_matrix, method=method, dp_max_picks=dp_max_picks, env=env, time_limit=time_limit, gap_limit=gap_limit)
+            positions = {prod:position for position, prod in enumerate(canonical_order)}
+            route = (total_distance, [positions[prod] for prod in tour[1:-1]], gap)
+            cache.put(key, route)
+
+        total_distance, positions, gap = route
+        return total_distance, [0] + [canonical_order[position] for position in positions] + [0], gap
+
+    if method in ["auto", "structural"]:
+        transverse_distance = transverse_distance_source(between_product_distance_matrix)
+
+        if transverse_distance is not None:
+            result = solve_tsp_transverse(order, transverse_distance)
+            if result is not None:
+                total_distance, tour = result
+                return total_distance, tour, 0.0
+        elif method == "structural":
+            raise ValueError("The structural router requires distances from the transverse builder (a TransverseDistance, or an OrderDistanceOracle over one)")
+
+        method = "dp" if len(order) <= min(dp_max_picks, DP_HARD_MAX_PICKS) else "lazy"
+
+    # only the distances between the door and the products in this order are needed, indexed locally with the door as node 0
+    nodes = [0] + list(order)
+    M = order_distance_block(nodes, between_product_distance_matrix)
+
+    gap = 0.0
+    if method == "dp":
+        total_distance, tour = solve_tsp_dp(M)
+    elif method == "mip":
+        total_distance, tour = solve_tsp_mip(M, env=env)
+    elif method == "lazy":
+        total_distance, tour = solve_tsp_lazy(M, env=env)
+    elif method == "heuristic":
+        total_distance, tour, gap = solve_tsp_heuristic(M, time_limit=time_limit, gap_limit=gap_limit)
+    else:
+        raise ValueError(f"Unknown routing method '{method}', must be 'auto', 'structural', 'dp', 'mip', 'lazy' or 'heuristic'")
+
+    return total_distance, [nodes[i] for i in tour], gap
+
+
+def init_routing_worker(between_product_distance_matrix:Any, cache:RouteCache = None) -> None:
+    """
+    Initialises a routing worker process with the product distances (and route cache), so they are sent to each process once rather than with every order
+    """
+    global ROUTING_DISTANCES, ROUTING_CACHE
+    ROUTING_DISTANCES = between_product_distance_matrix
+    ROUTING_CACHE = cache
+
+
+def route_order_in_process(order:list[int], options:dict[str,Any]) -> Tuple[float, list[int], float]:
+    """
+    Routes one order in a worker process, using the distances given to init_routing_worker
+    """
+    return route_single_order(order, ROUTING_DISTANCES, cache=ROUTING_CACHE, **options)
+
+
+def route_order_in_thread(order:list[int], between_product_distance_matrix:Any, cache:RouteCache, options:dict[str,Any]) -> Tuple[float, list[int], float]:
+    """
+    Routes one order in a worker thread, using a Gurobi environment private to the thread and limited to one solver thread
+    """
+    if not hasattr(THREAD_LOCAL, "env"):
+        env = gp.Env(empty=True)
+        env.setParam("OutputFlag", 0)
+        env.setParam("Threads", 1)
+        env.start()
+        THREAD_LOCAL.env = env
+
+    return route_single_order(order, between_product_distance_matrix, env=THREAD_LOCAL.env, cache=cache, **options)
+
+
+def total_distance_for_all_orders(orders:dict[int,list[int]], between_product_distance_matrix:Any, method:str = "auto", dp_max_picks:int = DP_MAX_PICKS, return_tours:bool = False, parallel:str = None, num_workers:int = None, cache:RouteCache = None, time_limit:float = None, gap_limit:float = None, return_gaps:bool = False) -> Tuple:
     """
     Calculates the routing distance for all orders and sums them together to obtain the total distance
 
-    Inputs: 
+    Inputs:
     orders: the dictionary of all orders used to achieve the aisle assignments
-    between_product_distance_matrix: a numpy array containing the pairwise distances between pairs of slots, including the door
+    between_product_distance_matrix: a numpy array containing the pairwise distances between pairs of products, including the door,
+    or a distance provider such as TransverseDistance or OrderDistanceOracle
+    method: the routing method passed to solve_single_tsp ("auto", "structural", "dp", "mip", "lazy" or "heuristic")
+    dp_max_picks: the largest order routed with the dynamic program when method = "auto"
+    return_tours: whether to also return the tour of each order
+    parallel: None to route the orders one after another, "threads" to route them in a thread pool (best when orders are solved with Gurobi,
+    which releases the GIL), or "processes" to route them in a process pool (best for the pure-Python dynamic program and structural router).
+    Processes cannot be started from inside the workers of results/run_parallel.py, which are daemonic, so use threads there
+    num_workers: the number of threads or processes. Defaults to SLURM_CPUS_PER_TASK, or the number of CPUs
+    cache: a RouteCache, so that orders visiting the same locations are only routed once. Worker processes each keep their own in-memory
+    routes, and only share routes through the cache's cache_dir
+    time_limit: the time budget in seconds for routing each order with the heuristic
+    gap_limit: the gap at which the heuristic stops improving each order's route
+    return_gaps: whether to also return the gap of each order's route, and the gap of the total
 
     Outputs:
     - total: the total distance travelled during picker routing over all orders
-    - per_order: the distance travelled for each order
+    - per_order: the distance travelled for each order, in the same order as orders
+    - tours (if return_tours): the tour for each order, as product numbers starting and ending at the door (0)
+    - gaps (if return_gaps): the gap of each order's route, with the gap of the total distance under the key "total"
     """
 
     total = 0
     per_order = {}
+    tours = {}
+    gaps = {}
+
+    order_ids = list(orders.keys())
 
-    for order_id, order_list in orders.items():
-        d = solve_single_tsp(order_list, between_product_distance_matrix)
+    # fingerprint the distances once, rather than once per order
+    fingerprint = distance_fingerprint(between_product_distance_matrix) if cache is not None else None
+
+    options = {"method":method, "dp_max_picks":dp_max_picks, "fingerprint":fingerprint, "time_limit":time_limit, "gap_limit":gap_limit}
+
+    if parallel is None:
+        results = [route_single_order(orders[order_id], between_product_distance_matrix, cache=cache, **options) for order_id in order_ids]
+    else:
+        if num_workers is None:
+            num_workers = int(os.environ.get("SLURM_CPUS_PER_TASK", os.cpu_count() or 1))
+
+        if parallel == "threads":
+            with ThreadPool(processes=num_workers) as p:
+                results = p.starmap(route_order_in_thread, [(orders[order_id], between_product_distance_matrix, cache, options) for order_id in order_ids])
+        elif parallel == "processes":
+            with Pool(processes=num_workers, initializer=init_routing_worker, initargs=(between_product_distance_matrix, cache)) as p:
+                results = p.starmap(route_order_in_process, [(orders[order_id], options) for order_id in order_ids])
+        else:
+            raise ValueError(f"Unknown parallel mode '{parallel}', must be None, 'threads' or 'processes'")
+
+    # starmap returns results in the order of its inputs, so the totals and per-order results are the same as when routing sequentially
+    lower_bound = 0
+    for order_id, (d, tour, gap) in zip(order_ids, results):
         per_order[order_id] = d
+        tours[order_id] = tour
+        gaps[order_id] = gap
         total += d
+        lower_bound += d * (1 - gap)
+
+    gaps["total"] = (total - lower_bound) / total if total > 0 else 0.0
+
+    outputs = (total, per_order) + ((tours,) if return_tours else ()) + ((gaps,) if return_gaps else ())
 
-    return total, per_order
+    return outputs
@@ -2,8 +2,9 @@ import gurobipy as gp
 from gurobipy import GRB
 import pandas as pd
 from typing import Any, Tuple
+from functions.orders_generation import collapse_duplicate_orders
 
-def Return(num_aisles:int, num_bays:int, slot_capacity:int, between_aisle_dist:float, between_bay_dist:float, orders:dict[int,list[int]], **unused:Any) -> Tuple[int, float, float, dict[int,tuple[int,int]]]:
+def Return(num_aisles:int, num_bays:int, slot_capacity:int, between_aisle_dist:float, between_bay_dist:float, orders:dict[int,list[int]], collapse_orders:bool = True, **unused:Any) -> Tuple[int, float, float, dict[int,tuple[int,int]]]:
     """
     The return policy model of Silva et al
 
@@ -14,6 +15,7 @@ def Return(num_aisles:int, num_bays:int, slot_capacity:int, between_aisle_dist:f
         - between_aisle_dist: the distance between consecutive aisles in the warehouse
         - between_bay_dist: the distance between consecutive bays in the warehouse
         - orders: the orders in the specific instance
+        - collapse_orders: whether to model identical orders once, weighted by their number of copies (collapse_duplicate_orders). The optimal distance is unchanged
     
     Outputs:
         - status (int): the Gurobi status
@@ -22,6 +24,12 @@ def Return(num_aisles:int, num_bays:int, slot_capacity:int, between_aisle_dist:f
         - assignment (dict): the final assignment of products to slots
     """
 
+    # identical orders are only modelled once, weighted by their number of copies
+    if collapse_orders:
+        orders, weights = collapse_duplicate_orders(orders)
+    else:
+        weights = {o:1 for o in range(1, len(orders) + 1)}
+
     # The parameters
     num_prods = num_aisles * num_bays * slot_capacity
     P = range(1, num_prods + 1) # products
@@ -99,8 +107,8 @@ def Return(num_aisles:int, num_bays:int, slot_capacity:int, between_aisle_dist:f
     # Set the model objective
 
     model.setObjective(
-    gp.quicksum(2 * N * f[o,a] * z[o,a] for o in O for a in A)  # Aisle (row) distance
-    + gp.quicksum(2 * M * (last_aisle[o]-1) for o in O),            # Cross-aisle distance
+    gp.quicksum(2 * N * weights[o] * f[o,a] * z[o,a] for o in O for a in A)  # Aisle (row) distance
+    + gp.quicksum(2 * M * weights[o] * (last_aisle[o]-1) for o in O),            # Cross-aisle distance
     GRB.MINIMIZE
     )
 
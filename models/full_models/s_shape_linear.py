@@ -2,8 +2,9 @@ import gurobipy as gp
 from gurobipy import GRB
 import pandas as pd
 from typing import Any, Tuple
+from functions.orders_generation import collapse_duplicate_orders
 
-def S_Shape_Linear(num_aisles:int, num_bays:int, slot_capacity:int, between_aisle_dist:float, between_bay_dist:float, orders:dict[int,list[int]], **unused:Any) -> Tuple[int,float,float,dict[int,Tuple[int,int]]]:
+def S_Shape_Linear(num_aisles:int, num_bays:int, slot_capacity:int, between_aisle_dist:float, between_bay_dist:float, orders:dict[int,list[int]], collapse_orders:bool = True, **unused:Any) -> Tuple[int,float,float,dict[int,Tuple[int,int]]]:
     """
     The Novel S-Shape model
     
@@ -13,7 +14,8 @@ def S_Shape_Linear(num_aisles:int, num_bays:int, slot_capacity:int, between_aisl
         - slot_capacity: the capacity of each slot in the warehouse. The standard is two
         - between_aisle_dist: the distance between consecutive aisles in the warehouse
         - between_bay_dist: the distance between consecutive bays in the warehouse
-        - orders: the orders in the specific instance
+        - orders: the orders in the specific instance, numbered from 0
+        - collapse_orders: whether to model identical orders once, weighted by their number of copies (collapse_duplicate_orders). The optimal distance is unchanged
     
     Outputs:
         - status (int): the Gurobi status
@@ -27,6 +29,12 @@ def S_Shape_Linear(num_aisles:int, num_bays:int, slot_capacity:int, between_aisl
 
     model.setParam('TimeLimit', 3600) # 1 hour time limit
 
+    # identical orders are only modelled once, weighted by their number of copies
+    if collapse_orders:
+        orders, weights = collapse_duplicate_orders(orders, first_key = 0)
+    else:
+        weights = {o:1 for o in range(len(orders))}
+
     M = between_aisle_dist
     N = between_bay_dist
     prod_num = num_aisles*num_bays*slot_capacity
@@ -165,10 +173,10 @@ def S_Shape_Linear(num_aisles:int, num_bays:int, slot_capacity:int, between_aisl
             )
 
     model.setObjective(
-        gp.quicksum(
+        gp.quicksum(weights[o] * (
         2 * M * (v[o]-1) + # cross_aisle_distance
         (len(B) + 1) * N * (gp.quicksum(z[o,a] for a in A) - is_odd[o]) + # within-aisle distance (even number of aisles)
-        2 * N * d[o] # the backtracking
+        2 * N * d[o]) # the backtracking
         for o in O),
         GRB.MINIMIZE
     )
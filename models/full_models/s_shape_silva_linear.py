@@ -1,9 +1,10 @@
 import gurobipy as gp
 from gurobipy import GRB
 from typing import Any, Tuple
+from functions.orders_generation import collapse_duplicate_orders
 
 
-def S_Shape_Silva_Linear(num_aisles:int, num_bays:int, slot_capacity:int, between_aisle_dist:float, between_bay_dist:float, orders:dict[int,list[int]], **unused:Any) -> Tuple[int, float, float, dict[int:Tuple[int,int]]]:
+def S_Shape_Silva_Linear(num_aisles:int, num_bays:int, slot_capacity:int, between_aisle_dist:float, between_bay_dist:float, orders:dict[int,list[int]], collapse_orders:bool = True, **unused:Any) -> Tuple[int, float, float, dict[int:Tuple[int,int]]]:
     """
     The S-Shape model of Silva et al
 
@@ -14,6 +15,7 @@ def S_Shape_Silva_Linear(num_aisles:int, num_bays:int, slot_capacity:int, betwee
     - between_aisle_dist: the distance between two consecutive aisles
     - between_bay_dist: the distance between two consecutive bays
     - orders: the orders for the specific instance
+    - collapse_orders: whether to model identical orders once, weighted by their number of copies (collapse_duplicate_orders). The optimal distance is unchanged
     
     Outputs:
     - status (int): the status of the gurobi model
@@ -26,6 +28,12 @@ def S_Shape_Silva_Linear(num_aisles:int, num_bays:int, slot_capacity:int, betwee
 
     model = gp.Model("s_shape_sila")
 
+    # identical orders are only modelled once, weighted by their number of copies
+    if collapse_orders:
+        orders, weights = collapse_duplicate_orders(orders)
+    else:
+        weights = {o:1 for o in range(1, len(orders) + 1)}
+
     # adding ranges
 
     M = between_aisle_dist
@@ -150,10 +158,10 @@ def S_Shape_Silva_Linear(num_aisles:int, num_bays:int, slot_capacity:int, betwee
 
 
     model.setObjective(
-        gp.quicksum(
+        gp.quicksum(weights[o] * (
             gp.quicksum(2 * M * v[o,a] * (a - 1) for a in A) + # cross-aisle distance
             gp.quicksum(N * (len(B) + 1) * z[o,a] + 2 * N * x[o,a] for a in A) - # distance of aisles fully-traversed
-            N * (len(B) + 1) * S[o]
+            N * (len(B) + 1) * S[o])
         for o in O),
         GRB.MINIMIZE
     )
@@ -2,78 +2,82 @@ import gurobipy as gp
 from gurobipy import GRB
 import numpy as np
 import pandas as pd
+import scipy.sparse as sp
+import time
 from typing import Tuple, Any
 from itertools import chain
+from functions.product_aggregation import group_products_by_signature, expand_class_counts
+from functions.strict_s_shape_heuristic import strict_s_shape_heuristic
+from functions.orders_generation import collapse_duplicate_orders
 
-def Strict_S_Shape(num_aisles:int, num_bays:int, slot_capacity:int, between_aisle_dist:float, between_bay_dist:float, orders:dict[int,list[int]], time_limit = 3600, **unused:Any) -> Tuple[int, float, float, dict[int:Tuple[int,int]]]:
+def direction_matrix(num_aisles:int) -> np.ndarray:
     """
-    The Strict S-Shape model for a warehouse with alternating directional aisles and no transverse
+    Returns the matrix s where s[i,j] is 1 if aisles i+1 and j+1 are distinct and share a direction. Aisles alternate direction, so this is when
+    their indices have the same parity
+    """
+
+    s = np.zeros((num_aisles, num_aisles))
+    for i in range(num_aisles):
+        for j in range(num_aisles):
+            if i == j:
+                s[i,j] = 0
+            else:
+                s[i,j] = (i +1 - j) % 2
+
+    return s
+
+
+def add_strict_s_shape_routing(model:gp.Model, order_aisles:dict[int,list[int]], order_loads:dict[Tuple[int,int],Any], num_aisles:int, num_bays:int, between_aisle_dist:float, between_bay_dist:float, aisle_capacity:int, order_weights:dict[int,int] = None, parity_pairing:bool = False) -> Tuple[gp.LinExpr, dict[str,gp.tupledict]]:
+    """
+    Adds the Strict S-Shape routing variables and constraints for a set of orders to a model, and returns the total distance of the orders.
+    An order can only visit the aisles listed for it, so orders which are known to avoid most aisles (as in the sub-problems of Strict_S_Shape_LNS)
+    only need variables for the few aisles they may visit
 
     Inputs:
+    - model: the model to add the routing to
+    - order_aisles: the aisles each order may visit, in increasing order. In the full model, every order may visit every aisle
+    - order_loads: the number of products of order o in aisle a, keyed by (o,a), as a linear expression in the assignment variables (plus any
+      products already fixed in the aisle)
     - num_aisles: the number of aisles in the warehouse
     - num_bays: the number of bays each aisle is split into
-    - slot_capacity: the capacity of each slot (aisle, bay). The standard is two
     - between_aisle_dist: the distance between consecutive aisles
     - between_bay_dist: the distance between consecutive rows
-    - orders: the set of orders
-    - time_limit: how long the user would like the model to run for
+    - aisle_capacity: the number of products each aisle can hold
+    - order_weights: the number of copies of each order (see collapse_duplicate_orders). Defaults to one copy of each
+    - parity_pairing: whether to count the consecutive visited aisles sharing a direction by tracking the parity of the last visited aisle along
+      the aisles (r[o,a]), with one variable per order and aisle, rather than with a variable for every pair of aisles (n[o,a,b] and p[o,a,b]).
+      In this form p[o,b] is whether b and the previous visited aisle share a direction. The optimal distance is unchanged
 
     Outputs:
-    - status: the final model status
-    - distance: the distance achieved by the model, taken as the objective value
-    - runtime: the runtime of the model
-    - aisle_assignments_dict: the assignment of products to aisles
+    - objective: the total distance travelled for the orders, each weighted by its number of copies
+    - variables: the routing variables, keyed by name
     """
 
-    set_prods = list(set(chain.from_iterable([x for x in orders.values()])))
-    num_prods = len(set_prods)
-
-    if num_prods > num_aisles * num_bays * slot_capacity:
-        print(f"num_prods = {num_prods}")
-        print(f"num_aisles = {num_aisles}")
-        print(f"num_bays = {num_bays}")
-        print(f"capacity = {slot_capacity}")
-        print(f"num_slots = {num_aisles*num_bays*slot_capacity}")
-        print("infeasiblity caused by too many products for the number of slots")
-        return 3, np.inf, np.inf, []
-    
-    gp.setParam('OutputFlag',0)
-    gp.setParam('TimeLimit',time_limit)
-
     N = between_bay_dist
     M = between_aisle_dist
-
-    aisle_capacity = slot_capacity * num_bays
-    num_slots = num_aisles * num_bays * slot_capacity
     L = N * (num_bays + 1)
 
     # generating the direction matrix
-    s = np.zeros((num_aisles, num_aisles))
-    for i in range(num_aisles):
-        for j in range(num_aisles):
-            if i == j:
-                s[i,j] = 0
-            else:
-                s[i,j] = (i +1 - j) % 2
+    s = direction_matrix(num_aisles)
 
     # our sets
-    A = range(1, num_aisles + 1)
-    B = range(1, num_aisles + 1)
-    O = range(1, len(orders) + 1)
-    P = range(1, num_slots + 1)
-
-    # the model
-    model = gp.Model("Strict_S_Shape")
+    O = list(order_aisles.keys())
+    visits = gp.tuplelist((o,a) for o in O for a in order_aisles[o])
+    pairs = gp.tuplelist((o,a,b) for o in O for a in order_aisles[o] for b in order_aisles[o] if b > a)
+    later_visits = gp.tuplelist((o,a) for o in O for a in order_aisles[o][1:])
 
     # decision variables
-    x = model.addVars(A, P, vtype = GRB.BINARY, name = "x") # whether product k is assigned to aisle a
-    z = model.addVars(O, A, vtype = GRB.BINARY, name = "z") # if aisle a is visited in order o
-    n = model.addVars(O, A, B, vtype = GRB.BINARY, name = "n") # if aisles a and be form a consecutive pair of aisles with picks for order o
-    p = model.addVars(O, A, B, vtype = GRB.BINARY, name = "p") # if aisles a and b share a direction and form a pair of aisles with picks for order o
-    f = model.addVars(O, A, vtype = GRB.BINARY, name = "f") # if aisle a is the first aisle with a pick for order o
+    z = model.addVars(visits, vtype = GRB.BINARY, name = "z") # if aisle a is visited in order o
+    if parity_pairing:
+        r = model.addVars(visits, vtype = GRB.BINARY, name = "r") # the parity of the last aisle up to aisle a with a pick for order o
+        p = model.addVars(later_visits, vtype = GRB.BINARY, name = "p") # if aisle b has a pick for order o and shares a direction with the previous aisle with a pick
+    else:
+        n = model.addVars(pairs, vtype = GRB.BINARY, name = "n") # if aisles a and be form a consecutive pair of aisles with picks for order o
+        p = model.addVars(pairs, vtype = GRB.BINARY, name = "p") # if aisles a and b share a direction and form a pair of aisles with picks for order o
+    f = model.addVars(visits, vtype = GRB.BINARY, name = "f") # if aisle a is the first aisle with a pick for order o
     f_idx = model.addVars(O, ub = num_aisles, vtype = GRB.INTEGER, name = "f_index") # the index of the first aisle with a pick for order o
     F = model.addVars(O, vtype = GRB.BINARY, name = "F") # if the index of the first aisle with a pick is odd for order o
-    q = model.addVars(O, A, vtype = GRB.BINARY, name = "q") # if aisle a is the last aisle with a pick for order o
+    q = model.addVars(visits, vtype = GRB.BINARY, name = "q") # if aisle a is the last aisle with a pick for order o
     q_idx = model.addVars(O, ub = num_aisles, vtype = GRB.INTEGER, name = "q_index") # the index of the last aisle with a pick for order o
     Q = model.addVars(O, vtype = GRB.BINARY, name = "Q") # if the index of the last aisle with a pick for order o is odd
     d = model.addVars(O, lb = 0, ub = num_aisles, vtype = GRB.INTEGER, name = "d") # auxiliary variable for defining F
@@ -83,21 +87,10 @@ def Strict_S_Shape(num_aisles:int, num_bays:int, slot_capacity:int, between_aisl
     u1 = model.addVars(O, vtype = GRB.BINARY, name = "u1") # whether 1 or more aisles have a pick
     u2 = model.addVars(O, vtype = GRB.BINARY, name = "u2") # whether 2 or more aisles have a pick
 
-
-    # the constraints
-    for k in P:
-        model.addConstr(
-            gp.quicksum(x[a,k] for a in A) == 1,
-            name = f"assign_item_{k}_to_a_slot"
-        )
-
-    for a in A:
-        model.addConstr(
-            gp.quicksum(x[a,k] for k in P) <= aisle_capacity,
-            name = f"capacity_of_aisle_{a}"
-        )
-    
     for o in O:
+        A = order_aisles[o]
+        z_first = z[o,1] if 1 in A else 0 # orders which cannot visit the first aisle never take the first aisle only penalty
+
         model.addConstr(
             q_idx[o] == gp.quicksum(a*q[o,a] for a in A),
             name = f"retrieving_the_index_of_the_last_aisle_with_a_pick_for_order_{o}"
@@ -149,12 +142,12 @@ def Strict_S_Shape(num_aisles:int, num_bays:int, slot_capacity:int, between_aisl
         )
 
         model.addConstr(
-            Pen[o] <= z[o,1],
+            Pen[o] <= z_first,
             name = f"first_aisle_only_case_only_occurs_if_first_aisle_contains_a_pick_in_order_{o}"
         )
 
         model.addConstr(
-            Pen[o] >= w[o] + z[o,1] - 1,
+            Pen[o] >= w[o] + z_first - 1,
             name = f"if_only_one_aisle_contains_a_pick_in_order_{o}_and_the_first_aisle_contains_a_pick_then_apply_penalty"
         )
 
@@ -178,15 +171,18 @@ def Strict_S_Shape(num_aisles:int, num_bays:int, slot_capacity:int, between_aisl
             name = f"exactly_one_aisle_is_the_first_aisle_with_a_pick_for_order_{o}"
         )
 
-        for b in B:
-            model.addConstr(
-                gp.quicksum(n[o,a,b] for a in range(1,b)) == z[o,b] - f[o,b],
-                name = f"each_non-first_visited_aisle_{a}_has_exactly_one_previous_aisle_with_a_pick_for_order_{o}"
-            )
+        if parity_pairing:
+            add_parity_pairing(model, o, A, num_aisles, z, f, q, r, p)
+        else:
+            for b in A:
+                model.addConstr(
+                    gp.quicksum(n[o,a,b] for a in A if a < b) == z[o,b] - f[o,b],
+                    name = f"each_non-first_visited_aisle_{b}_has_exactly_one_previous_aisle_with_a_pick_for_order_{o}"
+                )
 
         for a in A:
             model.addConstr(
-                z[o,a] >= gp.quicksum(x[a,k] for k in orders[o])/aisle_capacity,
+                z[o,a] >= order_loads[o,a]/aisle_capacity,
                 name = f"enter_aisle_{a}_it_it_contains_a_pick_from_order_{o}"
             )
 
@@ -200,22 +196,25 @@ def Strict_S_Shape(num_aisles:int, num_bays:int, slot_capacity:int, between_aisl
                 name = f"aisle_{a}_can_only_be_the_last_aisle_with_a_pick_for_order_{o}_if_it_contains_a_pick"
             )
 
+            if parity_pairing:
+                continue
+
             model.addConstr(
-                gp.quicksum(n[o,a,b] for b in range(a+1, num_aisles + 1)) == z[o,a] - q[o,a],
+                gp.quicksum(n[o,a,b] for b in A if b > a) == z[o,a] - q[o,a],
                 name = f"each_non-last_visited_aisle_{a}_has_exactly_one_next_aisle_with_a_pick_for_order_{o}"
             )
 
             model.addConstr(
-                gp.quicksum(z[o,k] for k in range(1, a-1)) <= (1 - f[o,a])*(a-1),
+                gp.quicksum(z[o,k] for k in A if k < a-1) <= (1 - f[o,a])*(a-1),
                 name = f"if_aisle_{a}_is_the_first_aisle_with_a_pick_for_order_{o}_then_no_previous_aisles_have_picks"
             )
 
             model.addConstr(
-                gp.quicksum(z[o,k] for k in range(a+1, len(A))) <= (1-q[o,a]) * (len(A)-a),
+                gp.quicksum(z[o,k] for k in A if a < k < num_aisles) <= (1-q[o,a]) * (num_aisles-a),
                 name = f"if_aisle_{a}_is_the_last_aisle_with_a_pick_for_order_{o}_then_no_further_aisles_will_contain_picks"
             )
 
-            for b in B:
+            for b in A:
                 if b > a:
                     model.addConstr(
                         n[o,a,b] <= z[o,a],
@@ -237,16 +236,547 @@ def Strict_S_Shape(num_aisles:int, num_bays:int, slot_capacity:int, between_aisl
                         name = f"if_aisles_{a}_and_{b}_have_same_direction_and_they_appear_consecutively_in_order_{o}_then_penalise"
                     )
 
-    model.setObjective(
-        gp.quicksum(L * (gp.quicksum(z[o,a] for a in A) + gp.quicksum(p[o,a,b] for a in A for b in B if b > a) + (1-F[o]) + Q[o]) 
-                    + 2 * (q_idx[o] - 1) 
-                    + 2 * M * Pen[o] 
-                    for o in O),
-                    GRB.MINIMIZE
-    )
+    if order_weights is None:
+        order_weights = {o:1 for o in O}
+
+    objective = gp.quicksum(order_weights[o] * (L * (gp.quicksum(z[o,a] for a in order_aisles[o]) + (p.sum(o, "*") if parity_pairing else p.sum(o, "*", "*")) + (1-F[o]) + Q[o])
+                            + 2 * (q_idx[o] - 1)
+                            + 2 * M * Pen[o])
+                            for o in O)
+
+    variables = {"z":z, "p":p, "f":f, "f_idx":f_idx, "F":F, "q":q, "q_idx":q_idx, "Q":Q, "d":d, "e":e, "w":w, "Pen":Pen, "u1":u1, "u2":u2}
+    variables.update({"r":r} if parity_pairing else {"n":n})
+
+    return objective, variables
+
+
+def add_parity_pairing(model:gp.Model, o:int, A:list[int], num_aisles:int, z:gp.tupledict, f:gp.tupledict, q:gp.tupledict, r:gp.tupledict, p:gp.tupledict):
+    """
+    Adds the constraints of the parity form of add_strict_s_shape_routing for order o, which may visit the aisles A. r[o,a] is the parity of the last
+    aisle up to a with a pick. It is fixed at aisles with a pick and carried over aisles without one, so a visited aisle b other than the first shares
+    a direction with the previous visited aisle exactly when r at the aisle before b has the parity of b. As nothing else forces the first and last
+    aisles to be the true first and last aisles with picks, no aisle before the first (or after the last) may have a pick
+    """
+
+    for i, a in enumerate(A):
+        if a % 2 == 1:
+            model.addConstr(
+                r[o,a] >= z[o,a],
+                name = f"the_last_aisle_with_a_pick_up_to_aisle_{a}_is_odd_if_aisle_{a}_has_a_pick_for_order_{o}"
+            )
+        else:
+            model.addConstr(
+                r[o,a] <= 1 - z[o,a],
+                name = f"the_last_aisle_with_a_pick_up_to_aisle_{a}_is_even_if_aisle_{a}_has_a_pick_for_order_{o}"
+            )
+
+        if i > 0:
+            previous = A[i-1]
+
+            model.addConstr(
+                r[o,a] - r[o,previous] <= z[o,a],
+                name = f"the_parity_is_carried_up_over_aisle_{a}_without_a_pick_for_order_{o}"
+            )
+
+            model.addConstr(
+                r[o,previous] - r[o,a] <= z[o,a],
+                name = f"the_parity_is_carried_down_over_aisle_{a}_without_a_pick_for_order_{o}"
+            )
+
+            # r[o,previous] == a % 2 when the previous aisle with a pick shares a direction with aisle a
+            model.addConstr(
+                p[o,a] >= z[o,a] - f[o,a] + (r[o,previous] if a % 2 == 1 else 1 - r[o,previous]) - 1,
+                name = f"if_aisle_{a}_and_the_previous_aisle_with_a_pick_have_same_direction_in_order_{o}_then_penalise"
+            )
+
+        model.addConstr(
+            gp.quicksum(z[o,k] for k in A if k < a) <= (1 - f[o,a])*(a-1),
+            name = f"if_aisle_{a}_is_the_first_aisle_with_a_pick_for_order_{o}_then_no_previous_aisles_have_picks"
+        )
+
+        model.addConstr(
+            gp.quicksum(z[o,k] for k in A if k > a) <= (1 - q[o,a])*(num_aisles-a),
+            name = f"if_aisle_{a}_is_the_last_aisle_with_a_pick_for_order_{o}_then_no_further_aisles_have_picks"
+        )
+
+
+def add_order_constraints(model:gp.Model, num_orders:int, terms:list[Tuple[gp.MVar,Any]], sense:str, rhs:Any, name:str = "") -> gp.MConstr:
+    """
+    Adds the same block of constraints for every order in one call. Each variable has one row per order (or one entry per order), and the coefficients
+    of a single order's block are repeated down the diagonal of a sparse matrix, so no Python loop runs over the orders
+
+    Inputs:
+    - model: the model to add the constraints to
+    - num_orders: the number of orders
+    - terms: pairs of a variable of shape (num_orders, width) or (num_orders,) and the coefficients of one order's block of constraints on that
+      variable, of shape (rows, width) or (rows, 1)
+    - sense: the sense of the constraints (GRB.EQUAL, GRB.LESS_EQUAL or GRB.GREATER_EQUAL)
+    - rhs: the right hand side of one order's block, a scalar or an array of length rows, or of every order's block as an array of shape
+      (num_orders, rows) or (num_orders, 1)
+    - name: the name of the constraints. Empty for unnamed constraints
+
+    Output:
+    - constraints: the constraints, with the rows of each order's block together
+    """
+
+    orders_identity = sp.identity(num_orders, format="csr")
+    blocks = [sp.csr_matrix(block) if sp.issparse(block) else sp.csr_matrix(np.atleast_2d(block)) for _, block in terms]
+    matrix = sp.hstack([sp.kron(orders_identity, block) for block in blocks], format="csr")
+    variables = gp.hstack([var.reshape(-1) for var, _ in terms])
+    rows = matrix.shape[0] // num_orders if num_orders > 0 else 0
+
+    return model.addMConstr(matrix, variables, sense, np.broadcast_to(rhs, (num_orders, rows)).ravel(), name = name)
+
+
+def add_strict_s_shape_routing_matrix(model:gp.Model, x:gp.MVar, order_items:sp.csr_matrix, num_aisles:int, num_bays:int, between_aisle_dist:float, between_bay_dist:float, aisle_capacity:int, order_weights:np.ndarray = None, names:bool = False, parity_pairing:bool = False) -> Tuple[gp.MLinExpr, dict[str,gp.MVar], list[gp.MConstr]]:
+    """
+    Adds the same routing variables and constraints as add_strict_s_shape_routing through gurobipy's matrix API, for orders which may visit every
+    aisle. Each family of constraints is added for every order at once from a sparse coefficient matrix (add_order_constraints), which is far faster
+    to build for many orders. Aisle pairs (a,b) with a < b are numbered in the order of np.triu_indices, and n and p have one column per pair. With
+    parity_pairing, r has one column per aisle and p one column per aisle from the second
+
+    Inputs:
+    - model: the model to add the routing to
+    - x: the assignment variables, of shape (num_aisles, number of items), where x[a-1,k] is the number of item k in aisle a
+    - order_items: a sparse matrix of shape (number of orders, number of items) giving the number of each item in each order
+    - num_aisles, num_bays, between_aisle_dist, between_bay_dist, aisle_capacity: as in add_strict_s_shape_routing
+    - order_weights: the number of copies of each order, in the order of the rows of order_items. Defaults to one copy of each
+    - names: whether to name the variables and constraints. Naming is slow for large models and only needed when inspecting them
+    - parity_pairing: whether to use the parity form of the consecutive aisle pairing, as in add_strict_s_shape_routing
+
+    Outputs:
+    - objective: the total distance travelled for the orders, each weighted by its number of copies (strict_s_shape_matrix_objective)
+    - variables: the routing variables, keyed by name as in add_strict_s_shape_routing, with one row per order
+    - constraints: the routing constraints, one set per family. The rows of each family are grouped by order, in the order of the rows of
+      order_items, so the constraints of a single order can be removed later
+    """
+
+    num_orders, num_items = order_items.shape
+    aisles = np.arange(1, num_aisles + 1)
+
+    if order_weights is None:
+        order_weights = np.ones(num_orders)
+
+    def name(label:str) -> str:
+        return label if names else ""
+
+    # the pairs of aisles a < b, with matrices picking out the first and second aisle of each pair
+    first, second = np.triu_indices(num_aisles, 1)
+    num_pairs = len(first)
+    first_of_pair = sp.csr_matrix((np.ones(num_pairs), (np.arange(num_pairs), first)), shape=(num_pairs, num_aisles))
+    second_of_pair = sp.csr_matrix((np.ones(num_pairs), (np.arange(num_pairs), second)), shape=(num_pairs, num_aisles))
+    s = direction_matrix(num_aisles)[first, second]
+
+    # row a sums the aisles k < a-1, and the aisles a < k < num_aisles
+    before = (aisles[None,:] < aisles[:,None] - 1).astype(float)
+    after = ((aisles[None,:] > aisles[:,None]) & (aisles[None,:] < num_aisles)).astype(float)
+
+    # for the parity form, row b-2 picks out aisle b and the aisle before it, for b = 2, ..., num_aisles
+    odd = aisles % 2 == 1
+    this_aisle = sp.eye(num_aisles - 1, num_aisles, k=1, format="csr")
+    aisle_before = sp.eye(num_aisles - 1, num_aisles, format="csr")
+
+    # the blocks of coefficients shared by many constraints
+    one = np.ones((1,1))
+    every_aisle = np.ones((1, num_aisles))
+    first_aisle = np.eye(1, num_aisles)
+    aisle_identity = sp.identity(num_aisles, format="csr")
+    pair_identity = sp.identity(num_pairs, format="csr")
+
+    # decision variables
+    z = model.addMVar((num_orders, num_aisles), vtype = GRB.BINARY, name = name("z")) # if aisle a is visited in order o
+    if parity_pairing:
+        r = model.addMVar((num_orders, num_aisles), vtype = GRB.BINARY, name = name("r")) # the parity of the last aisle up to aisle a with a pick for order o
+        p = model.addMVar((num_orders, num_aisles - 1), vtype = GRB.BINARY, name = name("p")) # if aisle b has a pick for order o and shares a direction with the previous aisle with a pick
+    else:
+        n = model.addMVar((num_orders, num_pairs), vtype = GRB.BINARY, name = name("n")) # if the aisles of a pair form a consecutive pair of aisles with picks for order o
+        p = model.addMVar((num_orders, num_pairs), vtype = GRB.BINARY, name = name("p")) # if the aisles of a pair share a direction and form a consecutive pair of aisles with picks for order o
+    f = model.addMVar((num_orders, num_aisles), vtype = GRB.BINARY, name = name("f")) # if aisle a is the first aisle with a pick for order o
+    f_idx = model.addMVar(num_orders, ub = num_aisles, vtype = GRB.INTEGER, name = name("f_index")) # the index of the first aisle with a pick for order o
+    F = model.addMVar(num_orders, vtype = GRB.BINARY, name = name("F")) # if the index of the first aisle with a pick is odd for order o
+    q = model.addMVar((num_orders, num_aisles), vtype = GRB.BINARY, name = name("q")) # if aisle a is the last aisle with a pick for order o
+    q_idx = model.addMVar(num_orders, ub = num_aisles, vtype = GRB.INTEGER, name = name("q_index")) # the index of the last aisle with a pick for order o
+    Q = model.addMVar(num_orders, vtype = GRB.BINARY, name = name("Q")) # if the index of the last aisle with a pick for order o is odd
+    d = model.addMVar(num_orders, lb = 0, ub = num_aisles, vtype = GRB.INTEGER, name = name("d")) # auxiliary variable for defining F
+    e = model.addMVar(num_orders, lb = 0, ub = num_aisles, vtype = GRB.INTEGER, name = name("e")) # auxiliary variable for defining Q
+    w = model.addMVar(num_orders, vtype = GRB.BINARY, name = name("w")) # auxiliary variable which takes the value 1 iff exactly one aisle contains a pick for order o
+    Pen = model.addMVar(num_orders, vtype = GRB.BINARY, name = name("First_aisle_only_penalty")) # an indicator for whether only the first aisle contains a pick
+    u1 = model.addMVar(num_orders, vtype = GRB.BINARY, name = name("u1")) # whether 1 or more aisles have a pick
+    u2 = model.addMVar(num_orders, vtype = GRB.BINARY, name = name("u2")) # whether 2 or more aisles have a pick
+
+    # the constraints of each family, with the rows of each order together
+    constraints = []
+
+    def add(terms:list[Tuple[gp.MVar,Any]], sense:str, rhs:Any, label:str):
+        constraints.append(add_order_constraints(model, num_orders, terms, sense, rhs, name(label)))
+
+    add([(q_idx, one), (q, -aisles)], GRB.EQUAL, 0, "retrieving_the_index_of_the_last_aisle_with_a_pick")
+    add([(e, 2*one), (Q, one), (q_idx, -one)], GRB.EQUAL, 0, "if_the_last_aisle_with_a_pick_is_odd_indexed")
+    add([(z, every_aisle), (w, num_aisles*one)], GRB.LESS_EQUAL, num_aisles + 1, "w_enforcement_1")
+    add([(z, -every_aisle), (w, num_aisles*one)], GRB.LESS_EQUAL, num_aisles - 1, "w_enforcement_2")
+    add([(z, every_aisle), (u1, -num_aisles*one)], GRB.LESS_EQUAL, 0, "u1_upper")
+    add([(z, every_aisle), (u1, -one)], GRB.GREATER_EQUAL, 0, "u1_lower")
+    add([(z, every_aisle), (u2, -(num_aisles - 1)*one)], GRB.LESS_EQUAL, 1, "u2_upper")
+    add([(z, every_aisle), (u2, -2*one)], GRB.GREATER_EQUAL, 0, "u2_lower")
+    add([(w, one), (u1, -one), (u2, one)], GRB.EQUAL, 0, "enforcing_w")
+    add([(Pen, one), (w, -one)], GRB.LESS_EQUAL, 0, "first_aisle_only_case_only_occurs_if_exactly_one_aisle_contains_a_pick")
+    add([(Pen, one), (z, -first_aisle)], GRB.LESS_EQUAL, 0, "first_aisle_only_case_only_occurs_if_first_aisle_contains_a_pick")
+    add([(Pen, one), (w, -one), (z, -first_aisle)], GRB.GREATER_EQUAL, -1, "if_only_the_first_aisle_contains_a_pick_then_apply_penalty")
+    add([(f_idx, one), (f, -aisles)], GRB.EQUAL, 0, "retrieve_the_index_of_the_first_aisle_with_a_pick")
+    add([(d, 2*one), (F, one), (f_idx, -one)], GRB.EQUAL, 0, "if_the_first_aisle_with_a_pick_is_odd_or_even_indexed")
+    add([(q, every_aisle)], GRB.EQUAL, 1, "exactly_one_aisle_is_the_last_aisle_with_a_pick")
+    add([(f, every_aisle)], GRB.EQUAL, 1, "exactly_one_aisle_is_the_first_aisle_with_a_pick")
+    add([(f, aisle_identity), (z, -aisle_identity)], GRB.LESS_EQUAL, 0, "an_aisle_can_only_be_the_first_aisle_with_a_pick_if_it_contains_a_pick")
+    add([(q, aisle_identity), (z, -aisle_identity)], GRB.LESS_EQUAL, 0, "an_aisle_can_only_be_the_last_aisle_with_a_pick_if_it_contains_a_pick")
+
+    if parity_pairing:
+        # see add_parity_pairing, where r[o,b-1] == b % 2 when aisle b shares a direction with the previous aisle with a pick
+        add([(r, np.diag(np.where(odd, -1, 1))), (z, aisle_identity)], GRB.LESS_EQUAL, np.where(odd, 0, 1), "the_last_aisle_with_a_pick_up_to_an_aisle_with_a_pick_has_its_parity")
+        add([(r, this_aisle - aisle_before), (z, -this_aisle)], GRB.LESS_EQUAL, 0, "the_parity_is_carried_up_over_aisles_without_a_pick")
+        add([(r, aisle_before - this_aisle), (z, -this_aisle)], GRB.LESS_EQUAL, 0, "the_parity_is_carried_down_over_aisles_without_a_pick")
+        add([(p, sp.identity(num_aisles - 1)), (z, -this_aisle), (f, this_aisle), (r, sp.diags(np.where(odd[1:], -1.0, 1.0)) @ aisle_before)], GRB.GREATER_EQUAL, np.where(odd[1:], -1, 0), "if_an_aisle_and_the_previous_aisle_with_a_pick_have_same_direction_then_penalise")
+        add([(z, np.tril(np.ones((num_aisles, num_aisles)), -1)), (f, np.diag(aisles - 1))], GRB.LESS_EQUAL, aisles - 1, "if_an_aisle_is_the_first_aisle_with_a_pick_then_no_previous_aisles_have_picks")
+        add([(z, np.triu(np.ones((num_aisles, num_aisles)), 1)), (q, np.diag(num_aisles - aisles))], GRB.LESS_EQUAL, num_aisles - aisles, "if_an_aisle_is_the_last_aisle_with_a_pick_then_no_further_aisles_have_picks")
+    else:
+        add([(n, second_of_pair.T), (z, -aisle_identity), (f, aisle_identity)], GRB.EQUAL, 0, "each_non-first_visited_aisle_has_exactly_one_previous_aisle_with_a_pick")
+        add([(n, first_of_pair.T), (z, -aisle_identity), (q, aisle_identity)], GRB.EQUAL, 0, "each_non-last_visited_aisle_has_exactly_one_next_aisle_with_a_pick")
+        add([(z, before), (f, np.diag(aisles - 1))], GRB.LESS_EQUAL, aisles - 1, "if_an_aisle_is_the_first_aisle_with_a_pick_then_no_previous_aisles_have_picks")
+        add([(z, after), (q, np.diag(num_aisles - aisles))], GRB.LESS_EQUAL, num_aisles - aisles, "if_an_aisle_is_the_last_aisle_with_a_pick_then_no_further_aisles_will_contain_picks")
+        add([(n, pair_identity), (z, -first_of_pair)], GRB.LESS_EQUAL, 0, "the_first_aisle_of_a_pair_must_have_a_pick")
+        add([(n, pair_identity), (z, -second_of_pair)], GRB.LESS_EQUAL, 0, "the_second_aisle_of_a_pair_must_have_a_pick")
+        add([(p, pair_identity), (n, -pair_identity)], GRB.LESS_EQUAL, 0, "only_penalise_pairs_for_having_the_same_direction_if_they_appear_consecutively")
+        add([(p, pair_identity), (n, -pair_identity)], GRB.GREATER_EQUAL, s - 1, "if_a_pair_has_the_same_direction_and_appears_consecutively_then_penalise")
+
+    # z[o,a] >= sum_k order_items[o,k] * x[a-1,k] / aisle_capacity, with row (o,a) of the constraints at o * num_aisles + a - 1 and x flattened by aisle
+    order_items = sp.coo_matrix(order_items)
+    rows = (order_items.row[:,None] * num_aisles + aisles[None,:] - 1).ravel()
+    columns = ((aisles[None,:] - 1) * num_items + order_items.col[:,None]).ravel()
+    loads = sp.csr_matrix((np.repeat(order_items.data, num_aisles) / aisle_capacity, (rows, columns)), shape=(num_orders * num_aisles, x.size))
+    constraints.append(model.addMConstr(sp.hstack([sp.identity(num_orders * num_aisles), -loads], format="csr"), gp.hstack([z.reshape(-1), x.reshape(-1)]), GRB.GREATER_EQUAL, np.zeros(num_orders * num_aisles), name = name("enter_an_aisle_if_it_contains_a_pick")))
+
+    variables = {"z":z, "p":p, "f":f, "f_idx":f_idx, "F":F, "q":q, "q_idx":q_idx, "Q":Q, "d":d, "e":e, "w":w, "Pen":Pen, "u1":u1, "u2":u2}
+    variables.update({"r":r} if parity_pairing else {"n":n})
+
+    objective = strict_s_shape_matrix_objective(variables, num_bays, between_aisle_dist, between_bay_dist, order_weights)
+
+    return objective, variables, constraints
+
+
+def strict_s_shape_matrix_objective(variables:dict[str,gp.MVar], num_bays:int, between_aisle_dist:float, between_bay_dist:float, order_weights:np.ndarray) -> gp.MLinExpr:
+    """
+    Returns the total distance of the orders routed by add_strict_s_shape_routing_matrix, each weighted by its number of copies. The variables may be
+    restricted to some of the orders by indexing their rows, with order_weights given for those orders
+    """
+
+    L = between_bay_dist * (num_bays + 1)
+    M = between_aisle_dist
+
+    z, p, F, Q, q_idx, Pen = (variables[key] for key in ["z", "p", "F", "Q", "q_idx", "Pen"])
+
+    # L * (visited aisles + same direction pairs + (1 - F) + Q) + 2 * (q_idx - 1) + 2M * Pen for each order, with the constants collected
+    return (np.repeat(L * order_weights, z.shape[1]) @ z.reshape(-1) + np.repeat(L * order_weights, p.shape[1]) @ p.reshape(-1)
+            + (L * order_weights) @ (Q - F) + (2 * order_weights) @ q_idx + (2 * M * order_weights) @ Pen + np.sum(order_weights) * (L - 2))
+
+
+def add_strict_s_shape_valid_inequalities(model:gp.Model, x:gp.MVar, x_ub:np.ndarray, order_items:sp.csr_matrix, variables:dict[str,gp.MVar], min_aisles:np.ndarray, names:bool = False) -> list[gp.MConstr]:
+    """
+    Strengthens the routing of add_strict_s_shape_routing_matrix with constraints which every integer solution already satisfies, but which cut off
+    much of its LP relaxation:
+    - each order enters an aisle holding any of its items, z[o,a] >= x[a-1,k] / (the upper bound of x[a-1,k]) for every item k in order o, rather
+      than only when the aisle holds a full aisle of its items on average
+    - every visited aisle lies between the first and last aisles: z[o,a] <= sum of f[o,b] for b <= a, and z[o,a] <= sum of q[o,b] for b >= a
+    - the last aisle is not before the first aisle: sum of q[o,b] for b < a, plus f[o,a], is at most 1
+    - the number of visited aisles is at most q_idx - f_idx + 1, and at least the number of aisles needed to hold the order
+
+    Inputs:
+    - model: the model holding the routing
+    - x: the assignment variables, as in add_strict_s_shape_routing_matrix
+    - x_ub: the upper bounds of x
+    - order_items: the items in each order, as in add_strict_s_shape_routing_matrix
+    - variables: the routing variables returned by add_strict_s_shape_routing_matrix
+    - min_aisles: the smallest number of aisles which can hold each order's distinct products
+    - names: whether to name the constraints
+
+    Output:
+    - constraints: the added constraints
+    """
+
+    z, f, q, f_idx, q_idx = (variables[key] for key in ["z", "f", "q", "f_idx", "q_idx"])
+    num_orders, num_aisles = z.shape
+    num_items = x.shape[1]
+    aisles = np.arange(num_aisles)
+
+    def name(label:str) -> str:
+        return label if names else ""
+
+    # z[o,a] - x[a-1,k] / x_ub[a-1,k] >= 0 for every item k of order o, with one row for each (o,k) pair and aisle
+    order_items = sp.coo_matrix(order_items)
+    orders = np.repeat(order_items.row, num_aisles)
+    items = np.repeat(order_items.col, num_aisles)
+    link_aisles = np.tile(aisles, order_items.nnz)
+    upper_bounds = x_ub[link_aisles, items]
+
+    # items which cannot be placed in an aisle need no link
+    possible = upper_bounds > 0
+    orders, items, link_aisles, upper_bounds = orders[possible], items[possible], link_aisles[possible], upper_bounds[possible]
+    rows = np.arange(len(orders))
+
+    linking = sp.hstack([
+        sp.csr_matrix((np.ones(len(rows)), (rows, orders * num_aisles + link_aisles)), shape=(len(rows), z.size)),
+        sp.csr_matrix((-1 / upper_bounds, (rows, link_aisles * num_items + items)), shape=(len(rows), x.size))
+    ], format="csr")
+
+    constraints = [model.addMConstr(linking, gp.hstack([z.reshape(-1), x.reshape(-1)]), GRB.GREATER_EQUAL, np.zeros(len(rows)), name = name("enter_an_aisle_if_it_holds_any_item_of_the_order"))]
+
+    one = np.ones((1,1))
+    every_aisle = np.ones((1, num_aisles))
+    aisle_identity = sp.identity(num_aisles, format="csr")
+    up_to = np.tril(np.ones((num_aisles, num_aisles)))
+
+    for terms, sense, rhs, label in [
+        ([(z, aisle_identity), (f, -up_to)], GRB.LESS_EQUAL, 0, "a_visited_aisle_is_at_or_after_the_first_aisle_with_a_pick"),
+        ([(z, aisle_identity), (q, -up_to.T)], GRB.LESS_EQUAL, 0, "a_visited_aisle_is_at_or_before_the_last_aisle_with_a_pick"),
+        ([(q, np.tril(np.ones((num_aisles, num_aisles)), -1)), (f, aisle_identity)], GRB.LESS_EQUAL, 1, "the_last_aisle_with_a_pick_is_not_before_the_first"),
+        ([(z, every_aisle), (q_idx, -one), (f_idx, one)], GRB.LESS_EQUAL, 1, "the_visited_aisles_lie_between_the_first_and_last_aisles_with_a_pick"),
+        ([(z, every_aisle)], GRB.GREATER_EQUAL, np.asarray(min_aisles)[:,None], "enough_aisles_are_visited_to_hold_the_order")
+    ]:
+        constraints.append(add_order_constraints(model, num_orders, terms, sense, rhs, name(label)))
+
+    return constraints
+
+
+def add_product_symmetry_breaking(model:gp.Model, x:gp.MVar, classes:list[list[int]], names:bool = False) -> gp.MConstr:
+    """
+    Breaks the symmetry between interchangeable products in the per-product model (x[a-1,k-1] for product k), by requiring the products of each class
+    of group_products_by_signature to be placed in non-decreasing aisle order. Every assignment can be relabelled within its classes to meet this, so
+    the optimal distance is unchanged
+    """
+
+    num_aisles, num_items = x.shape
+    aisles = np.arange(1, num_aisles + 1)
+
+    # sum_a a * x[a-1,k1-1] - sum_a a * x[a-1,k2-1] <= 0 for consecutive products k1 < k2 of each class
+    pairs = np.array([(k1, k2) for prods in classes for k1, k2 in zip(prods[:-1], prods[1:])], dtype=np.int64).reshape(-1, 2) - 1
+    rows = np.repeat(np.arange(len(pairs)), num_aisles)
+    columns = (aisles[None,:] - 1) * num_items
+
+    ordering = sp.csr_matrix((np.concatenate([np.tile(aisles, len(pairs)), -np.tile(aisles, len(pairs))]),
+                              (np.concatenate([rows, rows]), np.concatenate([(columns + pairs[:,[0]]).ravel(), (columns + pairs[:,[1]]).ravel()]))),
+                             shape=(len(pairs), x.size))
+
+    return model.addMConstr(ordering, x.reshape(-1), GRB.LESS_EQUAL, np.zeros(len(pairs)), name = "interchangeable_products_are_placed_in_aisle_order" if names else "")
+
+
+def Strict_S_Shape(num_aisles:int, num_bays:int, slot_capacity:int, between_aisle_dist:float, between_bay_dist:float, orders:dict[int,list[int]], time_limit = 3600, aggregate_products:bool = True, collapse_orders:bool = True, warm_start:bool = True, heuristic_time_limit:float = None, return_heuristic:bool = False, matrix_api:bool = True, names:bool = False, parity_pairing:bool = False, tight:bool = False, return_timings:bool = False, return_statistics:bool = False, **unused:Any) -> Tuple:
+    """
+    The Strict S-Shape model for a warehouse with alternating directional aisles and no transverse
+
+    Inputs:
+    - num_aisles: the number of aisles in the warehouse
+    - num_bays: the number of bays each aisle is split into
+    - slot_capacity: the capacity of each slot (aisle, bay). The standard is two
+    - between_aisle_dist: the distance between consecutive aisles
+    - between_bay_dist: the distance between consecutive rows
+    - orders: the set of orders
+    - time_limit: how long the user would like the model to run for, including the warm start heuristic
+    - aggregate_products: whether to group products with the same order membership (group_products_by_signature) and decide only how many of each
+      group go in each aisle, rather than using a binary for every product and aisle. The optimal distance is unchanged
+    - collapse_orders: whether to model identical orders once, weighted by their number of copies (collapse_duplicate_orders). The optimal distance is unchanged
+    - warm_start: whether to find an assignment with strict_s_shape_heuristic before solving, and pass it to Gurobi as a MIP start. This is on by
+      default, so the heuristic's time is spent first and taken off Gurobi's time limit. Pass warm_start = False for Gurobi alone, as in results
+      produced before the warm start was added
+    - heuristic_time_limit: the time budget in seconds for the heuristic. Defaults to a tenth of time_limit, up to 60 seconds
+    - return_heuristic: whether to also return the distance found by the heuristic and the time it took (inf and 0 without a warm start)
+    - matrix_api: whether to build the model with gurobipy's matrix API (add_strict_s_shape_routing_matrix), which is much faster for many orders,
+      rather than constraint by constraint (add_strict_s_shape_routing). The two models are the same
+    - names: whether to name the variables and constraints of the matrix built model. The model built constraint by constraint is always named
+    - parity_pairing: whether to count consecutive visited aisles sharing a direction by tracking the parity of the last visited aisle, with
+      O(orders * aisles) variables, rather than with a variable for every order and pair of aisles (see add_strict_s_shape_routing). The optimal
+      distance is unchanged
+    - tight: whether to strengthen the matrix built model with add_strict_s_shape_valid_inequalities and, without aggregation,
+      add_product_symmetry_breaking. With aggregation, interchangeable products are already a single class. The optimal distance is unchanged
+    - return_timings: whether to also return the time taken to build the model, to solve it and to extract the assignment
+    - return_statistics: whether to also return the LP relaxation bound of the model as built and the number of branch and bound nodes explored
+
+    Outputs:
+    - status: the final model status
+    - distance: the distance achieved by the model, taken as the objective value
+    - runtime: the runtime of the model, including the warm start heuristic
+    - aisle_assignments_dict: the assignment of products to aisles
+    - heuristic_distance (if return_heuristic): the distance of the warm start assignment
+    - heuristic_runtime (if return_heuristic): the time taken to find the warm start
+    - build_time, solve_time, extraction_time (if return_timings): the wall time in seconds to build the model (excluding the heuristic), to solve it,
+      and to read the assignment from the solution
+    - lp_bound, node_count (if return_statistics): the objective of the LP relaxation of the model as built, before presolve and cuts, and the
+      number of nodes explored
+    """
+
+    if tight and not matrix_api:
+        raise ValueError("The tight model is only built with the matrix API (matrix_api = True)")
+
+    set_prods = list(set(chain.from_iterable([x for x in orders.values()])))
+    num_prods = len(set_prods)
+
+    if num_prods > num_aisles * num_bays * slot_capacity:
+        print(f"num_prods = {num_prods}")
+        print(f"num_aisles = {num_aisles}")
+        print(f"num_bays = {num_bays}")
+        print(f"capacity = {slot_capacity}")
+        print(f"num_slots = {num_aisles*num_bays*slot_capacity}")
+        print("infeasiblity caused by too many products for the number of slots")
+        return (3, np.inf, np.inf, []) + ((np.inf, 0.0) if return_heuristic else ()) + ((0.0, 0.0, 0.0) if return_timings else ()) + ((np.inf, 0.0) if return_statistics else ())
+    
+    gp.setParam('OutputFlag',0)
+    gp.setParam('TimeLimit',time_limit)
+
+    aisle_capacity = slot_capacity * num_bays
+    num_slots = num_aisles * num_bays * slot_capacity
+
+    # the heuristic assignment is passed to Gurobi as a starting solution, which Gurobi completes for the remaining variables
+    heuristic_distance = np.inf
+    heuristic_runtime = 0.0
+    if warm_start:
+        if heuristic_time_limit is None:
+            heuristic_time_limit = min(60, time_limit / 10)
+
+        product_aisles, heuristic_distance, heuristic_runtime = strict_s_shape_heuristic(orders, num_aisles, num_bays, slot_capacity, between_aisle_dist, between_bay_dist, time_limit=heuristic_time_limit)
+
+    build_start = time.perf_counter()
+
+    # identical orders are only modelled once, weighted by their number of copies
+    if collapse_orders:
+        model_orders, order_weights = collapse_duplicate_orders(orders)
+    else:
+        model_orders, order_weights = orders, {o:1 for o in range(1, len(orders) + 1)}
+
+    # our sets
+    A = range(1, num_aisles + 1)
+    O = range(1, len(model_orders) + 1)
+    P = range(1, num_slots + 1)
+
+    # the model, given what is left of the time limit after the heuristic
+    model = gp.Model("Strict_S_Shape")
+    model.Params.TimeLimit = max(0.0, time_limit - heuristic_runtime)
+
+    # with aggregation, the items are classes of products rather than products
+    if aggregate_products or tight:
+        classes, signatures = group_products_by_signature(model_orders, P)
+        C = range(len(classes))
+
+    # the symmetry breaking of the tight model places the products of a class in aisle order, which the heuristic assignment is relabelled to meet
+    if warm_start and tight and not aggregate_products:
+        for prods in classes:
+            product_aisles[prods] = np.sort(product_aisles[prods])
+
+    if matrix_api:
+        aisles = np.arange(1, num_aisles + 1)
+
+        # decision variables
+        if aggregate_products:
+            class_sizes = np.array([len(prods) for prods in classes])
+            x_ub = np.broadcast_to(np.minimum(class_sizes, aisle_capacity), (num_aisles, len(C)))
+            x = model.addMVar((num_aisles, len(C)), lb = 0, ub = x_ub, vtype = GRB.INTEGER, name = "x" if names else "") # the number of products of class c assigned to aisle a
+        else:
+            x_ub = np.ones((num_aisles, num_slots))
+            x = model.addMVar((num_aisles, num_slots), vtype = GRB.BINARY, name = "x" if names else "") # whether product k is assigned to aisle a
+
+        if warm_start:
+            if aggregate_products:
+                x.Start = np.array([[np.sum(product_aisles[classes[c]] == a) for c in C] for a in A])
+            else:
+                x.Start = (product_aisles[1:num_slots + 1][None,:] == aisles[:,None]).astype(int)
+
+        # the constraints
+        model.addConstr(x.sum(axis=0) == (class_sizes if aggregate_products else 1), name = "assign_every_item_to_a_slot" if names else "")
+        model.addConstr(x.sum(axis=1) <= aisle_capacity, name = "capacity_of_aisle" if names else "")
+
+        # entry (o,k) is the number of times item k appears in order o
+        if aggregate_products:
+            entries = [(o - 1, c) for c in C for o in signatures[c]]
+        else:
+            entries = [(o - 1, k - 1) for o in O for k in model_orders[o]]
+        rows, columns = np.array(entries, dtype=np.int64).reshape(-1, 2).T
+        order_items = sp.csr_matrix((np.ones(len(rows)), (rows, columns)), shape=(len(O), x.shape[1]))
+
+        weights = np.array([order_weights[o] for o in O])
+        objective, variables, _ = add_strict_s_shape_routing_matrix(model, x, order_items, num_aisles, num_bays, between_aisle_dist, between_bay_dist, aisle_capacity, weights, names, parity_pairing)
+
+        if tight:
+            min_aisles = np.array([-(-len(set(model_orders[o])) // aisle_capacity) for o in O])
+            add_strict_s_shape_valid_inequalities(model, x, x_ub, order_items, variables, min_aisles, names)
+
+            if not aggregate_products:
+                add_product_symmetry_breaking(model, x, classes, names)
+    else:
+        # decision variables
+        if aggregate_products:
+            x = model.addVars(A, C, lb = 0, ub = aisle_capacity, vtype = GRB.INTEGER, name = "x") # the number of products of class c assigned to aisle a
+            for a in A:
+                for c in C:
+                    x[a,c].UB = min(len(classes[c]), aisle_capacity)
+        else:
+            x = model.addVars(A, P, vtype = GRB.BINARY, name = "x") # whether product k is assigned to aisle a
+
+        if warm_start:
+            if aggregate_products:
+                for a in A:
+                    for c in C:
+                        x[a,c].Start = int(np.sum(product_aisles[classes[c]] == a))
+            else:
+                for a in A:
+                    for k in P:
+                        x[a,k].Start = int(product_aisles[k] == a)
+
+        # the constraints
+        if aggregate_products:
+            for c in C:
+                model.addConstr(
+                    gp.quicksum(x[a,c] for a in A) == len(classes[c]),
+                    name = f"assign_every_item_of_class_{c}_to_a_slot"
+                )
+
+            # the classes with products in each order
+            order_items = {o:[c for c in C if o in signatures[c]] for o in O}
+        else:
+            for k in P:
+                model.addConstr(
+                    gp.quicksum(x[a,k] for a in A) == 1,
+                    name = f"assign_item_{k}_to_a_slot"
+                )
+
+            order_items = {o:model_orders[o] for o in O}
+
+        items = C if aggregate_products else P
+
+        for a in A:
+            model.addConstr(
+                gp.quicksum(x[a,k] for k in items) <= aisle_capacity,
+                name = f"capacity_of_aisle_{a}"
+            )
+        
+        # the number of products of each order in each aisle
+        order_loads = {(o,a):gp.quicksum(x[a,k] for k in order_items[o]) for o in O for a in A}
+
+        objective, _ = add_strict_s_shape_routing(model, {o:list(A) for o in O}, order_loads, num_aisles, num_bays, between_aisle_dist, between_bay_dist, aisle_capacity, order_weights, parity_pairing)
+
+    model.setObjective(objective, GRB.MINIMIZE)
+    model.update()
+
+    solve_start = time.perf_counter()
+    build_time = solve_start - build_start
 
     model.optimize()
 
+    solve_time = time.perf_counter() - solve_start
+
+    # the bound is the LP relaxation of the model as built, so that it measures the formulation alone rather than Gurobi's presolve, cuts and
+    # heuristics, and is taken the same way whether or not the model branches. It is solved outside the time limit and the timings
+    if return_statistics:
+        relaxation = model.relax()
+        relaxation.Params.OutputFlag = 0
+        relaxation.optimize()
+        lp_bound = relaxation.ObjVal
+
     if model.Status == GRB.TIME_LIMIT:
         print(f"Model could not be solved to optimality within the time limit of {time_limit} seconds")
 
@@ -254,14 +784,28 @@ def Strict_S_Shape(num_aisles:int, num_bays:int, slot_capacity:int, between_aisl
         print("Model is infeasible")
         model.write("infeasible.ilp")
 
-    # create a dictionary for assignments, where each key is an aisle and each value is a list of products assigned to that aisle
-    aisle_assignments_dict = {}
-
-    for aisle in range(1, num_aisles + 1):
-        prods = []
-        for prod in P:
-            if x[aisle,prod].X > 0.5:
-                prods.append(prod)
-        aisle_assignments_dict[aisle] = prods
+    extraction_start = time.perf_counter()
 
-    return model.Status, model.ObjVal, model.Runtime, aisle_assignments_dict
\ No newline at end of file
+    # create a dictionary for assignments, where each key is an aisle and each value is a list of products assigned to that aisle
+    if matrix_api:
+        counts = np.rint(x.X).astype(np.int64)
+        if aggregate_products:
+            aisle_assignments_dict = expand_class_counts(classes, {(a,c):int(counts[a-1,c]) for a in A for c in C}, list(A))
+        else:
+            aisle_assignments_dict = {aisle:(np.flatnonzero(counts[aisle-1]) + 1).tolist() for aisle in A}
+    elif aggregate_products:
+        counts = {(a,c):int(round(x[a,c].X)) for a in A for c in C}
+        aisle_assignments_dict = expand_class_counts(classes, counts, list(A))
+    else:
+        aisle_assignments_dict = {}
+
+        for aisle in range(1, num_aisles + 1):
+            prods = []
+            for prod in P:
+                if x[aisle,prod].X > 0.5:
+                    prods.append(prod)
+            aisle_assignments_dict[aisle] = prods
+
+    extraction_time = time.perf_counter() - extraction_start
+
+    return (model.Status, model.ObjVal, heuristic_runtime + model.Runtime, aisle_assignments_dict) + ((heuristic_distance, heuristic_runtime) if return_heuristic else ()) + ((build_time, solve_time, extraction_time) if return_timings else ()) + ((lp_bound, model.NodeCount) if return_statistics else ())
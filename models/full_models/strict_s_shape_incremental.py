@@ -0,0 +1,177 @@
+import gurobipy as gp
+from gurobipy import GRB
+import numpy as np
+import scipy.sparse as sp
+import time
+from typing import Tuple, Any
+from itertools import chain
+from functions.strict_s_shape_heuristic import strict_s_shape_heuristic
+from models.full_models.strict_s_shape import add_strict_s_shape_routing_matrix, strict_s_shape_matrix_objective
+
+class IncrementalStrictSShape:
+    """
+    A persistent Strict S-Shape model for a fixed warehouse whose orders change over time, such as daily batches. The assignment variables and the
+    layout constraints are built once, and each batch of orders adds its own block of routing variables and constraints
+    (add_strict_s_shape_routing_matrix), which is removed again order by order when the orders leave. Each re-solve starts from the previous assignment,
+    so only the routing of the new orders has to be found from scratch.
+
+    Products are not aggregated by order membership (as in Strict_S_Shape), since the classes would change with every batch, so there is a binary for
+    every product and aisle
+
+    Inputs:
+    - num_aisles: the number of aisles in the warehouse
+    - num_bays: the number of bays each aisle is split into
+    - slot_capacity: the capacity of each slot (aisle, bay)
+    - between_aisle_dist: the distance between consecutive aisles
+    - between_bay_dist: the distance between consecutive rows
+    - orders: the starting set of orders, if any
+    - time_limit: the time limit in seconds for each re-solve
+    - warm_start: whether to start the first solve from strict_s_shape_heuristic. Later solves start from the previous assignment
+    - names: whether to name the variables and constraints
+    - parity_pairing: whether to use the parity form of the consecutive aisle pairing (see Strict_S_Shape)
+    """
+
+    def __init__(self, num_aisles:int, num_bays:int, slot_capacity:int, between_aisle_dist:float, between_bay_dist:float, orders:dict[int,list[int]] = None, time_limit:float = 3600, warm_start:bool = True, names:bool = False, parity_pairing:bool = False, **unused:Any):
+        self.num_aisles = num_aisles
+        self.num_bays = num_bays
+        self.slot_capacity = slot_capacity
+        self.between_aisle_dist = between_aisle_dist
+        self.between_bay_dist = between_bay_dist
+        self.time_limit = time_limit
+        self.warm_start = warm_start
+        self.names = names
+        self.parity_pairing = parity_pairing
+
+        self.aisle_capacity = slot_capacity * num_bays
+        self.num_slots = num_aisles * num_bays * slot_capacity
+
+        self.model = gp.Model("Incremental_Strict_S_Shape")
+        self.model.Params.OutputFlag = 0
+
+        # decision variables, where product k is column k-1
+        self.x = self.model.addMVar((num_aisles, self.num_slots), vtype = GRB.BINARY, name = "x" if names else "") # whether product k is assigned to aisle a
+
+        # the constraints
+        self.model.addConstr(self.x.sum(axis=0) == 1, name = "assign_every_item_to_a_slot" if names else "")
+        self.model.addConstr(self.x.sum(axis=1) <= self.aisle_capacity, name = "capacity_of_aisle" if names else "")
+
+        # the current orders, the routing blocks added for them, and the block and row of each order
+        self.orders = {}
+        self.blocks = []
+        self.order_rows = {}
+
+        # the assignment of the last solve, as the aisle of each product (entry 0 unused)
+        self.product_aisles = None
+
+        if orders:
+            self.add_orders(orders)
+
+    def add_orders(self, orders:dict[int,list[int]]):
+        """
+        Adds the routing variables and constraints of new orders to the model, as a single block
+
+        Inputs:
+        - orders: the new orders, with order numbers (not already in the model) as keys and lists of products as values
+        """
+
+        for order, prods in orders.items():
+            if order in self.orders:
+                raise ValueError(f"Order {order} is already in the model")
+            if any(prod < 1 or prod > self.num_slots for prod in prods):
+                raise ValueError(f"Order {order} contains a product outside 1, ..., {self.num_slots}")
+
+        if len(orders) == 0:
+            return
+
+        # entry (o,k) is the number of times product k+1 appears in the o-th new order
+        rows = np.concatenate([np.full(len(prods), o) for o, prods in enumerate(orders.values())]).astype(np.int64)
+        columns = np.array(list(chain.from_iterable(orders.values())), dtype=np.int64) - 1
+        order_items = sp.csr_matrix((np.ones(len(rows)), (rows, columns)), shape=(len(orders), self.num_slots))
+
+        _, variables, constraints = add_strict_s_shape_routing_matrix(self.model, self.x, order_items, self.num_aisles, self.num_bays, self.between_aisle_dist, self.between_bay_dist, self.aisle_capacity, names=self.names, parity_pairing=self.parity_pairing)
+
+        block = {"orders":list(orders.keys()), "variables":variables, "constraints":constraints, "active":np.ones(len(orders), dtype=bool)}
+        self.blocks.append(block)
+
+        for row, (order, prods) in enumerate(orders.items()):
+            self.orders[order] = list(prods)
+            self.order_rows[order] = (block, row)
+
+    def remove_orders(self, order_ids:list[int]):
+        """
+        Removes the routing variables and constraints of some orders from the model
+
+        Inputs:
+        - order_ids: the order numbers to remove
+        """
+
+        # every order is checked before anything is removed, so an invalid call leaves the model unchanged
+        if len(set(order_ids)) < len(order_ids):
+            raise ValueError(f"Orders to remove contain duplicates: {order_ids}")
+
+        for order in order_ids:
+            if order not in self.orders:
+                raise ValueError(f"Order {order} is not in the model")
+
+        for order in order_ids:
+            block, row = self.order_rows.pop(order)
+            del self.orders[order]
+
+            num_orders = len(block["orders"])
+            for var in block["variables"].values():
+                self.model.remove(var[row].reshape(-1).tolist())
+            for constraints in block["constraints"]:
+                rows_per_order = constraints.shape[0] // num_orders
+                self.model.remove(constraints[row*rows_per_order:(row + 1)*rows_per_order].tolist())
+
+            block["active"][row] = False
+
+        self.blocks = [block for block in self.blocks if block["active"].any()]
+
+    def resolve(self, time_limit:float = None) -> Tuple:
+        """
+        Solves the model for the current orders, starting from the assignment of the previous solve (or the heuristic, for the first solve)
+
+        Inputs:
+        - time_limit: the time limit in seconds for this solve. Defaults to the time limit of the model
+
+        Outputs:
+        - status: the final model status
+        - distance: the distance achieved by the model, taken as the objective value
+        - runtime: the runtime of the solve, including setting the objective and the starting assignment
+        - aisle_assignments_dict: the assignment of products to aisles
+        """
+
+        start = time.perf_counter()
+
+        self.model.Params.TimeLimit = self.time_limit if time_limit is None else time_limit
+
+        # the objective over the orders still in each block
+        objective = 0
+        for block in self.blocks:
+            rows = np.flatnonzero(block["active"])
+            variables = {key:var[rows] for key, var in block["variables"].items()}
+            objective = objective + strict_s_shape_matrix_objective(variables, self.num_bays, self.between_aisle_dist, self.between_bay_dist, np.ones(len(rows)))
+        self.model.setObjective(objective, GRB.MINIMIZE)
+
+        if self.product_aisles is None and self.warm_start and len(self.orders) > 0:
+            self.product_aisles, _, _ = strict_s_shape_heuristic(self.orders, self.num_aisles, self.num_bays, self.slot_capacity, self.between_aisle_dist, self.between_bay_dist, time_limit=min(60, self.model.Params.TimeLimit / 10))
+
+        # the routing variables of the new orders are left for Gurobi to complete
+        if self.product_aisles is not None:
+            self.x.Start = (self.product_aisles[1:self.num_slots + 1][None,:] == np.arange(1, self.num_aisles + 1)[:,None]).astype(int)
+
+        self.model.optimize()
+
+        if self.model.Status == GRB.TIME_LIMIT:
+            print(f"Model could not be solved to optimality within the time limit of {self.model.Params.TimeLimit} seconds")
+
+        if self.model.SolCount == 0:
+            return (self.model.Status, np.inf, time.perf_counter() - start, [])
+
+        assignment = np.rint(self.x.X).astype(np.int64)
+        self.product_aisles = np.concatenate([[0], np.argmax(assignment, axis=0) + 1])
+
+        aisle_assignments_dict = {aisle:(np.flatnonzero(assignment[aisle-1]) + 1).tolist() for aisle in range(1, self.num_aisles + 1)}
+
+        return (self.model.Status, self.model.ObjVal, time.perf_counter() - start, aisle_assignments_dict)
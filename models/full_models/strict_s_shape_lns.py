@@ -0,0 +1,243 @@
+import gurobipy as gp
+from gurobipy import GRB
+import numpy as np
+import pandas as pd
+import time
+from typing import Tuple, Any
+from itertools import chain
+from functions.product_aggregation import group_products_by_signature, expand_class_counts
+from functions.strict_s_shape_evaluation import StrictSShapeEvaluator
+from functions.strict_s_shape_heuristic import strict_s_shape_heuristic, fill_unassigned_products
+from models.full_models.strict_s_shape import add_strict_s_shape_routing
+
+# the neighbourhoods Strict_S_Shape_LNS chooses between, taken in turn
+LNS_OPERATORS = ("random_aisles", "adjacent_aisles", "related_orders", "worst_orders")
+
+
+def solve_lns_subproblem(product_aisles:np.ndarray, free_products:list[int], allowed_aisles:list[int], orders:dict[int,list[int]], orders_of_product:dict[int,np.ndarray], num_aisles:int, num_bays:int, slot_capacity:int, between_aisle_dist:float, between_bay_dist:float, time_limit:float) -> np.ndarray | None:
+    """
+    Re-optimises the aisles of some products with every other product fixed, by solving the Strict S-Shape model over only the orders containing
+    the freed products. Each of these orders can only visit the aisles the freed products may move to and the aisles its fixed products are in,
+    so the sub-problem stays small however large the warehouse is
+
+    Inputs:
+    - product_aisles: the current aisle of each product, with products in no order unassigned (aisle 0)
+    - free_products: the products to re-assign
+    - allowed_aisles: the aisles the freed products may be placed in
+    - orders: the set of orders
+    - orders_of_product: the positions (in orders) of the orders containing each product
+    - num_aisles, num_bays, slot_capacity, between_aisle_dist, between_bay_dist: as in Strict_S_Shape
+    - time_limit: the time limit in seconds for the sub-problem
+
+    Output:
+    - product_aisles: the new aisle of each product, or None if no solution was found within the time limit
+    """
+
+    aisle_capacity = slot_capacity * num_bays
+    order_ids = list(orders.keys())
+    free = set(free_products)
+    allowed = set(allowed_aisles)
+
+    # the orders whose distance can change, and the freed products in each of them
+    affected = sorted(set(chain.from_iterable(orders_of_product[prod] for prod in free_products)))
+    sub_orders = {order_ids[o]:[prod for prod in orders[order_ids[o]] if prod in free] for o in affected}
+
+    classes, signatures = group_products_by_signature(sub_orders, free_products)
+    C = range(len(classes))
+
+    fixed = product_aisles.copy()
+    fixed[list(free_products)] = 0
+    spare = aisle_capacity - np.bincount(fixed[1:], minlength=num_aisles + 1)
+
+    model = gp.Model("Strict_S_Shape_LNS")
+    model.Params.OutputFlag = 0
+    model.Params.TimeLimit = time_limit
+
+    x = model.addVars(allowed_aisles, C, lb = 0, vtype = GRB.INTEGER, name = "x") # the number of freed products of class c assigned to aisle a
+    for a in allowed_aisles:
+        for c in C:
+            x[a,c].UB = min(len(classes[c]), spare[a])
+            x[a,c].Start = int(np.sum(product_aisles[classes[c]] == a))
+
+    for c in C:
+        model.addConstr(gp.quicksum(x[a,c] for a in allowed_aisles) == len(classes[c]), name = f"assign_every_item_of_class_{c}_to_a_slot")
+
+    for a in allowed_aisles:
+        model.addConstr(gp.quicksum(x[a,c] for c in C) <= spare[a], name = f"capacity_of_aisle_{a}")
+
+    order_aisles = {}
+    order_loads = {}
+    for order in sub_orders:
+        fixed_load = np.bincount(fixed[orders[order]], minlength=num_aisles + 1)
+        fixed_load[0] = 0
+        order_classes = [c for c in C if order in signatures[c]]
+
+        order_aisles[order] = sorted(allowed | set(np.flatnonzero(fixed_load).tolist()))
+        for a in order_aisles[order]:
+            order_loads[order,a] = int(fixed_load[a]) + (gp.quicksum(x[a,c] for c in order_classes) if a in allowed else 0)
+
+    objective, _ = add_strict_s_shape_routing(model, order_aisles, order_loads, num_aisles, num_bays, between_aisle_dist, between_bay_dist, aisle_capacity)
+    model.setObjective(objective, GRB.MINIMIZE)
+
+    model.optimize()
+
+    if model.SolCount == 0:
+        return None
+
+    counts = {(a,c):int(round(x[a,c].X)) for a in allowed_aisles for c in C}
+    assignments = expand_class_counts(classes, counts, allowed_aisles)
+
+    for aisle, prods in assignments.items():
+        fixed[prods] = aisle
+
+    return fixed
+
+
+def Strict_S_Shape_LNS(num_aisles:int, num_bays:int, slot_capacity:int, between_aisle_dist:float, between_bay_dist:float, orders:dict[int,list[int]], time_limit = 3600, subproblem_time_limit:float = 10, num_free_aisles:int = 3, num_free_orders:int = 5, operators:Tuple[str,...] = LNS_OPERATORS, max_iterations:int = None, heuristic_time_limit:float = None, seed:int = 0, log_path:str = None, return_trajectory:bool = False, **unused:Any) -> Tuple:
+    """
+    A large neighbourhood search for the Strict S-Shape model, for warehouses too large to build the full model. Starting from the assignment of
+    strict_s_shape_heuristic, it repeatedly frees the products of a few aisles or orders, fixes every other product, and re-solves the small
+    sub-problem (solve_lns_subproblem) with a short time limit, keeping the new assignment if it is shorter. The neighbourhoods are taken in turn:
+    - random_aisles: the products of num_free_aisles random aisles, which may be re-arranged between those aisles
+    - adjacent_aisles: the products of num_free_aisles consecutive aisles, which may be re-arranged between those aisles
+    - related_orders: the products of a random order and up to num_free_orders - 1 orders sharing products with it, which may move to any aisle
+      these orders visit and num_free_aisles further random aisles
+    - worst_orders: as related_orders, but for num_free_orders orders sampled in proportion to their distance per product
+
+    Inputs:
+    - num_aisles: the number of aisles in the warehouse
+    - num_bays: the number of bays each aisle is split into
+    - slot_capacity: the capacity of each slot (aisle, bay). The standard is two
+    - between_aisle_dist: the distance between consecutive aisles
+    - between_bay_dist: the distance between consecutive rows
+    - orders: the set of orders
+    - time_limit: the total time budget in seconds, including the starting heuristic
+    - subproblem_time_limit: the time limit in seconds for each sub-problem
+    - num_free_aisles: the number of aisles freed by the aisle neighbourhoods
+    - num_free_orders: the number of orders freed by the order neighbourhoods
+    - operators: the neighbourhoods to use, from LNS_OPERATORS
+    - max_iterations: the largest number of sub-problems to solve. Defaults to no limit
+    - heuristic_time_limit: the time budget in seconds for the starting heuristic. Defaults to a tenth of time_limit, up to 60 seconds
+    - seed: the seed for choosing neighbourhoods
+    - log_path: a csv file to write the improvement trajectory to
+    - return_trajectory: whether to also return the improvement trajectory
+
+    Outputs:
+    - status: GRB.TIME_LIMIT if the time budget ran out, otherwise GRB.ITERATION_LIMIT
+    - distance: the distance of the best assignment found
+    - runtime: the runtime of the search
+    - aisle_assignments_dict: the assignment of products to aisles
+    - trajectory (if return_trajectory): a dataframe with one row per iteration, giving the time, neighbourhood, sub-problem size and distance
+    """
+
+    start = time.perf_counter()
+
+    set_prods = list(set(chain.from_iterable([x for x in orders.values()])))
+    num_prods = len(set_prods)
+
+    if num_prods > num_aisles * num_bays * slot_capacity:
+        print("infeasiblity caused by too many products for the number of slots")
+        return (3, np.inf, np.inf, []) + ((pd.DataFrame(),) if return_trajectory else ())
+
+    for operator in operators:
+        if operator not in LNS_OPERATORS:
+            raise ValueError(f"Unknown neighbourhood '{operator}', must be one of {LNS_OPERATORS}")
+
+    rng = np.random.default_rng(seed)
+    aisle_capacity = slot_capacity * num_bays
+    num_aisles_freed = min(num_free_aisles, num_aisles)
+
+    evaluator = StrictSShapeEvaluator(orders, num_aisles, num_bays, between_aisle_dist, between_bay_dist)
+    order_ids = list(orders.keys())
+
+    orders_of_product = {}
+    for o, prods in enumerate(orders.values()):
+        for prod in prods:
+            orders_of_product.setdefault(prod, []).append(o)
+    orders_of_product = {prod:np.array(positions) for prod, positions in orders_of_product.items()}
+    ordered_products = np.array(sorted(orders_of_product), dtype=np.int64)
+
+    if heuristic_time_limit is None:
+        heuristic_time_limit = min(60, time_limit / 10)
+
+    product_aisles, distance, _ = strict_s_shape_heuristic(orders, num_aisles, num_bays, slot_capacity, between_aisle_dist, between_bay_dist, time_limit=heuristic_time_limit, seed=seed)
+
+    # only products in orders are re-assigned, the rest fill the remaining space at the end
+    unordered = np.ones(len(product_aisles), dtype=bool)
+    unordered[ordered_products] = False
+    product_aisles[unordered] = 0
+
+    trajectory = [{"iteration":0, "time":time.perf_counter() - start, "operator":"heuristic", "num_free_products":0, "distance":distance, "improved":True}]
+
+    def related_orders(first:int) -> list[int]:
+        chosen = [first]
+        for o in chosen:
+            for prod in orders[order_ids[o]]:
+                for other in orders_of_product[prod]:
+                    if other not in chosen and len(chosen) < num_free_orders:
+                        chosen.append(other)
+        return chosen
+
+    status = GRB.ITERATION_LIMIT
+    iteration = 0
+    while max_iterations is None or iteration < max_iterations:
+        remaining = time_limit - (time.perf_counter() - start)
+        if remaining <= 0:
+            status = GRB.TIME_LIMIT
+            break
+
+        iteration += 1
+        operator = operators[(iteration - 1) % len(operators)]
+
+        if operator == "random_aisles":
+            allowed_aisles = sorted(rng.choice(np.arange(1, num_aisles + 1), num_aisles_freed, replace=False).tolist())
+        elif operator == "adjacent_aisles":
+            first = int(rng.integers(1, num_aisles - num_aisles_freed + 2))
+            allowed_aisles = list(range(first, first + num_aisles_freed))
+        else:
+            if operator == "related_orders":
+                chosen = related_orders(int(rng.integers(len(order_ids))))
+            else:
+                order_distances = evaluator.order_distances(product_aisles)
+                # orders with no picks are charged a distance, but have no products to free, so they are never chosen
+                order_sizes = np.array([len(prods) for prods in orders.values()])
+                weights = np.where(order_sizes > 0, order_distances / np.maximum(order_sizes, 1), 0)
+
+                # only orders with a positive distance can be sampled in proportion to it, and if there are none every order is equally likely
+                candidates = np.flatnonzero(weights > 0)
+                if len(candidates) == 0:
+                    candidates, weights = np.arange(len(order_ids)), np.ones(len(order_ids))
+
+                weights = weights[candidates] / weights[candidates].sum()
+                chosen = candidates[rng.choice(len(candidates), min(num_free_orders, len(candidates)), replace=False, p=weights)].tolist()
+
+            free_products = sorted(set(chain.from_iterable(orders[order_ids[o]] for o in chosen)))
+            extra_aisles = rng.choice(np.arange(1, num_aisles + 1), num_aisles_freed, replace=False)
+            allowed_aisles = sorted(set(product_aisles[free_products].tolist()) | set(extra_aisles.tolist()))
+
+        if operator in ["random_aisles", "adjacent_aisles"]:
+            free_products = ordered_products[np.isin(product_aisles[ordered_products], allowed_aisles)].tolist()
+
+        if len(free_products) == 0:
+            continue
+
+        candidate = solve_lns_subproblem(product_aisles, free_products, allowed_aisles, orders, orders_of_product, num_aisles, num_bays, slot_capacity, between_aisle_dist, between_bay_dist, min(subproblem_time_limit, remaining))
+
+        improved = False
+        if candidate is not None:
+            candidate_distance = float(evaluator.total_distance(candidate))
+            if candidate_distance < distance - 1e-9:
+                product_aisles = candidate
+                distance = candidate_distance
+                improved = True
+
+        trajectory.append({"iteration":iteration, "time":time.perf_counter() - start, "operator":operator, "num_free_products":len(free_products), "distance":distance, "improved":improved})
+
+    trajectory = pd.DataFrame(trajectory)
+    if log_path is not None:
+        trajectory.to_csv(log_path, index=False)
+
+    product_aisles = fill_unassigned_products(product_aisles, num_aisles, aisle_capacity)
+    aisle_assignments_dict = {aisle:np.flatnonzero(product_aisles == aisle).tolist() for aisle in range(1, num_aisles + 1)}
+
+    return (status, distance, time.perf_counter() - start, aisle_assignments_dict) + ((trajectory,) if return_trajectory else ())
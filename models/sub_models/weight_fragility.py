@@ -1,10 +1,145 @@
 import numpy as np
+import scipy.sparse as sp
 import gurobipy as gp
 from gurobipy import GRB
-from typing import Tuple
+import os
+import threading
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+from typing import Tuple, Any
 from collections import Counter
+from functions.orders_generation import reduce_orders
 
-def weight_fragility(prods_in_aisle:list[int], orders:dict[int,list[int]], crushing_array:np.ndarray[int], cluster_assignments:list[int], num_bays:int, slot_capacity:int, cluster_max_distance:int, aisle:int, output_flag:bool) -> Tuple[int, float, list[tuple[int,int]]]:
+# the orders, aisle assignments and model inputs used by aisle worker processes, set once per process by init_aisle_worker
+AISLE_INPUTS = None
+
+# one Gurobi environment per aisle thread (or process), as environments must not be shared between threads
+THREAD_LOCAL = threading.local()
+
+def add_crushing_constraints(model:gp.Model, x:gp.MVar, p:gp.MVar, prods_in_aisle:list[int], orders:dict[int,list[int]], crushing_array:np.ndarray[int]) -> Tuple[gp.MVar, gp.MConstr]:
+    """
+    Adds the crushing constraints of weight_fragility in bulk. Product i of order o is penalised if it is in bay b while products of the same order
+    able to crush it are placed further along the aisle:
+
+        p[i,o] >= x[i,b] + sum over j in o, j != i of crushing_array[i-1,j-1] * s[j,b] / num_bays - 1
+
+    where s[j,b] is whether product j is in one of bays b+1, ..., num_bays-1 (the last bay is left out, as in the original summation). s does not depend
+    on the order, so it is defined once per product and bay, and each constraint has one term per crusher rather than one per crusher and bay. The
+    crushers of each order are found with a NumPy mask over crushing_array, and every constraint is added in one sparse matrix
+
+    Inputs:
+    - model: the weight_fragility model
+    - x: the assignment of products to bays, one row per product in prods_in_aisle
+    - p: the crushing penalties, one row per product in prods_in_aisle and one column per order
+    - prods_in_aisle: the products assigned to the aisle
+    - orders: the orders, reduced to the products in the aisle
+    - crushing_array: as in weight_fragility
+
+    Outputs:
+    - s: whether each product is beyond each bay
+    - constraints: the crushing constraints, with the rows of each (order, product) pair in turn, one for each bay
+    """
+
+    num_prods, num_bays = x.shape
+    row_of = {prod:r for r, prod in enumerate(prods_in_aisle)}
+
+    # s[r,b] is the sum of x[r,k] over the bays k after b, leaving out the last bay
+    beyond = np.triu(np.ones((num_bays, num_bays)), k=1)
+    beyond[:,-1] = 0
+
+    s = model.addMVar((num_prods, num_bays), lb = 0, ub = 1, name = "s")
+    model.addMConstr(sp.hstack([sp.identity(num_prods * num_bays), -sp.kron(sp.identity(num_prods), beyond)], format="csr"), gp.hstack([s.reshape(-1), x.reshape(-1)]), GRB.EQUAL, np.zeros(num_prods * num_bays), name = "product_is_beyond_bay")
+
+    # one (order, product) pair per crushing penalty, and the (pair, crusher, coefficient) of every crusher in the same order
+    pair_rows, pair_orders, crusher_pairs, crusher_rows, crusher_values = [], [], [], [], []
+    num_pairs = 0
+    for o, prods in enumerate(orders.values()):
+        prods = np.asarray(prods, dtype=np.int64)
+        rows = np.array([row_of[prod] for prod in prods.tolist()], dtype=np.int64)
+
+        crushers = np.asarray(crushing_array[np.ix_(prods - 1, prods - 1)], dtype=float)
+        crushers[prods[:,None] == prods[None,:]] = 0
+        crushed, crusher = np.nonzero(crushers)
+
+        pair_rows.append(rows)
+        pair_orders.append(np.full(len(prods), o))
+        crusher_pairs.append(num_pairs + crushed)
+        crusher_rows.append(rows[crusher])
+        crusher_values.append(crushers[crushed, crusher])
+        num_pairs += len(prods)
+
+    pair_rows, pair_orders, crusher_pairs, crusher_rows, crusher_values = (np.concatenate(array) if len(array) > 0 else np.zeros(0, dtype=np.int64) for array in [pair_rows, pair_orders, crusher_pairs, crusher_rows, crusher_values])
+
+    # the constraint of pair n and bay b is row n*num_bays + b, and the columns are x, then s, then p, each flattened by row
+    bays = np.arange(num_bays)
+    rows = np.arange(num_pairs * num_bays)
+    x_columns = (pair_rows[:,None] * num_bays + bays).ravel()
+    p_columns = np.repeat(pair_rows * p.shape[1] + pair_orders, num_bays)
+    s_rows = (crusher_pairs[:,None] * num_bays + bays).ravel()
+    s_columns = (crusher_rows[:,None] * num_bays + bays).ravel()
+    s_values = np.repeat(crusher_values / num_bays, num_bays)
+
+    num_columns = 2 * num_prods * num_bays
+    matrix = sp.coo_matrix((np.concatenate([np.ones(len(rows)), s_values, -np.ones(len(rows))]), (np.concatenate([rows, s_rows, rows]), np.concatenate([x_columns, num_prods * num_bays + s_columns, num_columns + p_columns]))), shape=(num_pairs * num_bays, num_columns + p.size)).tocsr()
+
+    constraints = model.addMConstr(matrix, gp.hstack([x.reshape(-1), s.reshape(-1), p.reshape(-1)]), GRB.LESS_EQUAL, np.ones(num_pairs * num_bays), name = "prod_crushed_if_a_future_bay_contains_a_product_able_to_crush_it")
+
+    return s, constraints
+
+
+def add_cluster_constraints(model:gp.Model, x:gp.MVar, clusters:list[int], cluster_max_distance:float, formulation:str = "range") -> list[gp.MConstr]:
+    """
+    Adds the constraints keeping products of the same cluster within cluster_max_distance bays of each other, in one of two equivalent forms:
+    - "pairwise": one constraint for every ordered pair of products in the same cluster, bounding the difference of their bays. This is O(|I|^2)
+    - "range": the lowest and highest bay of each cluster (with at least two products in the aisle) as continuous variables, with every product of the
+      cluster placed between them and the two at most cluster_max_distance apart. This is O(|I|)
+
+    Inputs:
+    - model: the weight_fragility model
+    - x: the assignment of products to bays, one row per product
+    - clusters: the cluster of the product in each row of x
+    - cluster_max_distance: the maximum number of bays apart two products of the same cluster may be placed
+    - formulation: "pairwise" or "range"
+
+    Outputs:
+    - constraints: the cluster constraints
+    """
+
+    num_prods, num_bays = x.shape
+    clusters = np.asarray(clusters)
+    bay_numbers = np.arange(1, num_bays + 1, dtype=float)[None,:]
+
+    if formulation == "pairwise":
+        same_cluster = (clusters[:,None] == clusters[None,:]) & ~np.eye(num_prods, dtype=bool)
+        first, second = np.nonzero(same_cluster)
+        pairs = sp.coo_matrix((np.concatenate([np.ones(len(first)), -np.ones(len(first))]), (np.tile(np.arange(len(first)), 2), np.concatenate([first, second]))), shape=(len(first), num_prods))
+
+        return [model.addMConstr(sp.kron(pairs, bay_numbers, format="csr"), x.reshape(-1), GRB.LESS_EQUAL, np.full(len(first), cluster_max_distance, dtype=float), name = "upper_bound_on_distance_between_products")]
+
+    if formulation != "range":
+        raise ValueError(f"Unknown cluster formulation '{formulation}', must be 'pairwise' or 'range'")
+
+    # only clusters with at least two products in the aisle are constrained
+    _, member, counts = np.unique(clusters, return_inverse=True, return_counts=True)
+    shared = np.flatnonzero(counts[member] >= 2)
+    _, member = np.unique(member[shared], return_inverse=True)
+    num_clusters = int(member.max()) + 1 if len(shared) > 0 else 0
+
+    lowest = model.addMVar(num_clusters, lb = 1, ub = num_bays, name = "lowest_bay_of_cluster")
+    highest = model.addMVar(num_clusters, lb = 1, ub = num_bays, name = "highest_bay_of_cluster")
+
+    # the bay of each product in a shared cluster, and the cluster it belongs to
+    bays = sp.kron(sp.identity(num_prods, format="csr")[shared], bay_numbers, format="csr")
+    membership = sp.csr_matrix((np.ones(len(shared)), (np.arange(len(shared)), member)), shape=(len(shared), num_clusters))
+
+    return [
+        model.addMConstr(sp.hstack([bays, -membership], format="csr"), gp.hstack([x.reshape(-1), lowest]), GRB.GREATER_EQUAL, np.zeros(len(shared)), name = "product_is_at_or_after_the_lowest_bay_of_its_cluster"),
+        model.addMConstr(sp.hstack([bays, -membership], format="csr"), gp.hstack([x.reshape(-1), highest]), GRB.LESS_EQUAL, np.zeros(len(shared)), name = "product_is_at_or_before_the_highest_bay_of_its_cluster"),
+        model.addConstr(highest - lowest <= cluster_max_distance, name = "upper_bound_on_distance_within_cluster")
+    ]
+
+
+def weight_fragility(prods_in_aisle:list[int], orders:dict[int,list[int]], crushing_array:np.ndarray[int], cluster_assignments:list[int], num_bays:int, slot_capacity:int, cluster_max_distance:int, aisle:int, output_flag:bool, env:gp.Env = None, cluster_formulation:str = "range") -> Tuple[int, float, list[tuple[int,int]]]:
     """
     The second stage model which assigns products to bays within one aisle (to which they were assigned in the first stage). 
     
@@ -19,6 +154,9 @@ def weight_fragility(prods_in_aisle:list[int], orders:dict[int,list[int]], crush
     - aisle: the aisle we are optimising
     - slot_assignments_dict: the dictionary of assignments of products to slots 
     - output_flag: whether the user wishes to see full output of model solving
+    - env: the Gurobi environment to build the model in. Defaults to the default environment
+    - cluster_formulation: "range" to bound each cluster between its lowest and highest bay (linear in the number of products), or "pairwise" to bound
+      every pair of products in the same cluster (see add_cluster_constraints)
 
     Outputs:
     - status: whether a feasible solution was found
@@ -28,7 +166,7 @@ def weight_fragility(prods_in_aisle:list[int], orders:dict[int,list[int]], crush
     """
 
     # initialising the model
-    model = gp.Model("weight_fragility")
+    model = gp.Model("weight_fragility", env=env)
 
     model.setParam("OutputFlag", output_flag)
     c = {}
@@ -50,52 +188,26 @@ def weight_fragility(prods_in_aisle:list[int], orders:dict[int,list[int]], crush
 
     # sets
     B = range(1, num_bays + 1)
-    I = prods_in_aisle
-    Q = orders
+    I = list(prods_in_aisle)
     O = list(orders.keys())
 
-    # variables
-    x = model.addVars(I, B, vtype = GRB.BINARY, name = "x") # assignment of products to slots
-    p = model.addVars(I, O, vtype = GRB.BINARY, name = "p") # whether an item is crushed and a penalty applied
+    # variables, where product I[r] is row r and order O[o] is column o of p
+    x = model.addMVar((len(I), num_bays), vtype = GRB.BINARY, name = "x") # assignment of products to slots
+    p = model.addMVar((len(I), len(O)), vtype = GRB.BINARY, name = "p") # whether an item is crushed and a penalty applied
 
     # assignment constraint
-    for i in I:
-        model.addConstr(
-            gp.quicksum(x[i,b] for b in B) == 1,
-            name = f"assign_product_{i}_to_a_bay"
-        )
-
-        # constraints for ensuring that similar products are placed close to each other
-        for j in I:
-            if j != i:    
-                if c[i] == c[j]:
-                    model.addConstr(
-                        gp.quicksum(b*x[i,b] for b in B) - gp.quicksum(b*x[j,b] for b in B) <= cluster_max_distance,
-                        name = f"upper_bound_on_distance_between_products_{i}_and_{j}"
-                    )
-
-    for b in B:
-        model.addConstr(
-            gp.quicksum(x[i,b] for i in I) <= slot_capacity,
-            name = f"capacity_of_bay_{b}"
-        )
+    model.addConstr(x.sum(axis=1) == 1, name = "assign_product_to_a_bay")
+
+    # constraints for ensuring that similar products are placed close to each other
+    add_cluster_constraints(model, x, [c[i] for i in I], cluster_max_distance, cluster_formulation)
+
+    model.addConstr(x.sum(axis=0) <= slot_capacity, name = "capacity_of_bay")
 
     # constraints relating to crushing
-    for o in O:
-        for i in Q[o]:
-            for b in B:
-                further_aisles = range(b+1,len(B))
-                model.addConstr(
-                    p[i,o] >= x[i,b] + gp.quicksum(x[j,k]*crushing_array[i-1,j-1] for k in further_aisles for j in Q[o] if j != i)/len(B) - 1,
-                    name = f"prod_{i}_crushed_if_in_bay_{b}_and_a_future_bay_contains_a_product_able_to_crush_it_in_order_{o}"
-                )
-                
-                
-    # objective
-    model.setObjective(
-        gp.quicksum(p[i,o] for i in I for b in B for o in O),
-        GRB.MINIMIZE
-    )
+    add_crushing_constraints(model, x, p, I, orders, crushing_array)
+
+    # objective, counting each penalty once for every bay as in the original summation over bays
+    model.setObjective(len(B) * p.sum(), GRB.MINIMIZE)
 
     model.optimize()
 
@@ -103,19 +215,107 @@ def weight_fragility(prods_in_aisle:list[int], orders:dict[int,list[int]], crush
         model.computeIIS()
         model.write("infeasible.ilp")
 
-    # create an empty slot assignments dict for assignments for this aisle only
+    # create an empty slot assignments dict for assignments for this aisle only, with bays numbered from the other end of even aisles
     slot_assignments_dict = {}
 
-    if aisle % 2 == 1:
-        for i in I:
-            for b in B:
-                if x[i,b].X > 0.5:
-                    slot_assignments_dict[i] = (aisle, b)
-    elif aisle % 2 == 0:
-        for i in I:
-            for b in B:
-                if x[i,b].X > 0.5:
-                    slot_assignments_dict[i] = (aisle, len(B)-b+1)
-
+    bays = np.argmax(x.X > 0.5, axis=1) + 1 if len(I) > 0 else np.zeros(0, dtype=int)
+    for i, b in zip(I, bays.tolist()):
+        slot_assignments_dict[i] = (aisle, b) if aisle % 2 == 1 else (aisle, len(B)-b+1)
 
     return model.Status, model.ObjVal, model.Runtime, slot_assignments_dict
+
+
+def single_thread_env() -> gp.Env:
+    """
+    Returns the Gurobi environment of the calling thread, limited to one solver thread so that aisles solved side by side do not compete for cores
+    """
+    if not hasattr(THREAD_LOCAL, "env"):
+        env = gp.Env(empty=True)
+        env.setParam("OutputFlag", 0)
+        env.setParam("Threads", 1)
+        env.start()
+        THREAD_LOCAL.env = env
+
+    return THREAD_LOCAL.env
+
+
+def solve_aisle(aisle:int, orders:dict[int,list[int]], aisle_assignments_dict:dict[int,list[int]], inputs:dict[str,Any], env:gp.Env = None) -> Tuple[int, float, float, dict[int,tuple[int,int]]]:
+    """
+    Reduces the orders to the products of one aisle and assigns those products to bays with weight_fragility
+    """
+    orders_new, prods_in_aisle = reduce_orders(orders, aisle, aisle_assignments_dict)
+
+    return weight_fragility(prods_in_aisle=prods_in_aisle, orders=orders_new, aisle=aisle, output_flag=False, env=env, **inputs)
+
+
+def init_aisle_worker(orders:dict[int,list[int]], aisle_assignments_dict:dict[int,list[int]], inputs:dict[str,Any]) -> None:
+    """
+    Initialises an aisle worker process with the orders, aisle assignments and model inputs, so they are sent to each process once rather than with every aisle
+    """
+    global AISLE_INPUTS
+    AISLE_INPUTS = (orders, aisle_assignments_dict, inputs)
+
+
+def solve_aisle_in_process(aisle:int) -> Tuple[int, float, float, dict[int,tuple[int,int]]]:
+    """
+    Solves one aisle in a worker process, using the inputs given to init_aisle_worker
+    """
+    orders, aisle_assignments_dict, inputs = AISLE_INPUTS
+    return solve_aisle(aisle, orders, aisle_assignments_dict, inputs, env=single_thread_env())
+
+
+def solve_aisle_in_thread(aisle:int, orders:dict[int,list[int]], aisle_assignments_dict:dict[int,list[int]], inputs:dict[str,Any]) -> Tuple[int, float, float, dict[int,tuple[int,int]]]:
+    """
+    Solves one aisle in a worker thread, using a Gurobi environment private to the thread
+    """
+    return solve_aisle(aisle, orders, aisle_assignments_dict, inputs, env=single_thread_env())
+
+
+def weight_fragility_all_aisles(orders:dict[int,list[int]], aisle_assignments_dict:dict[int,list[int]], crushing_array:np.ndarray[int], cluster_assignments:list[int], num_bays:int, slot_capacity:int, cluster_max_distance:int, parallel:str = None, num_workers:int = None, cluster_formulation:str = "range") -> Tuple[dict[int,tuple[int,int]], float]:
+    """
+    Runs the second stage model (weight_fragility) for every aisle of the warehouse. The aisles are independent of each other once products are
+    assigned to aisles, so they may be solved side by side
+
+    Inputs:
+    - orders: the set of orders used to assign products to aisles
+    - aisle_assignments_dict: the products assigned to each aisle in the first stage
+    - crushing_array, cluster_assignments, num_bays, slot_capacity, cluster_max_distance, cluster_formulation: as in weight_fragility
+    - parallel: None to solve the aisles one after another, "threads" to solve them in a thread pool (Gurobi releases the GIL while solving), or
+    "processes" to solve them in a pool of spawned processes (which also builds the models side by side, but each worker imports gurobipy and opens
+    its own environment first). In both pools each model is limited to one solver thread.
+    Processes cannot be started from inside the workers of results/run_parallel.py, which are daemonic, so use threads there
+    - num_workers: the number of threads or processes. Defaults to SLURM_CPUS_PER_TASK, or the number of CPUs
+
+    Outputs:
+    - slot_assignments_dict: the assignments of products to slots over all aisles
+    - crushes: the total number of crushing incidents over all aisles
+    """
+
+    aisles = sorted(aisle_assignments_dict.keys())
+    inputs = {"crushing_array":crushing_array, "cluster_assignments":cluster_assignments, "num_bays":num_bays, "slot_capacity":slot_capacity, "cluster_max_distance":cluster_max_distance, "cluster_formulation":cluster_formulation}
+
+    if parallel is None:
+        results = [solve_aisle(aisle, orders, aisle_assignments_dict, inputs) for aisle in aisles]
+    else:
+        if num_workers is None:
+            num_workers = int(os.environ.get("SLURM_CPUS_PER_TASK", os.cpu_count() or 1))
+        num_workers = max(1, min(num_workers, len(aisles)))
+
+        if parallel == "threads":
+            with ThreadPool(processes=num_workers) as p:
+                results = p.starmap(solve_aisle_in_thread, [(aisle, orders, aisle_assignments_dict, inputs) for aisle in aisles])
+        elif parallel == "processes":
+            # spawned rather than forked, so the workers do not inherit the parent's Gurobi environment, licence connection or threads
+            with multiprocessing.get_context("spawn").Pool(processes=num_workers, initializer=init_aisle_worker, initargs=(orders, aisle_assignments_dict, inputs)) as p:
+                results = p.map(solve_aisle_in_process, aisles)
+        else:
+            raise ValueError(f"Unknown parallel mode '{parallel}', must be None, 'threads' or 'processes'")
+
+    # the results come back in aisle order whichever mode is used, and each aisle assigns different products, so the merged dictionary is the same
+    slot_assignments_dict = {}
+    crushes = 0
+    for _, objective, _, slot_assignments_dict_aisle in results:
+        slot_assignments_dict.update(slot_assignments_dict_aisle)
+        crushes += objective
+
+    return slot_assignments_dict, crushes
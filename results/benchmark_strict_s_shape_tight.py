@@ -0,0 +1,66 @@
+import pandas as pd
+from functions.orders_generation import generate_orders
+from models.full_models.strict_s_shape import Strict_S_Shape
+
+# compares the LP bound, node count and wall time of the standard and tight Strict S-Shape models on the instance grid of the five trial results,
+# and on medium instances from the large instance results which took from 40 seconds to several minutes to solve there
+# the warm start is turned off so that only the formulations differ
+# with product aggregation, interchangeable products are already one class, so only the valid inequalities are compared. The unaggregated runs,
+# with a binary for every product and aisle, also measure the symmetry breaking between interchangeable products
+# the LP bound is the LP relaxation of each model as built (see Strict_S_Shape), so it is taken the same way whether or not a run branches
+
+slot_capacity = 2
+between_aisle_dist = 1
+between_bay_dist = 1
+
+small_instances = pd.read_csv("output/strict_s_shape_silva_instances_five_trials.csv", index_col = 0)[["aisles", "bays", "num_orders", "order_size"]]
+medium_instances = pd.DataFrame([(5, 5, 10, 10), (5, 5, 10, 15), (5, 10, 10, 15)], columns = ["aisles", "bays", "num_orders", "order_size"])
+
+# (name, instances, trials per instance, time limit in seconds)
+grids = [("small", small_instances, 5, 600), ("medium", medium_instances, 3, 180)]
+
+variants = [("standard", False, True), ("tight", True, True), ("standard_unaggregated", False, False), ("tight_unaggregated", True, False)]
+
+rows = []
+
+for grid, instances, num_trials, time_limit in grids:
+    for _, instance in instances.iterrows():
+        num_aisles, num_bays, num_orders, order_size = (int(instance[key]) for key in ["aisles", "bays", "num_orders", "order_size"])
+
+        for trial in range(num_trials):
+            orders = generate_orders(num_orders, order_size, num_aisles*num_bays*slot_capacity, seed = trial + 1)
+
+            row = {"grid":grid, "aisles":num_aisles, "bays":num_bays, "num_orders":num_orders, "order_size":order_size, "trial":trial, "time_limit":time_limit}
+
+            for variant, tight, aggregate_products in variants:
+                status, distance, _, _, build_time, solve_time, _, lp_bound, node_count = Strict_S_Shape(num_aisles, num_bays, slot_capacity, between_aisle_dist, between_bay_dist, orders, time_limit = time_limit, warm_start = False, aggregate_products = aggregate_products, tight = tight, return_timings = True, return_statistics = True)
+
+                row.update({
+                    f"status_{variant}":status,
+                    f"distance_{variant}":distance,
+                    f"lp_bound_{variant}":lp_bound,
+                    f"node_count_{variant}":node_count,
+                    f"build_time_{variant}":build_time,
+                    f"solve_time_{variant}":solve_time
+                })
+
+            rows.append(row)
+
+            print(f"{num_aisles} aisles, {num_bays} bays, {num_orders} orders of size {order_size}, trial {trial}: LP bound {row['lp_bound_standard']:.1f} vs {row['lp_bound_tight']:.1f}, nodes {row['node_count_standard']:.0f} vs {row['node_count_tight']:.0f} (unaggregated {row['node_count_standard_unaggregated']:.0f} vs {row['node_count_tight_unaggregated']:.0f})")
+
+df = pd.DataFrame(rows)
+
+df.to_csv("output/strict_s_shape_tight_benchmark.csv")
+
+# the LP gap is the share of the best distance found not covered by the LP bound. Runs stopped by the time limit (status 9) count as unsolved
+names = [variant for variant, _, _ in variants]
+
+for variant in names:
+    df[f"lp_gap_{variant}"] = 1 - df[f"lp_bound_{variant}"] / df[f"distance_{variant}"]
+    df[f"solved_{variant}"] = df[f"status_{variant}"] == 2
+
+summary_columns = [f"{statistic}_{variant}" for statistic in ["lp_gap", "node_count", "solve_time"] for variant in names]
+
+print(df.groupby(["grid", "aisles", "bays", "num_orders", "order_size"])[summary_columns].mean().to_string())
+print(df.groupby("grid")[summary_columns].agg(["mean", "sum"]).T.to_string())
+print(df.groupby("grid")[[f"solved_{variant}" for variant in names]].sum().to_string())
@@ -0,0 +1,57 @@
+import pandas as pd
+import numpy as np
+import random
+import time
+from functions.tsp import solve_tsp_mip, solve_tsp_lazy
+from functions.distance_matrix_generation import build_pairwise_product_distance_matrix, order_distance_block
+
+# compares the runtimes of the MTZ and lazy subtour elimination TSP formulations on random orders in a transverse warehouse
+# the MTZ model of an order with more than about 44 picks is too large for the size-limited Gurobi licence, so larger orders need a full licence
+
+num_aisles = 10
+num_bays = 20
+slot_capacity = 2
+order_sizes = [10, 20, 30, 40]
+num_trials = 5
+
+random.seed(0)
+
+# products are placed in random slots
+slots = [(x,y) for x in range(1,num_aisles+1) for y in range(1, num_bays+1)]
+placements = slots * slot_capacity
+random.shuffle(placements)
+slot_assignments_dict = {prod:placements[prod-1] for prod in range(1, len(placements) + 1)}
+
+D = build_pairwise_product_distance_matrix(slot_assignments_dict, slots, num_aisles, num_bays, slot_capacity, 1, 1, 1000, compressed = True)
+
+rows = []
+
+for order_size in order_sizes:
+    for trial in range(num_trials):
+        order = random.sample(range(1, len(placements) + 1), order_size)
+        M = order_distance_block([0] + order, D)
+
+        start = time.perf_counter()
+        distance_mip, _ = solve_tsp_mip(M)
+        runtime_mip = time.perf_counter() - start
+
+        start = time.perf_counter()
+        distance_lazy, _ = solve_tsp_lazy(M)
+        runtime_lazy = time.perf_counter() - start
+
+        rows.append({
+            "order_size":order_size,
+            "trial":trial,
+            "distance_mip":distance_mip,
+            "distance_lazy":distance_lazy,
+            "runtime_mip":runtime_mip,
+            "runtime_lazy":runtime_lazy
+        })
+
+        print(f"{order_size} picks, trial {trial}: MTZ {runtime_mip:.3f}s, lazy {runtime_lazy:.3f}s")
+
+df = pd.DataFrame(rows)
+
+df.to_csv("output/tsp_formulation_benchmark.csv")
+
+print(df.groupby("order_size")[["runtime_mip", "runtime_lazy"]].mean())
@@ -0,0 +1,60 @@
+import pandas as pd
+import numpy as np
+import os
+import time
+from functions.orders_generation import generate_orders
+from functions.sub_model_functions.crushing_array import generate_crushing_array
+from models.sub_models.weight_fragility import weight_fragility_all_aisles
+
+# measures the wall time of the within-aisle models over every aisle, solved one after another and in thread and process pools of growing size
+# the speed-up can only show on a machine with at least as many CPUs as workers, so the number of CPUs is recorded with each run
+
+num_aisles = 10
+num_bays = 10
+slot_capacity = 2
+num_orders = 30
+order_size = 5
+crushing_multiple = 1.2
+worker_counts = [1, 2, 4, 8]
+num_trials = 3
+
+if __name__ == "__main__":
+    num_prods = num_aisles * num_bays * slot_capacity
+    num_cpus = int(os.environ.get("SLURM_CPUS_PER_TASK", os.cpu_count() or 1))
+
+    rng = np.random.default_rng(0)
+
+    rows = []
+
+    for trial in range(num_trials):
+        instance = {
+            "orders":generate_orders(num_orders, order_size, num_prods, seed = trial + 1),
+            "aisle_assignments_dict":{aisle:list(range((aisle-1)*num_bays*slot_capacity + 1, aisle*num_bays*slot_capacity + 1)) for aisle in range(1, num_aisles + 1)},
+            "crushing_array":generate_crushing_array(num_prods, rng.uniform(1, 10, num_prods), crushing_multiple),
+            "cluster_assignments":rng.integers(1, 6, num_prods).tolist(),
+            "num_bays":num_bays,
+            "slot_capacity":slot_capacity,
+            "cluster_max_distance":num_bays/2
+        }
+
+        for parallel, num_workers in [(None, 1)] + [(parallel, num_workers) for parallel in ["threads", "processes"] for num_workers in worker_counts]:
+            start = time.perf_counter()
+            _, crushes = weight_fragility_all_aisles(**instance, parallel = parallel, num_workers = num_workers)
+            wall_time = time.perf_counter() - start
+
+            rows.append({
+                "trial":trial,
+                "parallel":parallel or "sequential",
+                "num_workers":num_workers,
+                "num_cpus":num_cpus,
+                "crushes":crushes,
+                "wall_time":wall_time
+            })
+
+            print(f"trial {trial}, {parallel or 'sequential'} with {num_workers} workers: {wall_time:.2f}s, {crushes:.0f} crushes")
+
+    df = pd.DataFrame(rows)
+
+    df.to_csv("output/weight_fragility_parallel_benchmark.csv")
+
+    print(df.groupby(["parallel", "num_workers"])["wall_time"].mean())
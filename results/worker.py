@@ -1,8 +1,7 @@
-from functions.distance_matrix_generation import build_pairwise_product_distance_matrix
+from functions.distance_matrix_generation import build_pairwise_product_distance_matrix, OrderDistanceOracle
 from models.full_models.strict_s_shape import Strict_S_Shape
-from models.sub_models.weight_fragility import weight_fragility
+from models.sub_models.weight_fragility import weight_fragility_all_aisles
 from functions.tsp import total_distance_for_all_orders
-from functions.orders_generation import reduce_orders
 import numpy as np
 import pandas as pd
 from typing import Tuple
@@ -17,7 +16,7 @@ def init_worker(data_df):
 
 
 
-def full_optimisation_model(orders:dict[int:tuple[int,int]], num_aisles:int, num_bays:int, slot_capacity:int, between_aisle_dist:float, between_bay_dist:float, cluster_max_dist:int, backtrack_penalty:float, time_limit:float, crushing_array:np.ndarray[int]) -> Tuple[dict[int:tuple[int,int]], float, float]:
+def full_optimisation_model(orders:dict[int:tuple[int,int]], num_aisles:int, num_bays:int, slot_capacity:int, between_aisle_dist:float, between_bay_dist:float, cluster_max_dist:int, backtrack_penalty:float, time_limit:float, crushing_array:np.ndarray[int], parallel:str = None, num_workers:int = None) -> Tuple[dict[int:tuple[int,int]], float, float]:
     """
     A function which takes in the product attributes, orders, and warehouse dimensions, and runs the full optimisation model to assign products to individual slots and calculate the distance for both the warehouse with the transverse and without
 
@@ -33,6 +32,8 @@ def full_optimisation_model(orders:dict[int:tuple[int,int]], num_aisles:int, num
     - backtrack_penalty: the penalty for backtracking against a one-way system 
     - time_limit: the time allocated for the assignment of products to aisles
     - crushing_array: the array indicating which products are able to crush other products
+    - parallel: how to solve the within-aisle models, as in weight_fragility_all_aisles (None for one after another, "threads" or "processes")
+    - num_workers: the number of threads or processes solving aisles side by side
 
     Outputs:
     - slot_assignments_dict: the dictionary containing the assignments of products to slots
@@ -64,29 +65,19 @@ def full_optimisation_model(orders:dict[int:tuple[int,int]], num_aisles:int, num
 
     start = time.perf_counter()
 
-    # initialise the slot assignments dictionary
-    slot_assignments_dict = {}
-    crushes = 0
-
-    for aisle in range(1, num_aisles+1): # run the within-aisle optimisation model for each aisle
-        orders_new, prods_in_aisle = reduce_orders(orders, aisle, aisle_assignments_dict)
-
-        # run the within-aisle optimisation model and update the slot assignments dictionary
-        _, objective, _, slot_assignments_dict_aisle = weight_fragility(prods_in_aisle = prods_in_aisle, orders=orders_new, crushing_array=crushing_array, cluster_assignments=cluster_assignments, num_bays=num_bays, slot_capacity=slot_capacity, cluster_max_distance=cluster_max_dist, output_flag=False, aisle=aisle)
-
-        # update the slot assignments dict with assignments from that aisle
-        slot_assignments_dict.update(slot_assignments_dict_aisle)
-
-        # update total crushing incidents
-        crushes += objective
+    # run the within-aisle optimisation model for each aisle, and collect the assignments of products to slots and the total crushing incidents
+    slot_assignments_dict, crushes = weight_fragility_all_aisles(orders=orders, aisle_assignments_dict=aisle_assignments_dict, crushing_array=crushing_array, cluster_assignments=cluster_assignments, num_bays=num_bays, slot_capacity=slot_capacity, cluster_max_distance=cluster_max_dist, parallel=parallel, num_workers=num_workers)
 
     end = time.perf_counter()
 
-    # calculate the pairwise product distance matrix assuming now that the warehouse has a transverse bisecting aisles
+    # calculate the pairwise product distances assuming now that the warehouse has a transverse bisecting aisles. Only the distances between
+    # co-ordered products are needed for routing, so the dense product matrix is never built
+
+    between_product_distances = build_pairwise_product_distance_matrix(slot_assignments_dict = slot_assignments_dict, slots = slots, num_aisles=num_aisles, num_bays=num_bays, slot_capacity=slot_capacity, between_aisle_dist=between_aisle_dist, between_bay_dist=between_bay_dist, backtrack_penalty=backtrack_penalty, compressed=True)
 
-    between_product_distance_matrix = build_pairwise_product_distance_matrix(slot_assignments_dict = slot_assignments_dict, slots = slots, num_aisles=num_aisles, num_bays=num_bays, slot_capacity=slot_capacity, between_aisle_dist=between_aisle_dist, between_bay_dist=between_bay_dist, backtrack_penalty=backtrack_penalty)
+    routing_distances = OrderDistanceOracle(between_product_distances, orders)
 
-    distance_transverse, _ = total_distance_for_all_orders(orders, between_product_distance_matrix=between_product_distance_matrix)
+    distance_transverse, _ = total_distance_for_all_orders(orders, between_product_distance_matrix=routing_distances)
 
     end_full = time.perf_counter()
 